@@ -0,0 +1,90 @@
+from sequential_loading.data_storage import SQLStorage
+from sequential_loading.data_storage.bulk_load import BULK_LOAD_STRATEGIES
+
+from typedframe import TypedDataFrame, DATE_TIME_DTYPE
+
+import numpy as np
+import pandas as pd
+
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+"""
+Measures SQLStorage.store_data throughput for each bulk-load strategy on SQLite.
+
+Usage
+-----
+python -m benchmarks.bulk_load --rows 100000 --repeat 3
+"""
+
+class BenchmarkSchema(TypedDataFrame):
+    schema = {
+        "ticker": str,
+        "collector": str,
+        "id": str,
+        "date": DATE_TIME_DTYPE,
+        "open": np.float64,
+        "high": np.float64,
+        "low": np.float64,
+        "close": np.float64,
+        "volume": np.float64
+    }
+
+    unique_constraint = ["id"]
+
+
+def make_data(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    prices = rng.random((rows, 5))
+
+    data = pd.DataFrame({
+        "ticker": "SPY",
+        "collector": "BENCHMARK",
+        "id": [str(uuid.uuid4()) for _ in range(rows)],
+        "date": pd.date_range("2000-01-01", periods=rows, freq="min"),
+        "open": prices[:, 0],
+        "high": prices[:, 1],
+        "low": prices[:, 2],
+        "close": prices[:, 3],
+        "volume": prices[:, 4]
+    })
+
+    return BenchmarkSchema.convert(data).df
+
+
+def run(rows: int, repeat: int) -> dict:
+    data = make_data(rows)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SQLStorage(f"sqlite:///{os.path.join(directory, 'bulk_load.db')}", create_storage=True)
+
+        for strategy in BULK_LOAD_STRATEGIES:
+            if strategy == "copy":
+                continue
+
+            timings = []
+            for _ in range(repeat):
+                storage.delete_processor("benchmark")
+                storage.initialize("benchmark", BenchmarkSchema, primary_keys=BenchmarkSchema.unique_constraint, create_processor=True)
+
+                start = time.perf_counter()
+                storage.store_data("benchmark", data, bulk_load=strategy)
+                timings.append(time.perf_counter() - start)
+
+            results[strategy] = rows / min(timings)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures SQLStorage.store_data throughput for each bulk-load strategy on SQLite.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for strategy, rows_per_second in run(args.rows, args.repeat).items():
+        print(f"{strategy:<12} {rows_per_second:>12,.0f} rows/s")
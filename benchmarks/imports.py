@@ -0,0 +1,84 @@
+import argparse
+import json
+import subprocess
+import sys
+
+from typing import Dict, List
+
+"""
+Import-time budget for the lightweight parts of the package.
+
+Each module is imported in a fresh interpreter, which reports how long the import took, its resident memory afterwards,
+and which heavy backends it loaded. A module fails its budget if it loads a backend it should not, or takes longer than its budget.
+
+Usage
+-----
+python -m benchmarks.imports
+python -m benchmarks.imports --scale 2
+"""
+
+#modules that only collect, map or filter data, and should not need a database library or torch
+BUDGETS = {
+    "sequential_loading.sparsity_mapping": 0.2,
+    "sequential_loading.data_collector": 1.0,
+    "sequential_loading.predicates": 1.0,
+    "sequential_loading.data_storage": 1.0,
+    "sequential_loading.data_processor": 1.0,
+    "sequential_loading.storage_dataset": 1.0,
+}
+
+HEAVY_MODULES = ["torch", "sqlalchemy", "sqlalchemy_utils"]
+
+#number of interpreters each module is imported in. The fastest is reported, since the first may read files from disk.
+REPEAT = 3
+
+PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+with open("/proc/self/statm") as file:
+    rss = int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+print(json.dumps({{"seconds": seconds, "rss_mb": rss / 2**20, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+#a module that fails to import is reported with the last line of its traceback
+def probe(module: str) -> Dict[str, object]:
+    process = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)], capture_output=True, text=True)
+
+    if process.returncode != 0:
+        return {"seconds": float("inf"), "rss_mb": 0.0, "loaded": [], "error": process.stderr.strip().splitlines()[-1]}
+
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def check(budgets: Dict[str, float], scale: float = 1.0, repeat: int = REPEAT) -> List[dict]:
+    results = []
+
+    for module, budget in budgets.items():
+        runs = [probe(module) for _ in range(repeat)]
+        result = min(runs, key=lambda run: run["seconds"])
+
+        result["module"] = module
+        result["budget"] = budget * scale
+        result["passed"] = "error" not in result and not result["loaded"] and result["seconds"] <= result["budget"]
+        results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks that lightweight modules import quickly, without loading heavy backends.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies every time budget, for slower machines.")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    results = check(BUDGETS, args.scale, args.repeat)
+
+    for result in results:
+        loaded = result.get("error") or (f"loaded {', '.join(result['loaded'])}" if result["loaded"] else "")
+        print(f"{'ok' if result['passed'] else 'FAIL':<5} {result['module']:<40} {result['seconds']:>7.3f}s / {result['budget']:.2f}s {result['rss_mb']:>7.0f} MB {loaded}")
+
+    if not all(result["passed"] for result in results):
+        raise SystemExit(1)
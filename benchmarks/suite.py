@@ -0,0 +1,246 @@
+from benchmarks.synthetic import SyntheticCollector, SyntheticSchema, SyntheticParamSchema, MemorySampler
+
+from sequential_loading.sparsity_mapping import SparsityMappingString
+from sequential_loading.data_storage import SQLStorage
+from sequential_loading.data_processor import IntervalProcessor
+from sequential_loading.predicates import Equals, Range
+from sequential_loading.storage_dataset import CachedDataset, SparseIndexDataset, StreamingDataset
+
+from torch.utils.data import DataLoader
+
+import numpy as np
+
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from typing import Callable, Dict, List
+
+"""
+Benchmarks for sparsity mapping algebra, collection, SQLite storage and datasets.
+
+Each benchmark reports its throughput, along with the peak resident memory of the process while it ran.
+Results can be written to a JSON file, and compared against a previous run to find regressions.
+
+Usage
+-----
+python -m benchmarks.suite --size small
+python -m benchmarks.suite --size medium --only storage datasets --output results.json
+python -m benchmarks.suite --size medium --baseline results.json
+"""
+
+#fragments: intervals in a sparsity mapping, keys: tickers collected, days: days collected per key, rows_per_day: rows returned by the collector per day
+SIZES = {
+    "small": {"fragments": 100, "keys": 4, "days": 60, "rows_per_day": 24, "latency": 0.0},
+    "medium": {"fragments": 1000, "keys": 16, "days": 365, "rows_per_day": 24, "latency": 0.001},
+    "large": {"fragments": 10000, "keys": 64, "days": 730, "rows_per_day": 96, "latency": 0.001},
+}
+
+START = datetime.datetime(2000, 1, 1)
+
+#number of times each benchmark is run. Collection and store_data are run once, since they change the storage.
+REPEAT = 3
+
+#a run is reported as a regression when its throughput falls below this fraction of the baseline
+REGRESSION_THRESHOLD = 0.8
+
+
+#the fastest of repeat runs is reported, which is least affected by other processes
+def measure(benchmark: str, case: str, items: int, unit: str, function: Callable[[], object], repeat: int = None, memory_interval: float = 0.05) -> Dict[str, object]:
+    timings = []
+
+    with MemorySampler(memory_interval) as sampler:
+        for _ in range(repeat or REPEAT):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+
+    seconds = min(timings)
+
+    return {
+        "benchmark": benchmark,
+        "case": case,
+        "items": items,
+        "seconds": seconds,
+        "throughput": items / seconds if seconds > 0 else float("inf"),
+        "unit": unit,
+        "peak_rss_mb": sampler.peak / 2**20,
+        "rss_growth_mb": (sampler.peak - sampler.baseline) / 2**20,
+        "memory": [(round(t, 3), rss / 2**20) for t, rss in sampler.samples],
+    }
+
+
+#a domain of fragments one-day intervals, each followed by a one-day gap
+def fragmented_domain(fragments: int, offset: int = 0) -> str:
+    days = [START + datetime.timedelta(days=2 * i + offset) for i in range(fragments)]
+    return "".join(f"/{day:%Y-%m-%d}|{day:%Y-%m-%d}" for day in days)
+
+
+def sparsity_benchmarks(size: dict) -> List[dict]:
+    fragments = size["fragments"]
+
+    a = SparsityMappingString(unit="days", string=fragmented_domain(fragments))
+    b = SparsityMappingString(unit="days", string=fragmented_domain(fragments, offset=1))
+    covering = SparsityMappingString(unit="days", string=f"/{START:%Y-%m-%d}|{START + datetime.timedelta(days=2 * fragments):%Y-%m-%d}")
+
+    return [
+        measure("sparsity", "add interleaved", fragments, "fragments/s", lambda: a + b),
+        measure("sparsity", "subtract from covering", fragments, "fragments/s", lambda: covering - a),
+        measure("sparsity", "get_intervals", fragments, "fragments/s", lambda: a.get_intervals()),
+    ]
+
+
+def create_processor(storage: SQLStorage, name: str) -> IntervalProcessor:
+    return IntervalProcessor(name, SyntheticParamSchema, SyntheticSchema, storage, unit="days", create_processor=True)
+
+
+#collects size["days"] days for each key, in two fragmented passes, so that the second pass queries only the gaps left by the first
+def collect(storage: SQLStorage, size: dict, name: str = "synthetic") -> SyntheticCollector:
+    processor = create_processor(storage, name)
+    collector = SyntheticCollector(rows_per_day=size["rows_per_day"], latency=size["latency"])
+
+    end = START + datetime.timedelta(days=size["days"] - 1)
+
+    #the first pass collects the first week of every fortnight
+    weeks = [(START + datetime.timedelta(days=14 * i), START + datetime.timedelta(days=14 * i + 6)) for i in range(size["days"] // 14)]
+    first_pass = "".join(f"/{start:%Y-%m-%d}|{stop:%Y-%m-%d}" for start, stop in weeks) or "/"
+
+    for key in range(size["keys"]):
+        processor.collect(collector=collector, ticker=f"T{key}", domain=first_pass)
+        processor.collect(collector=collector, ticker=f"T{key}", domain=f"/{START:%Y-%m-%d}|{end:%Y-%m-%d}")
+
+    return collector
+
+
+def collect_benchmarks(size: dict, directory: str) -> List[dict]:
+    storage = SQLStorage(f"sqlite:///{os.path.join(directory, 'collect.db')}", create_storage=True)
+    rows = size["keys"] * size["days"] * size["rows_per_day"]
+
+    result = measure("collect", f"{size['keys']} keys x {size['days']} days", rows, "rows/s", lambda: collect(storage, size), repeat=1)
+    return [result]
+
+
+def storage_benchmarks(size: dict, directory: str) -> List[dict]:
+    storage = SQLStorage(f"sqlite:///{os.path.join(directory, 'storage.db')}", create_storage=True)
+    collect(storage, {**size, "latency": 0.0}, name="prices")
+    collect(storage, {**size, "latency": 0.0, "keys": 1}, name="market")
+
+    rows = len(storage.retrieve_processor("prices"))
+    key_rows = rows // size["keys"]
+    window = Equals("ticker", "T0") & Range("date", upper=START + datetime.timedelta(days=size["days"] // 2))
+
+    data = storage.retrieve_processor("prices")
+    copy = data.assign(ticker="COPY", collector=data["collector"].astype(str), id="COPY-" + data["id"])
+    create_processor(storage, "copy")
+
+    return [
+        measure("storage", "store_data", len(copy), "rows/s", lambda: storage.store_data("copy", copy), repeat=1),
+        measure("storage", "retrieve_processor", rows, "rows/s", lambda: storage.retrieve_processor("prices")),
+        measure("storage", "retrieve_processor filtered", key_rows // 2, "rows/s", lambda: storage.retrieve_processor("prices", query=window)),
+        measure("storage", "stream_processor", rows, "rows/s", lambda: sum(len(batch) for batch in storage.stream_processor("prices", batch_size=10000))),
+        measure("storage", "summarize by month", rows, "rows/s", lambda: storage.summarize("prices", time_column="date", bucket="month")),
+        measure("storage", "retrieve_data join", rows, "rows/s", lambda: storage.retrieve_data(["prices", "market"], join_column="date", suffixes=["_market"], selected_columns=["close", "volume"])),
+    ]
+
+
+def dataset_benchmarks(size: dict, directory: str) -> List[dict]:
+    storage = SQLStorage(f"sqlite:///{os.path.join(directory, 'datasets.db')}", create_storage=True)
+    collect(storage, {**size, "latency": 0.0}, name="prices")
+
+    rows = len(storage.retrieve_processor("prices"))
+    columns = ["open", "high", "low", "close", "volume"]
+
+    cached = CachedDataset(storage, ["prices"], selected_columns=columns)
+    windows = SparseIndexDataset(storage, ["prices"], 16, index_column="date", selected_columns=["close"], group_columns=["ticker"])
+    window_indices = np.random.default_rng(0).integers(0, len(windows), 10000)
+
+    cache_dir = os.path.join(directory, "dataset_cache")
+    CachedDataset(storage, ["prices"], selected_columns=columns, cache_dir=cache_dir)
+
+    return [
+        measure("datasets", "CachedDataset build", rows, "rows/s", lambda: CachedDataset(storage, ["prices"], selected_columns=columns).tensor),
+        measure("datasets", "CachedDataset cached build", rows, "rows/s", lambda: CachedDataset(storage, ["prices"], selected_columns=columns, cache_dir=cache_dir).tensor),
+        measure("datasets", "CachedDataset epoch", rows, "rows/s", lambda: sum(len(batch) for batch in DataLoader(cached, batch_size=256, shuffle=True))),
+        measure("datasets", "SparseIndexDataset batch", len(window_indices), "windows/s", lambda: windows.batch(window_indices)),
+        measure("datasets", "StreamingDataset epoch", rows, "rows/s", lambda: sum(len(batch) for batch in DataLoader(StreamingDataset(storage, ["prices"], selected_columns=columns, shuffle_buffer=10000), batch_size=256))),
+    ]
+
+
+BENCHMARKS = {
+    "sparsity": lambda size, directory: sparsity_benchmarks(size),
+    "collect": collect_benchmarks,
+    "storage": storage_benchmarks,
+    "datasets": dataset_benchmarks,
+}
+
+
+def run(size: dict, only: List[str] = None) -> List[dict]:
+    results = []
+
+    for name, benchmark in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+
+        #storages are shared per url, so each run uses a new directory
+        with tempfile.TemporaryDirectory() as directory:
+            results.extend(benchmark(size, directory))
+
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict]) -> List[dict]:
+    previous = {(result["benchmark"], result["case"]): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        key = (result["benchmark"], result["case"])
+        if key in previous:
+            result["ratio"] = result["throughput"] / previous[key]["throughput"]
+
+            if result["ratio"] < REGRESSION_THRESHOLD:
+                regressions.append(result)
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks sparsity mapping, collection, storage and datasets on synthetic data.")
+    parser.add_argument("--size", choices=list(SIZES.keys()), default="small")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS.keys()))
+    parser.add_argument("--fragments", type=int)
+    parser.add_argument("--keys", type=int)
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--rows-per-day", type=int)
+    parser.add_argument("--latency", type=float)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="Writes results, including memory samples, to a JSON file.")
+    parser.add_argument("--baseline", help="Compares throughput against the results of a previous run.")
+    args = parser.parse_args()
+
+    REPEAT = args.repeat
+
+    size = dict(SIZES[args.size])
+    for parameter in size:
+        if getattr(args, parameter) is not None:
+            size[parameter] = getattr(args, parameter)
+
+    results = run(size, args.only)
+    regressions = compare(results, json.load(open(args.baseline))["results"]) if args.baseline else []
+
+    for result in results:
+        ratio = f"{result['ratio']:>7.2f}x" if "ratio" in result else ""
+        print(f"{result['benchmark']:<10} {result['case']:<30} {result['throughput']:>14,.0f} {result['unit']:<12} {result['seconds']:>8.3f}s {result['peak_rss_mb']:>8.0f} MB {ratio}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"size": size, "results": results}, file, indent=2)
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than {REGRESSION_THRESHOLD:.0%} of the baseline:")
+        for result in regressions:
+            print(f"  {result['benchmark']} {result['case']}: {result['ratio']:.2f}x")
+
+        raise SystemExit(1)
@@ -0,0 +1,113 @@
+from sequential_loading.data_collector import DataCollector
+
+from typedframe import TypedDataFrame, DATE_TIME_DTYPE
+
+import numpy as np
+import pandas as pd
+
+import datetime
+import os
+import sys
+import threading
+import time
+
+"""
+Synthetic stand-ins for benchmarks, which run offline and reproducibly.
+
+SyntheticCollector generates rows_per_day rows for each day of a requested interval, after waiting latency seconds to simulate an API call.
+MemorySampler records the resident memory of the process over time while a benchmark runs.
+"""
+
+class SyntheticSchema(TypedDataFrame):
+    schema = {
+        "id": str,
+        "date": DATE_TIME_DTYPE,
+        "open": np.float64,
+        "high": np.float64,
+        "low": np.float64,
+        "close": np.float64,
+        "volume": np.float64
+    }
+
+    unique_constraint = ["id"]
+
+
+class SyntheticParamSchema(TypedDataFrame):
+    schema = {
+        "ticker": str,
+        "collector": str
+    }
+
+
+class SyntheticCollector(DataCollector):
+    def __init__(self, rows_per_day: int = 1, latency: float = 0.0, seed: int = 0):
+        super().__init__("SYNTHETIC", SyntheticSchema)
+
+        self.rows_per_day = rows_per_day
+        self.latency = latency
+        self.rng = np.random.default_rng(seed)
+
+        self.calls = 0
+
+    def retrieve_data(self, interval: tuple[datetime.datetime], ticker: str = "", **parameters) -> pd.DataFrame:
+        self.calls += 1
+        time.sleep(self.latency)
+
+        start, end = interval
+        dates = pd.date_range(start, end + datetime.timedelta(days=1), freq=pd.Timedelta(days=1) / self.rows_per_day, inclusive="left")
+        prices = self.rng.random((len(dates), 5))
+
+        return pd.DataFrame({
+            "id": f"{ticker}-" + pd.Series(dates.asi8).astype(str),
+            "date": dates,
+            "open": prices[:, 0],
+            "high": prices[:, 1],
+            "low": prices[:, 2],
+            "close": prices[:, 3],
+            "volume": prices[:, 4]
+        })
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        #peak rather than current memory on platforms without /proc. ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class MemorySampler():
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples = []
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self) -> None:
+        start = time.perf_counter()
+
+        while not self.stopped.is_set():
+            self.samples.append((time.perf_counter() - start, rss_bytes()))
+            self.stopped.wait(self.interval)
+
+    def __enter__(self) -> "MemorySampler":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+        self.samples.append((self.samples[-1][0] if self.samples else 0.0, rss_bytes()))
+
+    @property
+    def peak(self) -> int:
+        return max(rss for _, rss in self.samples)
+
+    @property
+    def baseline(self) -> int:
+        return self.samples[0][1]
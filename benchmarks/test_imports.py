@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from benchmarks.imports import BUDGETS, check
+
+"""
+Import-time budget test, run with python -m pytest benchmarks.
+
+Each lightweight module must import within its budget without loading a heavy backend.
+Budgets can be multiplied for slower machines with the IMPORT_BUDGET_SCALE environment variable.
+"""
+
+SCALE = float(os.environ.get("IMPORT_BUDGET_SCALE", "1.0"))
+
+
+@pytest.mark.parametrize("module", list(BUDGETS))
+def test_import_budget(module: str) -> None:
+    result, = check({module: BUDGETS[module]}, scale=SCALE)
+
+    assert "error" not in result, f"{module} failed to import: {result['error']}"
+    assert not result["loaded"], f"{module} loaded {', '.join(result['loaded'])}"
+    assert result["seconds"] <= result["budget"], f"{module} took {result['seconds']:.3f}s, over its budget of {result['budget']:.2f}s"
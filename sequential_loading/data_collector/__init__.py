@@ -1 +1,2 @@
-from sequential_loading.data_collector.data_collector import DataCollector
\ No newline at end of file
+from sequential_loading.data_collector.data_collector import DataCollector, NoData
+from sequential_loading.data_collector.file_collector import FileCollector
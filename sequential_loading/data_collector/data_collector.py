@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 import pandas as pd
+import datetime
 from typedframe import TypedDataFrame
 
 class DataCollector(ABC):
@@ -12,4 +13,18 @@ class DataCollector(ABC):
 
     @abstractmethod
     def retrieve_data(self, **parameters) -> pd.DataFrame | str:
-        pass
\ No newline at end of file
+        pass
+
+    #collectors whose source can change (e.g. a local file) return when it last changed, so that intervals which returned NoData before then are queried again
+    def modified_at(self) -> datetime.datetime | None:
+        return None
+
+
+"""
+Error message returned by a collector when a query is known to have no data (e.g. dates before a ticker's IPO).
+
+Unlike a plain error string, which is treated as transient, a NoData response is recorded
+in the processor's metadata so that the same query is not repeated.
+"""
+class NoData(str):
+    pass
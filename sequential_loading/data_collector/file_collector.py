@@ -0,0 +1,181 @@
+from sequential_loading.data_collector.data_collector import DataCollector, NoData
+
+import numpy as np
+import pandas as pd
+from typedframe import TypedDataFrame
+
+import datetime
+import glob
+import hashlib
+import os
+
+from typing import Dict, List, Type
+
+
+"""
+Base class for collectors that read from a local CSV or Parquet file.
+
+The file is read and prepared once, on the first call to retrieve_data, into an index sorted by key columns and date. The index is rebuilt if the file changes.
+Each call then finds its rows by binary search over the sorted dates, and returns them without scanning or reparsing the file.
+
+Lookups that find no rows return NoData, which the processor records as attempted. Attempts made before the file was last modified are retried.
+
+Subclasses may override prepare, which cleans the whole file once (e.g. parsing dates), and postprocess, which is applied to the rows returned by each call (e.g. adding ids).
+
+With memory_map=True, the prepared index is written to an Arrow IPC file beside the source (or in cache_dir), and read through a memory map,
+so that large files are not held in memory and processes collecting from the same file share its pages. The index is rebuilt when the source file changes.
+
+Members
+-------
+path: str
+    The path to a .csv or .parquet file.
+
+date_column: str
+    The column intervals are matched against. It is parsed as a datetime, if it is not one already.
+
+key_columns: List[str]
+    Parameters that select a group of rows, e.g. ["ticker"] for a file of many tickers. retrieve_data returns NoData for unknown keys.
+
+Methods
+-------
+
+read: () -> pd.DataFrame
+    Reads the whole file.
+
+prepare: (df: pd.DataFrame) -> pd.DataFrame
+    Cleans the file once, before it is indexed.
+
+postprocess: (df: pd.DataFrame, **parameters) -> pd.DataFrame
+    Transforms the rows returned by each call.
+
+select: (interval: tuple[datetime.datetime], key: tuple = ()) -> pd.DataFrame
+    Returns the rows of a key whose date lies within interval, inclusive of both ends.
+
+"""
+class FileCollector(DataCollector):
+    def __init__(self, name: str, schema: Type[TypedDataFrame], path: str, date_column: str = "date", key_columns: List[str] = None, memory_map: bool = False, cache_dir: str = None, read_options: dict = None):
+        super().__init__(name, schema)
+
+        self.path = path
+        self.date_column = date_column
+        self.key_columns = key_columns or []
+        self.memory_map = memory_map
+        self.cache_dir = cache_dir
+        self.read_options = read_options or {}
+
+        self.index = None
+        self.loaded_version = None
+
+    def read(self) -> pd.DataFrame:
+        if self.path.endswith(".parquet"):
+            return pd.read_parquet(self.path, **self.read_options)
+
+        return pd.read_csv(self.path, **self.read_options)
+
+    #intervals that returned NoData are queried again once the file is modified, since rows may have been added
+    def modified_at(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(os.path.getmtime(self.path))
+
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df
+
+    def postprocess(self, df: pd.DataFrame, **parameters) -> pd.DataFrame:
+        return df
+
+    #the index is rebuilt when the file, or the way it is indexed, changes
+    def cache_path(self) -> str:
+        stat = os.stat(self.path)
+        definition = [os.path.abspath(self.path), stat.st_mtime_ns, stat.st_size, type(self).__qualname__, self.date_column, self.key_columns]
+
+        digest = hashlib.sha256(repr(definition).encode()).hexdigest()[:16]
+        directory = self.cache_dir or os.path.dirname(os.path.abspath(self.path))
+
+        return os.path.join(directory, f"{os.path.basename(self.path)}.{digest}.arrow")
+
+    def build(self) -> pd.DataFrame:
+        df = self.prepare(self.read())
+        df[self.date_column] = pd.to_datetime(df[self.date_column])
+
+        #a stable sort keeps rows with equal dates in file order
+        return df.sort_values([*self.key_columns, self.date_column], kind="stable").reset_index(drop=True)
+
+    #changes when the file is replaced or modified
+    def version(self) -> tuple:
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self) -> None:
+        self.loaded_version = self.version()
+
+        if not self.memory_map:
+            self.index = self.build()
+            columns = {column: self.index[column] for column in [*self.key_columns, self.date_column]}
+
+        else:
+            import pyarrow as pa
+            from sequential_loading.storage_dataset.dataset_cache import write_frame
+
+            path = self.cache_path()
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write_frame(self.build(), path)
+
+                #indexes of earlier versions of the file are removed
+                for stale in glob.glob(os.path.join(glob.escape(os.path.dirname(path)), f"{glob.escape(os.path.basename(self.path))}.*.arrow")):
+                    if stale != path:
+                        os.remove(stale)
+
+            self.index = pa.ipc.open_file(pa.memory_map(path)).read_all()
+            columns = {column: self.index.column(column).to_pandas() for column in [*self.key_columns, self.date_column]}
+
+        self.dates = columns[self.date_column].to_numpy(dtype="datetime64[ns]")
+
+        #key: (first row, last row + 1)
+        self.groups = {(): (0, len(self.dates))}
+        if self.key_columns:
+            keys = pd.DataFrame({column: columns[column].astype(str) for column in self.key_columns}).to_numpy()
+            starts = np.flatnonzero(np.concatenate([[len(keys) > 0], (keys[1:] != keys[:-1]).any(axis=1)]))
+            stops = np.append(starts[1:], len(keys))
+
+            self.groups = {tuple(keys[start]): (start, stop) for start, stop in zip(starts, stops)}
+
+    def rows(self, start: int, stop: int) -> pd.DataFrame:
+        if self.memory_map:
+            return self.index.slice(start, stop - start).to_pandas()
+
+        return self.index.iloc[start:stop].reset_index(drop=True)
+
+    def select(self, interval: tuple[datetime.datetime], key: tuple = ()) -> pd.DataFrame:
+        #the index is rebuilt if the file has changed since it was loaded, e.g. in a long-lived worker process
+        if self.index is None or self.loaded_version != self.version():
+            self.load()
+
+        if key not in self.groups:
+            return self.rows(0, 0)
+
+        first, last = self.groups[key]
+        dates = self.dates[first:last]
+
+        start = first + np.searchsorted(dates, np.datetime64(pd.Timestamp(interval[0]), "ns"), side="left")
+        stop = first + np.searchsorted(dates, np.datetime64(pd.Timestamp(interval[1]), "ns"), side="right")
+
+        return self.rows(start, stop)
+
+    def retrieve_data(self, interval: tuple[datetime.datetime], **parameters) -> pd.DataFrame | str:
+        key = tuple(str(parameters[column]) for column in self.key_columns)
+        data = self.select(interval, key)
+
+        if data.empty:
+            return NoData(f"{self.path} has no rows for {dict(zip(self.key_columns, key))} between {interval[0]} and {interval[1]}")
+
+        return self.postprocess(data, **parameters)
+
+    #the index is rebuilt or remapped by each process it is sent to, rather than pickled
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        for attribute in ["index", "dates", "groups", "loaded_version"]:
+            state.pop(attribute, None)
+
+        state["index"] = None
+        state["loaded_version"] = None
+        return state
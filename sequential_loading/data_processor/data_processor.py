@@ -1,5 +1,6 @@
 from sequential_loading.data_storage.data_storage import DataStorage
 from sequential_loading.data_collector import DataCollector
+from sequential_loading.predicates import Predicate, And, Equals
 
 from abc import ABC, abstractmethod
 
@@ -16,6 +17,12 @@ import uuid
 
 
 class DataProcessor(ABC):
+    #default values for metadata columns that may be missing from metadata stored by older versions of a processor
+    metadata_defaults: Dict[str, object] = {}
+
+    #column holding the time of each datapoint, indexed together with the parameter columns
+    time_column: str = None
+
     def __init__(self, name: str, paramschema: Type[TypedDataFrame], schema: Type[TypedDataFrame], metaschema: Type[TypedDataFrame], storage: DataStorage, create_processor: bool = False) -> None:
         #convert types into dataframes (schemas)
         self.name = name
@@ -26,7 +33,8 @@ class DataProcessor(ABC):
         self.metaschema = metaschema
 
         self.paramschema = paramschema
-        self.schema = type('ProcessorSchema', (TypedDataFrame,), {"schema": {**paramschema.schema, **schema.schema}, "unique_constraint": schema.unique_constraint if hasattr(schema, "unique_constraint") else None})
+        #parameter values repeat on every row, so parameter columns are read as categoricals
+        self.schema = type('ProcessorSchema', (TypedDataFrame,), {"schema": {**paramschema.schema, **schema.schema}, "unique_constraint": schema.unique_constraint if hasattr(schema, "unique_constraint") else None, "indexes": schema.indexes if hasattr(schema, "indexes") else None, "categorical_columns": list(paramschema.schema.keys())})
         self.metaschema = type('ProcessorMetaSchema', (TypedDataFrame,), {"schema": {**paramschema.schema, **metaschema.schema}})
 
         self.storage: DataStorage = storage
@@ -41,16 +49,18 @@ class DataProcessor(ABC):
             self.cached_metadata = None
 
         if self.cached_metadata is not None:
+            for column, default in self.metadata_defaults.items():
+                if column not in self.cached_metadata.columns:
+                    self.cached_metadata[column] = default
+
             metaschema(self.cached_metadata)
 
         self.logger = logging.getLogger(__name__)
 
     "Get cached metadata"
-    def format_query(self, **parameters: dict) -> str:
+    def format_query(self, **parameters: dict) -> Predicate:
         #parameters are strings only
-        #replaced "and" with "&" to match pandas documentation (I think). Change back if this breaks something.
-        parameter_query = ' & '.join([f'{key} == "{value}"' for key, value in parameters.items()])
-        return parameter_query
+        return And(*[Equals(key, str(value)) for key, value in parameters.items()])
     
     #this function is actually not unique to IntervalProcessor, but could be used by all DataProcessors
     #The reason we pass in data as a dataframe is to preserve typing
@@ -95,16 +105,29 @@ class DataProcessor(ABC):
         if self.cached_metadata is None:
             return (None, None)
 
-        parameter_query = ' & '.join([f'{key} == "{value}"' for key, value in parameters.items()])
-        results = self.cached_metadata.query(parameter_query)
+        results = self.format_query(**parameters).filter(self.cached_metadata)
         
         if results.empty:
             return (None, None)
         
         return results.iloc[0], results.index[0]
 
+    #summarizes the stored rows of each parameter combination, optionally filtered by parameters. See DataStorage.summarize.
+    def summarize(self, bucket: str = None, reconcile: bool = True, **parameters: dict) -> pd.DataFrame:
+        time_column = self.time_column if self.time_column in self.schema.schema else None
+        query = self.format_query(**parameters) if parameters else None
+
+        return self.storage.summarize(self.name, key_columns=list(self.paramschema.schema.keys()), time_column=time_column, bucket=bucket, query=query, reconcile=reconcile)
+
+    #indexes on the parameter and time columns, followed by any indexes declared on the schema
+    def index_columns(self) -> List[List[str]]:
+        parameter_columns = list(self.paramschema.schema.keys())
+        time_columns = [self.time_column] if self.time_column in self.schema.schema else []
+
+        return [parameter_columns + time_columns, *(self.schema.indexes or [])]
+
     def initialize(self, create_processor: bool = False) -> None:
-        self.storage.initialize(self.name, self.schema, primary_keys=self.schema.unique_constraint, create_processor=create_processor)
+        self.storage.initialize(self.name, self.schema, primary_keys=self.schema.unique_constraint, indexes=self.index_columns(), create_processor=create_processor)
         self.storage.initialize(f"{self.name}_metadata", self.metaschema, primary_keys=list(self.paramschema.schema.keys()), create_processor=create_processor)
     
     @abstractmethod
@@ -154,5 +177,8 @@ collect_all: (domain: SparsityMapping) -> pd.DataFrame
 delete: (domain: SparsityMapping, collectors: list[DataCollector], **parameters: dict[str, str]) -> None
     Deletes data from DataCollectors and updates metadata.
 
+summarize: (bucket: str, reconcile: bool, **parameters: dict[str, str]) -> pd.DataFrame
+    Counts the stored rows and their first and last times for each set of parameters, reconciled with metadata.
+
 
 """
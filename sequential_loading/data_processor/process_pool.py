@@ -0,0 +1,110 @@
+from sequential_loading.data_collector import DataCollector
+
+import pandas as pd
+from typedframe import TypedDataFrame
+
+from collections import OrderedDict
+from typing import Type
+
+import hashlib
+import pickle
+
+
+"""
+Collection in worker processes, for collectors that are limited by CPU rather than by the source they query.
+
+Workers call the collector and validate its result against the processor's schema. Results are sent back to the parent
+as Arrow IPC buffers, which are copied once rather than pickled object by object. Frames that Arrow cannot convert
+(e.g. with columns of arbitrary Python objects) are pickled instead. Metadata and storage writes stay in the parent.
+
+Collectors are identified by a token, the hash of their pickled state, and each worker keeps the last WORKER_COLLECTORS collectors it has been sent.
+Intervals are submitted with the token only, and a worker that does not have the collector returns ("missing", None),
+so that the collector is only sent to workers that need it. Collectors holding loaded state (e.g. FileCollector's index) then load it once per worker.
+A collector whose state changes in the parent has a new token, and is sent again.
+
+Methods
+-------
+
+collect_interval: (token: str, payload: bytes, interval: tuple, parameters: dict, resample_freq: str, schema: dict) -> tuple
+    Retrieves and validates the data for one interval. Returns ("frame", data), ("arrow", buffer), ("message", str) or ("missing", None).
+
+unpack: (result: tuple) -> pd.DataFrame | str
+    Converts a result returned by collect_interval back into a dataframe or message.
+
+"""
+
+#number of collectors each worker keeps, least recently used first
+WORKER_COLLECTORS = 8
+
+#token: collector, in each worker process
+worker_collectors: OrderedDict = OrderedDict()
+
+
+def to_arrow(data: pd.DataFrame) -> bytes:
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    sink = pa.BufferOutputStream()
+
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue()
+
+
+def from_arrow(buffer) -> pd.DataFrame:
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(buffer).read_all().to_pandas()
+
+
+#processor schemas are created at runtime and cannot be pickled, so they are sent as their class attributes
+def schema_attributes(schema: Type[TypedDataFrame]) -> dict:
+    return {key: value for key, value in vars(schema).items() if key in ["schema", "unique_constraint", "indexes", "categorical_columns"]}
+
+
+#returns the pickled state of a collector, and the token identifying it
+def collector_payload(collector: DataCollector) -> tuple[str, bytes]:
+    payload = pickle.dumps(collector)
+    return hashlib.sha256(payload).hexdigest(), payload
+
+
+#payload is None when only the token is sent. The collector parameter is a placeholder, which is replaced by the collector in the worker.
+def collect_interval(token: str, payload: bytes, interval: tuple, parameters: dict, resample_freq: str, schema: dict) -> tuple:
+    if token in worker_collectors:
+        worker_collectors.move_to_end(token)
+    elif payload is None:
+        return ("missing", None)
+    else:
+        worker_collectors[token] = pickle.loads(payload)
+
+        while len(worker_collectors) > WORKER_COLLECTORS:
+            worker_collectors.popitem(last=False)
+
+    collector = worker_collectors[token]
+    parameters = {key: collector if key == "collector" else value for key, value in parameters.items()}
+    schema = type('ProcessorSchema', (TypedDataFrame,), schema)
+
+    data = collector.retrieve_data(interval=interval, resample_freq=resample_freq, **parameters)
+    if isinstance(data, str) or data is None or data.empty:
+        return ("message", data)
+
+    data_params = pd.DataFrame({
+        k: [str(v) for _ in range(len(data))] for k, v in parameters.items()
+    })
+    data = pd.concat([data_params, data.reset_index(drop=True)], axis=1)
+    schema(data)
+
+    try:
+        return ("arrow", to_arrow(data))
+    except (ValueError, TypeError):
+        return ("frame", data)
+
+
+def unpack(result: tuple) -> pd.DataFrame | str:
+    kind, value = result
+
+    if kind == "arrow":
+        return from_arrow(value)
+
+    return value
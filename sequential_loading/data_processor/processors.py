@@ -1,19 +1,24 @@
 from sequential_loading.data_processor.data_processor import DataProcessor
 from sequential_loading.data_storage.data_storage import DataStorage
-from sequential_loading.data_collector import DataCollector
+from sequential_loading.data_processor.process_pool import collect_interval, collector_payload, schema_attributes, unpack
+from sequential_loading.data_collector import DataCollector, NoData
 
 from sequential_loading.sparsity_mapping import SparsityMappingString
+from sequential_loading.predicates import Range
+from concurrent.futures import Executor
 from typing import List, Type, Tuple
 
-import uuid
 import datetime
+import json
 import pandas as pd
 from typedframe import TypedDataFrame
 
 class IntervalMetaSchema(TypedDataFrame):
     schema = { 
         "domain": str,
-        "collected_items": int
+        "collected_items": int,
+        "attempted_domain": str,
+        "attempted_at": str
     }
 
 
@@ -21,16 +26,71 @@ class IntervalProcessor(DataProcessor):
 
     metaschema = IntervalMetaSchema
 
-    def __init__(self, name: str, paramschema: Type[TypedDataFrame], schema: Type[TypedDataFrame], storage: DataStorage, unit: str, create_processor=False) -> None:
+    time_column = "date"
+
+    metadata_defaults = {
+        "attempted_domain": "/",
+        "attempted_at": ""
+    }
+
+    #attempted_domain tracks intervals that were queried but returned no data, so that they are not queried again.
+    #attempted_at maps the time of each attempt to the intervals it found empty, so that each interval expires on its own.
+    #attempt_expiry is an optional datetime.timedelta after which these intervals are queried again.
+    #executor is an optional concurrent.futures.ProcessPoolExecutor, in which collector calls and validation are run for each interval. Storage writes stay in this process.
+    def __init__(self, name: str, paramschema: Type[TypedDataFrame], schema: Type[TypedDataFrame], storage: DataStorage, unit: str, create_processor=False, attempt_expiry: datetime.timedelta = None, executor: Executor = None) -> None:
         super().__init__(name, paramschema, schema, self.metaschema, storage, create_processor)
 
         self.unit = unit
+        self.attempt_expiry = attempt_expiry
+        self.executor = executor
+
+        domain_update = lambda x, y, deletion = False: str(SparsityMappingString(unit=self.unit, string=x) - SparsityMappingString(unit=self.unit, string=y)) if deletion else str(SparsityMappingString(unit=self.unit, string=x) + SparsityMappingString(unit=self.unit, string=y))
 
         self.update_map = {
-            'domain': lambda x, y, deletion = False: str(SparsityMappingString(unit=self.unit, string=x) - SparsityMappingString(unit=self.unit, string=y)) if deletion else str(SparsityMappingString(unit=self.unit, string=x) + SparsityMappingString(unit=self.unit, string=y)),
-            'collected_items': lambda x, y, deletion: x - y if deletion else x + y
+            'domain': domain_update,
+            'collected_items': lambda x, y, deletion: x - y if deletion else x + y,
+            'attempted_domain': domain_update,
+            'attempted_at': self.update_attempts
         }
 
+    #attempts are stored as JSON, mapping the time of each attempt in isoformat to the domain it found empty
+    def attempts(self, attempted_at: str) -> dict[str, str]:
+        return json.loads(attempted_at) if attempted_at else {}
+
+    #the intervals of new attempts are removed from older attempts, so that a repeated attempt restarts their expiry.
+    #With deletion, the intervals are only removed, e.g. once they have been collected or deleted.
+    def update_attempts(self, existing: str, new: str, deletion: bool = False) -> str:
+        new_attempts = self.attempts(new)
+
+        removed = SparsityMappingString(unit=self.unit, string=None)
+        for domain in new_attempts.values():
+            removed = removed + SparsityMappingString(unit=self.unit, string=domain)
+
+        attempts = {}
+        for attempted_at, domain in self.attempts(existing).items():
+            remaining = SparsityMappingString(unit=self.unit, string=domain) - removed
+            if remaining.get_intervals():
+                attempts[attempted_at] = str(remaining)
+
+        if not deletion:
+            for attempted_at, domain in new_attempts.items():
+                attempts[attempted_at] = str(SparsityMappingString(unit=self.unit, string=attempts.get(attempted_at)) + SparsityMappingString(unit=self.unit, string=domain))
+
+        return json.dumps(attempts, sort_keys=True)
+
+    #attempts expire after attempt_expiry, or once the collector's source has changed since they were made
+    def attempts_expired(self, attempted_at: str, collector: DataCollector = None) -> bool:
+        if not attempted_at:
+            return False
+
+        attempted_at = datetime.datetime.fromisoformat(attempted_at)
+        modified_at = collector.modified_at() if collector is not None else None
+
+        if modified_at is not None and attempted_at < modified_at:
+            return True
+
+        return self.attempt_expiry is not None and attempted_at + self.attempt_expiry < datetime.datetime.now()
+
     def collect(self, domain:str = None, **parameters: dict) -> pd.DataFrame:
         #include collector as a parameter so that it can be contained in paramschema
         #could do this with domain as well, if it were a parameter
@@ -42,45 +102,162 @@ class IntervalProcessor(DataProcessor):
         existing_domain = existing_metadata['domain'] if existing_metadata is not None else None
         existing_domain = SparsityMappingString(unit=self.unit, string=existing_domain)
 
+        #intervals that previously returned no data are skipped until their attempt expires
+        stored_attempts = SparsityMappingString(unit=self.unit, string=existing_metadata['attempted_domain'] if existing_metadata is not None else None)
+        attempted_domain = stored_attempts
+        if existing_metadata is not None:
+            for attempted_at, domain in self.attempts(existing_metadata['attempted_at']).items():
+                if self.attempts_expired(attempted_at, collector):
+                    attempted_domain = attempted_domain - SparsityMappingString(unit=self.unit, string=domain)
+
         #find domain to retrieve
-        query_domain = domain_sms - existing_domain
+        query_domain = domain_sms - existing_domain - attempted_domain
 
-        for interval, str_interval in zip(query_domain.get_intervals(), query_domain.get_str_intervals()):
-            #retrieve data from collector
-            data = collector.retrieve_data(interval=interval, resample_freq=self.unit, **parameters)
-            if isinstance(data, str):
+        intervals = list(zip(query_domain.get_intervals(), query_domain.get_str_intervals()))
+
+        for (interval, str_interval), data in zip(intervals, self.retrieve_intervals(collector, [interval for interval, _ in intervals], parameters)):
+            if isinstance(data, NoData):
+                self.logger.info(f"No data available from collector {collector.name} for interval {interval} on parameters {parameters}: {data}")
+                data = None
+            elif isinstance(data, str):
                 self.logger.error(f"Error retrieving data from collector {collector.name} for interval {interval} on parameters {parameters}: {data}")
                 continue
             
-            #set metadata
+            no_data = data is None or data.empty
+            interval_string = f'/{str_interval[0]}|{str_interval[1]}'
+
+            #set metadata. Empty results are recorded as attempted rather than collected.
             metadata = pd.DataFrame({
-                'domain': [f'/{str_interval[0]}|{str_interval[1]}'],
-                'collected_items': [len(data)]
+                'domain': ['/' if no_data else interval_string],
+                'collected_items': [0 if no_data else len(data)],
+                'attempted_domain': [interval_string if no_data else '/'],
+                'attempted_at': [json.dumps({datetime.datetime.now().isoformat(): interval_string}) if no_data else '']
             })
             metadata.collected_items = metadata.collected_items.astype(int)
             
             #assign parameters for data and metadata
-            data_params = pd.DataFrame({
-                k: [str(v) for _ in range(len(data))] for k, v in parameters.items()
-            })
-
             metadata_params = pd.DataFrame({
                 k: [str(v)] for k, v in parameters.items()
             })
 
-            #updates, validates, and caches data and metadata
-            if not data.empty:
+            #updates, validates, and caches data and metadata. Data from worker processes has already been validated.
+            if no_data:
+                data = None
+            elif self.executor is None:
+                data_params = pd.DataFrame({
+                    k: [str(v) for _ in range(len(data))] for k, v in parameters.items()
+                })
                 data = self.update_data(data_params, data)
             else:
-                data = None
+                self.data = data
             
             metadata = self.update_metadata(metadata_params, metadata) 
+
+            #intervals that were attempted before, and have now returned data, are cleared from the attempted domain
+            if not no_data and str(stored_attempts - SparsityMappingString(unit=self.unit, string=interval_string)) != str(stored_attempts):
+                self.clear_attempts(metadata_params, interval_string)
             
             #store data
             #update_data and metadata return new data. But, metadata replaces the old metadata, so we need to write the whole cached metadata.
             #maybe this can be changed in the future
             self.storage.store_data(self.name, data, self.cached_metadata)
-                
+
+    #removes an interval from the attempted domain, and from the attempts that found it empty
+    def clear_attempts(self, metadata_params: pd.DataFrame, interval_string: str) -> None:
+        metadata = pd.DataFrame({
+            'domain': ['/'],
+            'collected_items': [0],
+            'attempted_domain': [interval_string],
+            'attempted_at': [json.dumps({"": interval_string})]
+        })
+        metadata.collected_items = metadata.collected_items.astype(int)
+
+        self.update_metadata(metadata_params, metadata, deletion=True)
+
+    #yields the collector's response for each interval, in order. With an executor, every interval is submitted at once, so that intervals are collected in parallel.
+    #Intervals are submitted with the collector's token only. Once a worker reports that it does not have the collector,
+    #every interval still waiting is submitted again with the collector, so that each worker is sent it without waiting for the others.
+    def retrieve_intervals(self, collector: DataCollector, intervals: List[Tuple[datetime.datetime]], parameters: dict):
+        if self.executor is None:
+            for interval in intervals:
+                yield collector.retrieve_data(interval=interval, resample_freq=self.unit, **parameters)
+            return
+
+        token, payload = collector_payload(collector)
+        schema = schema_attributes(self.schema)
+        #the collector is sent separately, and replaced in parameters by a placeholder that keeps the order of the parameter columns
+        parameters = {key: None if key == "collector" else value for key, value in parameters.items()}
+
+        submit = lambda interval, payload=None: self.executor.submit(collect_interval, token, payload, interval, parameters, self.unit, schema)
+        futures = [submit(interval) for interval in intervals]
+        sent = set()
+
+        try:
+            for i, interval in enumerate(intervals):
+                result = futures[i].result()
+
+                if result[0] == "missing":
+                    for j in range(i, len(intervals)):
+                        if j not in sent and (j == i or futures[j].cancel()):
+                            futures[j] = submit(intervals[j], payload)
+                            sent.add(j)
+
+                    result = futures[i].result()
+
+                yield unpack(result)
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+    #compacts the domains of each set of parameters, deletes rows duplicated on natural_key, and recounts collected_items from the stored rows.
+    #Keys are maintained in batches of batch_size, and metadata is stored after each batch. keys and start select a slice of the metadata,
+    #so that maintenance can be spread over several calls. The storage is optimized once the last key has been maintained, with a full vacuum only if vacuum is True.
+    def maintain(self, natural_key: List[str] = None, keys: int = None, start: int = 0, batch_size: int = 100, optimize: bool = True, vacuum: bool = False) -> pd.DataFrame:
+        if self.cached_metadata is None:
+            return pd.DataFrame()
+
+        parameter_columns = list(self.paramschema.schema.keys())
+        #unique constraints such as a random row id never repeat, so rows are compared by their parameters and time unless natural_key is given
+        natural_key = natural_key or [*parameter_columns, self.time_column]
+
+        stop = len(self.cached_metadata) if keys is None else min(start + keys, len(self.cached_metadata))
+        report = []
+
+        for batch_start in range(start, stop, batch_size):
+            for index in self.cached_metadata.index[batch_start:min(batch_start + batch_size, stop)]:
+                metadata = self.cached_metadata.loc[index]
+                parameters = {column: metadata[column] for column in parameter_columns}
+                query = self.format_query(**parameters)
+
+                try:
+                    duplicates = self.storage.delete_duplicates(self.name, natural_key, query=query)
+                except NotImplementedError as error:
+                    self.logger.warning(f"Skipping deduplication of {self.name}: {error}")
+                    duplicates = 0
+
+                rows = int(self.storage.summarize(self.name, key_columns=[], query=query, reconcile=False)["rows"].iloc[0])
+
+                domain = SparsityMappingString(unit=self.unit, string=metadata['domain'])
+                attempted_domain = SparsityMappingString(unit=self.unit, string=metadata['attempted_domain'])
+
+                report.append({
+                    **parameters,
+                    'domain_intervals': len(domain.get_intervals()),
+                    'compacted_intervals': len(domain.compact().get_intervals()),
+                    'duplicates': duplicates,
+                    'previous_items': int(metadata['collected_items']),
+                    'collected_items': rows
+                })
+
+                self.cached_metadata.loc[index, ['domain', 'attempted_domain', 'collected_items']] = [str(domain.compact()), str(attempted_domain.compact()), rows]
+
+            self.storage.store_data(self.name, None, self.cached_metadata)
+
+        if optimize and stop == len(self.cached_metadata):
+            self.storage.optimize(self.name, vacuum=vacuum)
+
+        return pd.DataFrame(report)
 
     def delete(self, domain: str, **parameters: Type[TypedDataFrame]) -> None:
         # collector = parameters["collector"]
@@ -93,14 +270,16 @@ class IntervalProcessor(DataProcessor):
 
         #loop over derrived domain and delete data
         for interval, str_interval in zip(query_domain.get_intervals(), query_domain.get_str_intervals()):
-            #date / integer values should not need to be wrapped in quotes. This is a bug.
-            deletion_query = f"{self.format_query(**parameters)} & date >= '{interval[0]}' & date <= '{interval[1]}'"
+            deletion_query = self.format_query(**parameters) & Range(self.time_column, lower=interval[0], upper=interval[1])
 
             deleted_count = self.storage.delete_data(self.name, query=deletion_query)
 
+            #deleted intervals are also cleared from the attempted domain so that they can be collected again
             metadata = pd.DataFrame({
                 'domain': [f'/{str_interval[0]}|{str_interval[1]}'],
-                'collected_items': [deleted_count]
+                'collected_items': [deleted_count],
+                'attempted_domain': [f'/{str_interval[0]}|{str_interval[1]}'],
+                'attempted_at': [json.dumps({"": f'/{str_interval[0]}|{str_interval[1]}'})]
             })
             metadata.collected_items = metadata.collected_items.astype(int)
             
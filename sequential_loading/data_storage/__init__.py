@@ -1,2 +1,25 @@
 from sequential_loading.data_storage.data_storage import DataStorage
-from sequential_loading.data_storage.storages import SQLStorage
\ No newline at end of file
+
+import importlib
+
+#storages are imported on first use, so that importing the package does not load their database libraries
+LAZY_IMPORTS = {
+    "SQLStorage": "sequential_loading.data_storage.storages",
+    "ParquetStorage": "sequential_loading.data_storage.parquet_storage",
+    "ShardedStorage": "sequential_loading.data_storage.sharded_storage",
+}
+
+__all__ = ["DataStorage", *LAZY_IMPORTS]
+
+
+def __getattr__(name: str):
+    if name in LAZY_IMPORTS:
+        value = getattr(importlib.import_module(LAZY_IMPORTS[name]), name)
+        globals()[name] = value
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_IMPORTS))
@@ -0,0 +1,155 @@
+import csv
+import datetime
+import io
+import itertools
+import sqlite3
+
+import pandas as pd
+
+from typing import Callable, Dict, List
+
+"""
+Bulk-load strategies for SQLStorage.store_data.
+
+Each strategy is an insertion method for pandas.DataFrame.to_sql, paired with a function that
+chooses a chunk size for a given dialect and number of columns.
+
+Strategies
+----------
+
+executemany:
+    A single prepared INSERT statement executed once per row by the driver.
+
+multi:
+    Multi-row INSERT ... VALUES statements, chunked to stay under the dialect's bound parameter limit.
+
+copy:
+    PostgreSQL COPY FROM STDIN. Requires the psycopg2 driver.
+
+sqlite:
+    executemany on the raw sqlite3 connection, bypassing SQLAlchemy statement construction.
+
+"""
+
+#maximum number of bound parameters in a single statement
+MAX_PARAMETERS = {
+    "sqlite": 999 if sqlite3.sqlite_version_info < (3, 32, 0) else 32766,
+    "postgresql": 65535,
+}
+
+DEFAULT_MAX_PARAMETERS = 2100
+
+#larger multi-row statements take longer to parse without inserting any faster
+MAX_VALUES_ROWS = 1000
+
+#positional placeholder for each DBAPI paramstyle
+PLACEHOLDERS = {
+    "qmark": "?",
+    "format": "%s",
+    "pyformat": "%s",
+}
+
+#rows per chunk for strategies that are not limited by the number of bound parameters
+STREAMING_CHUNKSIZE = 50000
+
+
+def table_name(pd_table) -> str:
+    return f"{pd_table.schema}.{pd_table.name}" if pd_table.schema else pd_table.name
+
+
+#rows bound directly through the sqlite3 driver have their datetimes converted here, rather than by registering a sqlite3 adapter,
+#which would change how datetimes are bound for every sqlite3 user in the process.
+#Datetimes are written in the format SQLAlchemy uses for sqlite, so that rows written by any strategy compare equally
+def sqlite_rows(pd_table, keys: List[str], rows: list) -> list:
+    frame = getattr(pd_table, "frame", None)
+
+    datetime_columns = [
+        i for i, key in enumerate(keys)
+        if (frame is not None and key in frame.columns and pd.api.types.is_datetime64_any_dtype(frame[key])) or (rows and isinstance(rows[0][i], datetime.datetime))
+    ]
+
+    if not datetime_columns:
+        return rows
+
+    rows = [list(row) for row in rows]
+    for row in rows:
+        for i in datetime_columns:
+            if isinstance(row[i], datetime.datetime):
+                row[i] = row[i].isoformat(" ", timespec="microseconds")
+
+    return rows
+
+
+def insert_executemany(pd_table, conn, keys: List[str], data_iter) -> int:
+    data = [dict(zip(keys, row)) for row in data_iter]
+    result = conn.execute(pd_table.table.insert(), data)
+    return result.rowcount
+
+
+def insert_multi_values(pd_table, conn, keys: List[str], data_iter) -> int:
+    rows = list(data_iter)
+    placeholder = PLACEHOLDERS.get(conn.dialect.paramstyle)
+
+    if conn.dialect.name == "sqlite":
+        rows = sqlite_rows(pd_table, keys, rows)
+
+    if placeholder is None:
+        result = conn.execute(pd_table.table.insert().values([dict(zip(keys, row)) for row in rows]))
+        return result.rowcount
+
+    #building the statement text directly avoids compiling a new SQLAlchemy construct for every chunk
+    values = f"({', '.join(placeholder for _ in keys)})"
+    statement = f"INSERT INTO {table_name(pd_table)} ({', '.join(keys)}) VALUES {', '.join(values for _ in rows)}"
+
+    result = conn.exec_driver_sql(statement, tuple(itertools.chain.from_iterable(rows)))
+    return result.rowcount
+
+
+def insert_copy(pd_table, conn, keys: List[str], data_iter) -> int:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(data_iter)
+    buffer.seek(0)
+
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table_name(pd_table)} ({', '.join(keys)}) FROM STDIN WITH CSV", buffer)
+        return cursor.rowcount
+
+
+def insert_sqlite(pd_table, conn, keys: List[str], data_iter) -> int:
+    statement = f"INSERT INTO {table_name(pd_table)} ({', '.join(keys)}) VALUES ({', '.join('?' for _ in keys)})"
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.executemany(statement, sqlite_rows(pd_table, keys, list(data_iter)))
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def parameter_chunksize(dialect: str, columns: int) -> int:
+    return max(1, min(MAX_VALUES_ROWS, MAX_PARAMETERS.get(dialect, DEFAULT_MAX_PARAMETERS) // max(columns, 1)))
+
+
+def streaming_chunksize(dialect: str, columns: int) -> int:
+    return STREAMING_CHUNKSIZE
+
+
+#name: (to_sql method, chunksize(dialect, columns))
+BULK_LOAD_STRATEGIES: Dict[str, tuple[Callable, Callable]] = {
+    "executemany": (insert_executemany, streaming_chunksize),
+    "multi": (insert_multi_values, parameter_chunksize),
+    "copy": (insert_copy, streaming_chunksize),
+    "sqlite": (insert_sqlite, streaming_chunksize),
+}
+
+#default strategy for each dialect+driver. Other dialects use multi-row inserts.
+DIALECT_STRATEGIES = {
+    "postgresql+psycopg2": "copy",
+    "sqlite+pysqlite": "sqlite",
+}
+
+DEFAULT_STRATEGY = "multi"
+
+
+def default_strategy(dialect: str, driver: str) -> str:
+    return DIALECT_STRATEGIES.get(f"{dialect}+{driver}", DEFAULT_STRATEGY)
@@ -3,7 +3,19 @@ from abc import ABC, abstractmethod
 import pandas as pd
 from typedframe import TypedDataFrame
 
-from typing import List, Type
+from sequential_loading.predicates import Predicate, as_predicate
+
+from typing import Dict, Iterator, List, Type
+
+import re
+
+
+#each stored row is stamped with the ingestion batch that wrote it, and each deleted row is copied to {name}_deletions with the batch that deleted it
+BATCH_COLUMN = "ingestion_batch"
+DELETION_COLUMN = "deletion_batch"
+
+#pandas period frequencies of the time buckets a summary can be grouped by
+SUMMARY_BUCKETS = {"day": "D", "month": "M", "year": "Y"}
 
 
 """
@@ -25,6 +37,27 @@ store: (processor: DataProcessor) -> pd.DataFrame:
 retrieve: (processor: DataProcessor) -> pd.DataFrame:
     Retrieves data from storage into processor.data and processor.metadata based on specified conditions.
 
+stream_processor: (name: str, query: str, batch_size: int) -> Iterator[pd.DataFrame]:
+    Retrieves data from a processor in batches of at most batch_size rows.
+
+stream_data: (processor_names: List[str], ..., batch_size: int, shard: (int, int)) -> Iterator[pd.DataFrame]:
+    Retrieves joined data from several processors in batches of at most batch_size rows.
+
+retrieve_since: (name: str, watermark: int, query: str) -> (pd.DataFrame, pd.DataFrame, int):
+    Retrieves the rows added and deleted since watermark, along with the watermark to pass next time.
+
+prune_deletions: (name: str, watermark: int) -> int:
+    Removes the deletions recorded up to watermark, once every consumer has read past it, returning the number removed.
+
+summarize: (name: str, key_columns: List[str], time_column: str, bucket: str, query: str, reconcile: bool) -> pd.DataFrame:
+    Counts the rows of each key (and time bucket), along with their first and last times, without loading the rows.
+
+delete_duplicates: (name: str, key_columns: List[str], query: str) -> int:
+    Deletes all but the first stored of each group of rows sharing key_columns, returning the number of rows deleted.
+
+optimize: (name: str, vacuum: bool) -> None:
+    Reclaims the space of deleted rows and refreshes the statistics and indexes of a processor, or of the whole storage.
+
 delete_rows: (processor: DataProcessor, ids: List[str]) -> None:
     Deletes rows from storage based on specified ids.
 
@@ -34,7 +67,8 @@ delete_processor: (processor: DataProcessor) -> None:
 """
 class DataStorage(ABC):
 
-    def retrieve_data(self, processor_names: List[str], join_column: str = None, query: str = None, join_columns: List[str] = None, queries: List[str] = None, suffixes: List[str] = None, **kwargs) -> pd.DataFrame:
+    #normalizes the arguments of retrieve_data into one query per processor and one join column and suffix per join
+    def retrieval_arguments(self, processor_names: List[str], join_column: str = None, query: str = None, join_columns: List[str] = None, queries: List[str] = None, suffixes: List[str] = None) -> tuple[List[str], List[str], List[str]]:
         assert not query or not queries, "Only query or queries can be specified"
         assert not join_column or not join_columns, "Only join_column or join_columns can be specified"
 
@@ -51,6 +85,43 @@ class DataStorage(ABC):
 
         if not join_column and not join_columns:
             join_columns = [None] * (len(processor_names) - 1)
+
+        if suffixes is None:
+            suffixes = [str(i) for i in range(len(processor_names) - 1)]
+
+        return queries, join_columns, suffixes
+
+    #names the columns of each processor in a join as pandas.merge would: join columns are kept once, from the first processor, and overlapping columns are suffixed
+    def join_labels(self, processor_columns: List[List[str]], join_columns: List[str], suffixes: List[str]) -> List[Dict[str, str]]:
+        labels = [{column: column for column in processor_columns[0]}]
+        output = set(processor_columns[0])
+
+        for columns, join_column, suffix in zip(processor_columns[1:], join_columns, suffixes):
+            join_column = [join_column] if isinstance(join_column, str) else join_column
+
+            processor_labels = {}
+            for column in columns:
+                if column in join_column:
+                    continue
+
+                processor_labels[column] = f"{column}{suffix}" if column in output else column
+                output.add(processor_labels[column])
+
+            labels.append(processor_labels)
+
+        return labels
+
+    #keeps the labels that contain any of the selected column names
+    def select_labels(self, labels: List[Dict[str, str]], selected_columns: List[str] = None) -> List[Dict[str, str]]:
+        if selected_columns is None:
+            return labels
+
+        pattern = re.compile(f"({'|'.join(selected_columns)})")
+        return [{column: label for column, label in processor_labels.items() if pattern.search(label)} for processor_labels in labels]
+
+    #selected_columns keeps the columns whose names contain any of the selected names, including suffixed columns
+    def retrieve_data(self, processor_names: List[str], join_column: str = None, query: str = None, join_columns: List[str] = None, queries: List[str] = None, suffixes: List[str] = None, selected_columns: List[str] = None, **kwargs) -> pd.DataFrame:
+        queries, join_columns, suffixes = self.retrieval_arguments(processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes)
         
         full_table = self.retrieve_processor(processor_names[0], query=queries[0], **kwargs)
 
@@ -58,6 +129,9 @@ class DataStorage(ABC):
             data = self.retrieve_processor(p_name, query=p_query, **kwargs)
             full_table = full_table.merge(data, on=p_column, how='inner', suffixes=("", suffix))
 
+        if selected_columns is not None:
+            full_table = full_table.filter(regex=f"({'|'.join(selected_columns)})")
+
         return full_table
 
     #initialize a data processor
@@ -74,13 +148,137 @@ class DataStorage(ABC):
         pass
 
     @abstractmethod
-    def delete_data(self, name: str, query: str, **kwargs) -> None:
+    def delete_data(self, name: str, query: str | Predicate, **kwargs) -> None:
         pass
 
     @abstractmethod
-    def retrieve_processor(self, name: str, query: str = None, **kwargs) -> pd.DataFrame:
+    def retrieve_processor(self, name: str, query: str | Predicate = None, **kwargs) -> pd.DataFrame:
         pass
 
+    #storages should override this so that callers can tell a missing processor apart from a failed read
+    def has_processor(self, name: str) -> bool:
+        return True
+
+    #storages that can read incrementally should override this to avoid loading the full table
+    def stream_processor(self, name: str, query: str | Predicate = None, batch_size: int = 10000, **kwargs) -> Iterator[pd.DataFrame]:
+        data = self.retrieve_processor(name, query=query, **kwargs)
+
+        for start in range(0, len(data), batch_size):
+            yield data.iloc[start:start + batch_size]
+
+    #shard=(index, count) yields only every count-th batch, starting from batch index, so that several readers can divide the result between them
+    #storages that can join incrementally should override this to avoid loading the full result
+    def stream_data(self, processor_names: List[str], join_column: str = None, query: str = None, join_columns: List[str] = None, queries: List[str] = None, suffixes: List[str] = None, selected_columns: List[str] = None, batch_size: int = 10000, shard: tuple[int, int] = None, **kwargs) -> Iterator[pd.DataFrame]:
+        data = self.retrieve_data(processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes, selected_columns=selected_columns, **kwargs)
+        index, count = shard or (0, 1)
+
+        for batch, start in enumerate(range(0, len(data), batch_size)):
+            if batch % count == index:
+                yield data.iloc[start:start + batch_size]
+
+    #returns (added, deleted, watermark). A watermark of None returns every row as added.
+    def retrieve_since(self, name: str, watermark: int = None, query: str | Predicate = None, **kwargs) -> tuple[pd.DataFrame, pd.DataFrame, int]:
+        raise NotImplementedError(f"{type(self).__name__} does not track ingestion batches.")
+
+    #deletions are kept until they are pruned, so watermark should be the oldest watermark of any consumer
+    def prune_deletions(self, name: str, watermark: int, **kwargs) -> int:
+        raise NotImplementedError(f"{type(self).__name__} does not track ingestion batches.")
+
+    #storages that cannot identify individual rows do not support deduplication
+    def delete_duplicates(self, name: str, key_columns: List[str], query: str | Predicate = None, **kwargs) -> int:
+        raise NotImplementedError(f"{type(self).__name__} does not support deleting duplicate rows.")
+
+    #storages that accumulate dead space or statistics should override this
+    def optimize(self, name: str = None, vacuum: bool = False, **kwargs) -> None:
+        pass
+
+    #parameter columns are summarized by default, if the processor's schema is known
+    def summary_keys(self, name: str) -> List[str]:
+        schema = getattr(self, "schemas", {}).get(name)
+        return list(getattr(schema, "categorical_columns", None) or [])
+
+    #returns one row per key, or per key and bucket ("day", "month" or "year") of time_column, with its number of rows and its first and last time.
+    #Without buckets, each key is reconciled with the processor's metadata: its domain and collected_items are added, with difference = rows - collected_items.
+    #storages that can aggregate in place should override this to avoid reading every row
+    def summarize(self, name: str, key_columns: List[str] = None, time_column: str = None, bucket: str = None, query: str | Predicate = None, reconcile: bool = True, batch_size: int = 100000) -> pd.DataFrame:
+        assert bucket is None or time_column is not None, "A time_column must be specified to summarize by bucket"
+        assert bucket in (None, *SUMMARY_BUCKETS), f"bucket must be one of {list(SUMMARY_BUCKETS)}"
+
+        key_columns = self.summary_keys(name) if key_columns is None else key_columns
+        groups = key_columns + (["bucket"] if bucket else [])
+
+        partials = []
+        for batch in self.stream_processor(name, query=query, batch_size=batch_size):
+            if bucket:
+                batch = batch.assign(bucket=pd.to_datetime(batch[time_column]).dt.to_period(SUMMARY_BUCKETS[bucket]).dt.to_timestamp())
+
+            batch = batch.assign(rows=1)
+            if time_column is not None:
+                batch = batch.assign(first=batch[time_column], last=batch[time_column])
+
+            partials.append(self.aggregate_summary(batch, groups, time_column))
+
+        #the summaries of each batch are combined
+        partials = partials or [pd.DataFrame(columns=[*groups, "rows", "first", "last"])]
+        summary = self.aggregate_summary(pd.concat(partials, ignore_index=True), groups, time_column)
+
+        return self.finish_summary(name, summary, key_columns, time_column, bucket, reconcile, query)
+
+    #sums the rows column, and takes the earliest first and latest last time, per group
+    def aggregate_summary(self, data: pd.DataFrame, groups: List[str], time_column: str = None) -> pd.DataFrame:
+        aggregations = {"rows": ("rows", "sum")}
+
+        if time_column is not None:
+            aggregations.update({"first": ("first", "min"), "last": ("last", "max")})
+
+        if not groups:
+            return pd.DataFrame({column: [data[source].agg(function)] for column, (source, function) in aggregations.items()})
+
+        for column in groups:
+            if isinstance(data[column].dtype, pd.CategoricalDtype):
+                data = data.astype({column: str})
+
+        return data.groupby(groups, dropna=False, sort=True).agg(**aggregations).reset_index()
+
+    #types the summary's columns, and reconciles it with the processor's metadata.
+    #Only queries on key columns can be applied to the metadata, so summaries of other queries (e.g. of a time range) are not reconciled.
+    def finish_summary(self, name: str, summary: pd.DataFrame, key_columns: List[str], time_column: str = None, bucket: str = None, reconcile: bool = True, query: str | Predicate = None) -> pd.DataFrame:
+        summary = summary.astype({"rows": int})
+
+        for column in ["first", "last", "bucket"]:
+            if column in summary.columns:
+                summary[column] = pd.to_datetime(summary[column])
+
+        if not reconcile or bucket or not key_columns or not self.has_processor(f"{name}_metadata"):
+            return summary
+
+        try:
+            predicate = as_predicate(query)
+        except ValueError:
+            return summary
+
+        if predicate is not None and not predicate.columns() <= set(key_columns):
+            return summary
+
+        metadata = self.retrieve_processor(f"{name}_metadata")
+
+        if metadata.empty or not set(key_columns) <= set(metadata.columns):
+            return summary
+
+        if predicate is not None:
+            metadata = predicate.filter(metadata)
+
+        metadata = metadata[[column for column in [*key_columns, "domain", "collected_items"] if column in metadata.columns]]
+
+        #keys with metadata but no rows are kept, with zero rows
+        summary = summary.astype({column: str for column in key_columns}).merge(metadata.astype({column: str for column in key_columns}), on=key_columns, how="outer")
+        summary["rows"] = summary["rows"].fillna(0).astype(int)
+
+        if "collected_items" in summary.columns:
+            summary["difference"] = summary["rows"] - summary["collected_items"].fillna(0).astype(int)
+
+        return summary.sort_values(key_columns, ignore_index=True)
+
 
     
     # @abstractmethod
@@ -0,0 +1,568 @@
+from sequential_loading.data_storage.data_storage import DataStorage, BATCH_COLUMN, DELETION_COLUMN
+from sequential_loading.data_typing import apply_schema_dtypes
+from sequential_loading.predicates import Predicate, And, Equals, Range, as_predicate
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow.fs import LocalFileSystem
+
+from typing import Dict, Iterator, List, Type
+import pandas as pd
+import numpy as np
+from typedframe import TypedDataFrame, DATE_TIME_DTYPE
+
+import json
+import logging
+import os
+import shutil
+import threading
+import urllib.parse
+import uuid
+
+
+"""
+Columnar storage of processors as directories of Parquet files.
+
+Data is partitioned hive-style by the non-time columns of a processor's first index (its parameter columns),
+and by a time bucket computed from the time column of that index. Filters are pushed down to partition
+pruning and row group statistics, only the requested columns are read, and files are memory-mapped.
+
+Metadata is stored unpartitioned, and is replaced on each write.
+
+Each store_data and delete_data is recorded as an ingestion batch, numbered in _batches.json at the root of the storage.
+Stored rows are stamped with their batch, and deleted rows are written to {name}_deletions with the batch that deleted them.
+Batches are numbered by this process, so a storage directory should have one writer at a time.
+
+Members
+-------
+path: str
+    The root directory of the storage.
+
+time_bucket: str
+    The granularity of time partitions: "year", "month" or "day".
+
+"""
+#records the files superseded by a merged file while a partition is merged
+SUPERSEDED_FILE = "_superseded.json"
+
+
+class ParquetStorage(DataStorage):
+
+    type_mapping = {
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        bool: pa.bool_(),
+        np.float64: pa.float64(),
+        np.int64: pa.int64(),
+        DATE_TIME_DTYPE: pa.timestamp("ns")
+    }
+
+    bucket_formats = {
+        "year": "%Y",
+        "month": "%Y-%m",
+        "day": "%Y-%m-%d"
+    }
+
+    #name of the partition column holding the time bucket
+    bucket_column = "time_bucket"
+
+    def __init__(self, path: str, create_storage: bool = False, time_bucket: str = "year"):
+        super().__init__()
+
+        if not os.path.isdir(path):
+            if create_storage:
+                os.makedirs(path)
+            else:
+                raise Exception(f"A storage directory {path} does not exist. To create one, set create_storage=True.")
+
+        assert time_bucket in self.bucket_formats, f"time_bucket must be one of {list(self.bucket_formats.keys())}"
+
+        self.path = path
+        self.time_bucket = time_bucket
+        self.filesystem = LocalFileSystem(use_mmap=True)
+
+        self.schemas = {}
+        self.partitions = {}
+
+        self.batch_lock = threading.Lock()
+
+        self.logger = logging.getLogger(__name__)
+
+    def processor_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def has_processor(self, name: str) -> bool:
+        return os.path.isdir(self.processor_path(name))
+
+    #partitioning is stored with the processor, so that it does not depend on how the storage was created
+    def partitioning_path(self, name: str) -> str:
+        return os.path.join(self.processor_path(name), "_partitioning.json")
+
+    def initialize(self, name: str, tableschema: Type[TypedDataFrame], primary_keys: tuple[str] = None, indexes: List[List[str]] = None, create_processor: bool = False) -> None:
+        if not os.path.isdir(self.processor_path(name)):
+            if create_processor:
+                self.logger.info(f"Creating Processor {name}...")
+
+                index = indexes[0] if indexes else []
+                time_columns = [column for column in index if tableschema.schema.get(column) == DATE_TIME_DTYPE]
+
+                os.makedirs(self.processor_path(name))
+                with open(self.partitioning_path(name), "w") as file:
+                    json.dump({
+                        "columns": [column for column in index if column not in time_columns],
+                        "time_column": time_columns[0] if time_columns else None,
+                        "time_bucket": self.time_bucket
+                    }, file)
+
+                self.logger.info(f"Created Processor {name}")
+            else:
+                raise Exception(f"Processor {name} does not exist. To create one, set create_processor=True.")
+
+        self.schemas[name] = tableschema
+        self.partitions.pop(name, None)
+
+        self.recover(name)
+
+    def partitioning(self, name: str) -> dict:
+        if name not in self.partitions:
+            if os.path.isfile(self.partitioning_path(name)):
+                with open(self.partitioning_path(name)) as file:
+                    self.partitions[name] = json.load(file)
+            else:
+                self.partitions[name] = {"columns": [], "time_column": None, "time_bucket": self.time_bucket}
+
+        return self.partitions[name]
+
+    def partition_columns(self, name: str) -> List[str]:
+        partitioning = self.partitioning(name)
+        return partitioning["columns"] + ([self.bucket_column] if partitioning["time_column"] else [])
+
+    def partition_schema(self, name: str) -> pa.Schema:
+        return pa.schema([(column, pa.string()) for column in self.partition_columns(name)])
+
+    #schema of the columns stored in files, excluding partition columns
+    def file_schema(self, name: str) -> pa.Schema:
+        if name not in self.schemas:
+            return None
+
+        partition_columns = self.partition_columns(name)
+        columns = [(column, self.type_mapping[dtype]) for column, dtype in self.schemas[name].schema.items() if column not in partition_columns]
+
+        #files written before batches were tracked have no batch column, which is read as null
+        return pa.schema(columns + [(BATCH_COLUMN, pa.int64())])
+
+    def dataset(self, name: str) -> ds.Dataset:
+        if not os.path.isdir(self.processor_path(name)):
+            raise Exception(f"Processor {name} does not exist.")
+
+        file_schema = self.file_schema(name)
+        schema = pa.unify_schemas([file_schema, self.partition_schema(name)]) if file_schema is not None else None
+
+        return ds.dataset(
+            self.processor_path(name),
+            schema=schema,
+            format="parquet",
+            partitioning=ds.partitioning(self.partition_schema(name), flavor="hive"),
+            filesystem=self.filesystem
+        )
+
+    #columns of a processor, in schema order if the schema is known
+    def columns(self, name: str) -> List[str]:
+        if name in self.schemas:
+            return list(self.schemas[name].schema.keys())
+
+        return [column for column in self.dataset(name).schema.names if column not in (self.bucket_column, BATCH_COLUMN)]
+
+    def bucket(self, name: str, value) -> str:
+        return pd.Timestamp(value).strftime(self.bucket_formats[self.partitioning(name)["time_bucket"]])
+
+    #adds conditions on the time bucket for conditions on the time column, so that whole partitions are skipped
+    def bucket_predicate(self, name: str, predicate: Predicate) -> Predicate:
+        time_column = self.partitioning(name)["time_column"]
+
+        if time_column is None:
+            return predicate
+
+        conditions = predicate.predicates if isinstance(predicate, And) else (predicate,)
+        bucket_conditions = []
+
+        for condition in conditions:
+            if isinstance(condition, Equals) and condition.column == time_column:
+                bucket_conditions.append(Equals(self.bucket_column, self.bucket(name, condition.value)))
+            elif isinstance(condition, Range) and condition.column == time_column:
+                bucket_conditions.append(Range(
+                    self.bucket_column,
+                    lower=self.bucket(name, condition.lower) if condition.lower is not None else None,
+                    upper=self.bucket(name, condition.upper) if condition.upper is not None else None
+                ))
+
+        return And(predicate, *bucket_conditions)
+
+    def filter_expression(self, name: str, query: str | Predicate, schema: pa.Schema, default: bool = True) -> ds.Expression:
+        if not query:
+            return ds.scalar(default)
+
+        return self.bucket_predicate(name, as_predicate(query)).compile_arrow(schema)
+
+    def to_frame(self, name: str, table: pa.Table) -> pd.DataFrame:
+        if name in self.schemas:
+            table = table.select([column for column in self.schemas[name].schema if column in table.column_names])
+            return apply_schema_dtypes(table.to_pandas(), self.schemas[name])
+
+        table = table.drop_columns([column for column in (self.bucket_column, BATCH_COLUMN) if column in table.column_names])
+
+        return table.to_pandas()
+
+    def write_file(self, table: pa.Table, path: str) -> None:
+        #write to a temporary file first, so that readers never see a partially written file.
+        #Its name starts with an underscore, so that datasets do not list it.
+        temporary_path = os.path.join(os.path.dirname(path), f"_{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+        pq.write_table(table, temporary_path)
+        os.replace(temporary_path, path)
+
+    def batches_path(self) -> str:
+        return os.path.join(self.path, "_batches.json")
+
+    def latest_batch(self) -> int:
+        if not os.path.isfile(self.batches_path()):
+            return 0
+
+        with open(self.batches_path()) as file:
+            return json.load(file)["latest"]
+
+    #records a new ingestion batch and returns its id
+    def create_batch(self) -> int:
+        with self.batch_lock:
+            batch = self.latest_batch() + 1
+
+            self.write_json({"latest": batch}, self.batches_path())
+
+            return batch
+
+    def partition_directory(self, name: str, values: tuple) -> str:
+        segments = [f"{column}={urllib.parse.quote(str(value), safe='')}" for column, value in zip(self.partition_columns(name), values)]
+        return os.path.join(self.processor_path(name), *segments)
+
+    def append(self, name: str, data: pd.DataFrame) -> None:
+        partitioning = self.partitioning(name)
+        time_column = partitioning["time_column"]
+
+        if time_column is not None:
+            data = data.assign(**{self.bucket_column: data[time_column].dt.strftime(self.bucket_formats[partitioning["time_bucket"]])})
+            data = data.sort_values(time_column)
+
+        partition_columns = self.partition_columns(name)
+        file_schema = self.file_schema(name)
+        groups = data.groupby(partition_columns, sort=False) if partition_columns else [((), data)]
+
+        for values, group in groups:
+            values = values if isinstance(values, tuple) else (values,)
+            directory = self.partition_directory(name, values)
+            os.makedirs(directory, exist_ok=True)
+
+            group = group.drop(columns=partition_columns)
+            table = pa.Table.from_pandas(group[file_schema.names] if file_schema is not None else group, schema=file_schema, preserve_index=False)
+            self.write_file(table, os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet"))
+
+    def replace(self, name: str, data: pd.DataFrame) -> None:
+        directory = self.processor_path(name)
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, "part-0.parquet")
+        self.write_file(pa.Table.from_pandas(data, preserve_index=False), path)
+
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".parquet") and file_name != "part-0.parquet":
+                os.remove(os.path.join(directory, file_name))
+
+    def store_data(self, name: str, data: pd.DataFrame = None, metadata: pd.DataFrame = None) -> None:
+        if data is not None and not data.empty:
+            self.append(name, data.assign(**{BATCH_COLUMN: self.create_batch()}))
+
+        if metadata is not None:
+            self.replace(f"{name}_metadata", metadata)
+
+    def retrieve_processor(self, name: str, query: str | Predicate = None, columns: List[str] = None) -> pd.DataFrame:
+        dataset = self.dataset(name)
+        table = dataset.to_table(filter=self.filter_expression(name, query, dataset.schema), columns=columns)
+
+        return self.to_frame(name, table)
+
+    #shard=(index, count) reads only every count-th file, starting from file index, so that several readers divide the processor's files between them
+    def stream_processor(self, name: str, query: str | Predicate = None, batch_size: int = 10000, batch_format: str = "pandas", columns: List[str] = None, shard: tuple[int, int] = None) -> Iterator[pd.DataFrame]:
+        assert batch_format in ("pandas", "arrow"), "batch_format must be 'pandas' or 'arrow'"
+
+        dataset = self.dataset(name)
+        expression = self.filter_expression(name, query, dataset.schema)
+
+        if shard is None:
+            batches = dataset.to_batches(filter=expression, columns=columns, batch_size=batch_size)
+        else:
+            fragments = [fragment for i, fragment in enumerate(dataset.get_fragments(filter=expression)) if i % shard[1] == shard[0]]
+            batches = (batch for fragment in fragments for batch in fragment.to_batches(schema=dataset.schema, filter=expression, columns=columns, batch_size=batch_size))
+
+        empty = True
+        for batch in batches:
+            empty = False
+            yield batch if batch_format == "arrow" else self.to_frame(name, pa.Table.from_batches([batch]))
+
+        #always yield at least one batch so that the columns of an empty result are known
+        if empty and batch_format == "pandas":
+            yield self.to_frame(name, dataset.schema.empty_table().select(columns) if columns is not None else dataset.schema.empty_table())
+
+    #the columns read from each processor in a join, and their labels in the joined result
+    def join_plan(self, processor_names: List[str], join_columns: List[List[str]], suffixes: List[str], selected_columns: List[str] = None) -> tuple[List[List[str]], List[Dict[str, str]], List[str]]:
+        processor_columns = [self.columns(name) for name in processor_names]
+        labels = self.join_labels(processor_columns, join_columns, suffixes)
+        selected_labels = self.select_labels(labels, selected_columns)
+
+        read_columns = []
+        for i, (processor_labels, processor_selected) in enumerate(zip(labels, selected_labels)):
+            #columns this processor is joined on, or provides for later joins
+            joined = set(join_columns[i - 1]) if i > 0 else set()
+            joined |= {column for column, label in processor_labels.items() if any(label in later for later in join_columns[i:])}
+
+            read_columns.append([column for column in processor_columns[i] if column in processor_selected or column in joined])
+
+        output_columns = [label for processor_labels in selected_labels for label in processor_labels.values()]
+        return read_columns, labels, output_columns
+
+    #only the selected and joined columns of each processor are read
+    def retrieve_data(self, processor_names: List[str], join_column: str = None, query: str = None, join_columns: List[str] = None, queries: List[str] = None, suffixes: List[str] = None, selected_columns: List[str] = None) -> pd.DataFrame:
+        queries, join_columns, suffixes = self.retrieval_arguments(processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes)
+        join_columns = [[column] if isinstance(column, str) else column for column in join_columns]
+
+        read_columns, labels, output_columns = self.join_plan(processor_names, join_columns, suffixes, selected_columns)
+
+        full_table = None
+        for i, (name, p_query, columns, processor_labels) in enumerate(zip(processor_names, queries, read_columns, labels)):
+            data = self.retrieve_processor(name, query=p_query, columns=columns)
+            data = data[columns].rename(columns=processor_labels)
+
+            full_table = data if full_table is None else full_table.merge(data, on=join_columns[i - 1], how="inner")
+
+        return full_table[output_columns]
+
+    #the first processor is read in batches, and each batch is joined with the other processors, which are read whole.
+    #Joined processors should therefore be the smaller ones, e.g. market data joined onto many tickers' prices.
+    def stream_data(self, processor_names: List[str], join_column: str = None, query: str = None, join_columns: List[str] = None, queries: List[str] = None, suffixes: List[str] = None, selected_columns: List[str] = None, batch_size: int = 10000, shard: tuple[int, int] = None, **kwargs) -> Iterator[pd.DataFrame]:
+        queries, join_columns, suffixes = self.retrieval_arguments(processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes)
+        join_columns = [[column] if isinstance(column, str) else column for column in join_columns]
+
+        read_columns, labels, output_columns = self.join_plan(processor_names, join_columns, suffixes, selected_columns)
+
+        joined = [
+            self.retrieve_processor(name, query=p_query, columns=columns)[columns].rename(columns=processor_labels)
+            for name, p_query, columns, processor_labels in zip(processor_names[1:], queries[1:], read_columns[1:], labels[1:])
+        ]
+
+        for data in self.stream_processor(processor_names[0], query=queries[0], batch_size=batch_size, columns=read_columns[0], shard=shard):
+            data = data[read_columns[0]].rename(columns=labels[0])
+
+            for other, on in zip(joined, join_columns):
+                data = data.merge(other, on=on, how="inner")
+
+            yield data[output_columns]
+
+    def delete_data(self, name: str, query: str | Predicate = None) -> int:
+        dataset = self.dataset(name)
+        expression = self.filter_expression(name, query, dataset.schema, default=False)
+        partition_columns = self.partition_columns(name)
+
+        batch = None
+        deleted_count = 0
+        for fragment in dataset.get_fragments(filter=expression):
+            table = fragment.to_table(schema=dataset.schema)
+            #rows for which the filter is null are kept, as they are not selected for deletion
+            remaining = table.filter(~expression | expression.is_null())
+
+            if remaining.num_rows == table.num_rows:
+                continue
+
+            deleted_count += table.num_rows - remaining.num_rows
+
+            batch = batch or self.create_batch()
+            self.record_deletions(name, table.filter(expression), batch)
+
+            if remaining.num_rows == 0:
+                os.remove(fragment.path)
+            else:
+                self.write_file(remaining.drop_columns(partition_columns), fragment.path)
+
+        return deleted_count
+
+    #rows are compared by key_columns, and the first stored row of each group is kept, as in SQLStorage. Rows are stored in the order of their batches,
+    #and within a batch in the order of their files. Deleted duplicates are recorded as deletions.
+    def delete_duplicates(self, name: str, key_columns: List[str], query: str | Predicate = None) -> int:
+        dataset = self.dataset(name)
+        expression = self.filter_expression(name, query, dataset.schema)
+        partition_columns = self.partition_columns(name)
+
+        fragments = list(dataset.get_fragments(filter=expression))
+        tables = [fragment.to_table(schema=dataset.schema) for fragment in fragments]
+
+        #the selected rows of every file, identified by their file and position
+        selected = []
+        for i, table in enumerate(tables):
+            positions = table.append_column("_position", pa.array(np.arange(table.num_rows), type=pa.int64())).filter(expression)
+            frame = positions.select([*key_columns, BATCH_COLUMN, "_position"]).to_pandas()
+            selected.append(frame.assign(_fragment=i))
+
+        if not selected:
+            return 0
+
+        rows = pd.concat(selected, ignore_index=True)
+        rows[BATCH_COLUMN] = rows[BATCH_COLUMN].fillna(0)
+        rows = rows.sort_values([BATCH_COLUMN, "_fragment", "_position"], kind="stable")
+
+        duplicates = rows[rows.duplicated(subset=key_columns, keep="first")]
+        if duplicates.empty:
+            return 0
+
+        batch = self.create_batch()
+        for i, positions in duplicates.groupby("_fragment")["_position"]:
+            table = tables[i]
+            mask = np.zeros(table.num_rows, dtype=bool)
+            mask[positions.to_numpy()] = True
+
+            self.record_deletions(name, table.filter(pa.array(mask)), batch)
+
+            remaining = table.filter(pa.array(~mask))
+            if remaining.num_rows == 0:
+                os.remove(fragments[i].path)
+            else:
+                self.write_file(remaining.drop_columns(partition_columns), fragments[i].path)
+
+        return len(duplicates)
+
+    #deleted rows are written unpartitioned to {name}_deletions, with the batch that deleted them
+    def record_deletions(self, name: str, table: pa.Table, batch: int) -> None:
+        directory = self.processor_path(f"{name}_deletions")
+        os.makedirs(directory, exist_ok=True)
+
+        table = table.select(self.columns(name))
+        table = table.append_column(DELETION_COLUMN, pa.array([batch] * table.num_rows, type=pa.int64()))
+
+        self.write_file(table, os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet"))
+
+    #rows stored after watermark are returned as added, and rows deleted after watermark as deleted. Rows stored before batches were tracked are only returned when watermark is None.
+    #Rows are bounded by the latest batch when the call starts, so that rows stored during the call are returned by the next call rather than twice.
+    def retrieve_since(self, name: str, watermark: int = None, query: str | Predicate = None) -> tuple[pd.DataFrame, pd.DataFrame, int]:
+        latest = self.latest_batch()
+
+        dataset = self.dataset(name)
+        batch = ds.field(BATCH_COLUMN)
+
+        if watermark is None:
+            bounds = batch.is_null() | (batch <= latest)
+        else:
+            bounds = (batch > watermark) & (batch <= latest)
+
+        added = self.to_frame(name, dataset.to_table(filter=self.filter_expression(name, query, dataset.schema) & bounds))
+        deleted = added.iloc[0:0]
+
+        deletions_path = self.processor_path(f"{name}_deletions")
+        if watermark is not None and os.path.isdir(deletions_path):
+            #deleted rows have the columns of the processor, as read from its dataset
+            schema = pa.schema([dataset.schema.field(column) for column in self.columns(name)] + [(DELETION_COLUMN, pa.int64())])
+            deletions = ds.dataset(deletions_path, schema=schema, format="parquet", filesystem=self.filesystem)
+            expression = as_predicate(query).compile_arrow(deletions.schema) if query else ds.scalar(True)
+
+            deletion = ds.field(DELETION_COLUMN)
+            deleted = self.to_frame(name, deletions.to_table(filter=expression & (deletion > watermark) & (deletion <= latest)))
+
+        return added, deleted, latest
+
+    def prune_deletions(self, name: str, watermark: int) -> int:
+        directory = self.processor_path(f"{name}_deletions")
+        if not os.path.isdir(directory):
+            return 0
+
+        pruned_count = 0
+        for file_name in os.listdir(directory):
+            if not file_name.endswith(".parquet"):
+                continue
+
+            path = os.path.join(directory, file_name)
+            table = pq.read_table(path)
+            remaining = table.filter(pc.greater(table[DELETION_COLUMN], watermark))
+
+            if remaining.num_rows == table.num_rows:
+                continue
+
+            pruned_count += table.num_rows - remaining.num_rows
+
+            if remaining.num_rows == 0:
+                os.remove(path)
+            else:
+                self.write_file(remaining, path)
+
+        return pruned_count
+
+    #each append writes new files, so the files of each partition are merged into one, sorted by time.
+    #Before the merged file is renamed into place, the files it supersedes are recorded in the partition's SUPERSEDED_FILE,
+    #so that if the merge is interrupted after the rename, recover removes them rather than leaving every row of the partition twice.
+    #Readers listing a partition between the rename and the removal may briefly see its rows twice.
+    def optimize(self, name: str = None, vacuum: bool = False) -> None:
+        names = [name] if name is not None else [entry for entry in sorted(os.listdir(self.path)) if os.path.isfile(self.partitioning_path(entry))]
+
+        for processor_name in names:
+            self.recover(processor_name)
+
+            dataset = self.dataset(processor_name)
+            partition_columns = self.partition_columns(processor_name)
+            time_column = self.partitioning(processor_name)["time_column"]
+
+            directories = {}
+            for fragment in dataset.get_fragments():
+                directories.setdefault(os.path.dirname(fragment.path), []).append(fragment)
+
+            for directory, fragments in directories.items():
+                if len(fragments) < 2:
+                    continue
+
+                table = pa.concat_tables([fragment.to_table(schema=dataset.schema) for fragment in fragments]).drop_columns(partition_columns)
+                if time_column is not None:
+                    table = table.sort_by(time_column)
+
+                merged = f"part-{uuid.uuid4().hex}.parquet"
+                self.write_json({"merged": merged, "files": [os.path.basename(fragment.path) for fragment in fragments]}, os.path.join(directory, SUPERSEDED_FILE))
+
+                self.write_file(table, os.path.join(directory, merged))
+                self.remove_superseded(directory)
+
+    def write_json(self, value, path: str) -> None:
+        temporary_path = os.path.join(os.path.dirname(path), f"_{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+        with open(temporary_path, "w") as file:
+            json.dump(value, file)
+        os.replace(temporary_path, path)
+
+    #removes the files superseded by a merged file, if it was renamed into place, and then the record of them
+    def remove_superseded(self, directory: str) -> None:
+        path = os.path.join(directory, SUPERSEDED_FILE)
+
+        with open(path) as file:
+            superseded = json.load(file)
+
+        if os.path.isfile(os.path.join(directory, superseded["merged"])):
+            for file_name in superseded["files"]:
+                if os.path.isfile(os.path.join(directory, file_name)):
+                    os.remove(os.path.join(directory, file_name))
+
+        os.remove(path)
+
+    #completes or abandons merges of a processor that were interrupted, e.g. by a crash
+    def recover(self, name: str) -> None:
+        for directory, _, file_names in os.walk(self.processor_path(name)):
+            if SUPERSEDED_FILE in file_names:
+                self.logger.info(f"Recovering interrupted merge in {directory}")
+                self.remove_superseded(directory)
+
+    def delete_processor(self, name: str) -> None:
+        for processor_name in (name, f"{name}_metadata", f"{name}_deletions"):
+            shutil.rmtree(self.processor_path(processor_name), ignore_errors=True)
+            self.schemas.pop(processor_name, None)
+            self.partitions.pop(processor_name, None)
@@ -0,0 +1,93 @@
+import pandas as pd
+
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Hashable, Iterable
+
+import threading
+
+
+"""
+Memory-bounded least-recently-used cache of query results, invalidated by table.
+
+Each entry records the tables it was read from. Writing to a table invalidates every entry that read from it.
+Only writes made through the owning storage are seen, so the cache should not be used when other processes write to the same database.
+
+Members
+-------
+max_bytes: int
+    The maximum total memory usage of cached dataframes. Results larger than this are not cached.
+
+Methods
+-------
+
+get_or_load: (key: Hashable, tables: Iterable[str], load: Callable[[], pd.DataFrame]) -> pd.DataFrame
+    Returns a copy of the cached result for key, loading and caching it first if necessary.
+
+invalidate: (*tables: str) -> None
+    Removes every cached result read from any of the tables.
+
+"""
+class ResultCache():
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+
+        #key: (result, tables, size)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        #incremented on each invalidation, so that results loaded before a write are not cached after it
+        self.generations = defaultdict(int)
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Hashable, tables: Iterable[str], load: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0].copy()
+
+            self.misses += 1
+            generations = {table: self.generations[table] for table in tables}
+
+        result = load()
+        self.put(key, generations, result)
+
+        return result.copy()
+
+    def put(self, key: Hashable, generations: Dict[str, int], result: pd.DataFrame) -> None:
+        size = int(result.memory_usage(deep=True).sum())
+
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if any(self.generations[table] != generation for table, generation in generations.items()):
+                return
+
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[2]
+
+            self.entries[key] = (result, frozenset(generations), size)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def invalidate(self, *tables: str) -> None:
+        tables = set(tables)
+
+        with self.lock:
+            for table in tables:
+                self.generations[table] += 1
+
+            for key in [key for key, (_, entry_tables, _) in self.entries.items() if entry_tables & tables]:
+                self.size -= self.entries.pop(key)[2]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
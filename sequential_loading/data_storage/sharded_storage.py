@@ -0,0 +1,249 @@
+from sequential_loading.data_storage.data_storage import DataStorage
+from sequential_loading.data_typing import concat_frames
+from sequential_loading.predicates import Predicate, And, Equals, In, Range, as_predicate
+
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Any, Callable, Dict, Iterator, List, Type
+import pandas as pd
+import numpy as np
+from typedframe import TypedDataFrame
+
+
+"""
+Storage that divides the rows of each processor between several underlying storages (shards), by parameter key.
+
+Rows are routed by a hash of their key columns, or, if boundaries are given, by ranges of the first key column:
+shard i holds the keys between boundaries[i - 1] (inclusive) and boundaries[i] (exclusive). Keys are compared in the type of the boundaries,
+so numeric boundaries route keys by their numeric value even if they are stored as text.
+By default, the key columns of a processor are its parameter columns, so every row of a key, and the key's metadata, are stored on the same shard.
+
+Writes and reads are sent to every shard concurrently, one thread per shard, and the results are merged.
+With hash sharding, queries that fix every key column with equality conditions are sent only to the key's shard.
+With range sharding, queries are sent to the shards whose ranges overlap their conditions on the first key column.
+Joins in retrieve_data are computed after merging each processor's rows, since a join may match keys stored on different shards.
+
+Members
+-------
+storages: List[DataStorage]
+    The shards. Their number and order determine where each key is stored, so they must not change once data is stored.
+
+key_columns: List[str]
+    Columns used to route every processor. By default, each processor's parameter columns are used.
+
+boundaries: List
+    n - 1 sorted values of the first key column dividing keys between n shards, e.g. numbers, timestamps or strings. If None, keys are routed by hash.
+
+Methods
+-------
+
+shard_indices: (name: str, data: pd.DataFrame) -> np.ndarray
+    Returns the shard of each row of data.
+
+query_shards: (name: str, query: str | Predicate) -> List[int]
+    Returns the shards that may hold rows matching query.
+
+"""
+class ShardedStorage(DataStorage):
+    def __init__(self, storages: List[DataStorage], key_columns: List[str] = None, boundaries: List[Any] = None):
+        super().__init__()
+
+        assert len(storages) > 0, "At least one storage must be given"
+        assert boundaries is None or len(boundaries) == len(storages) - 1, "boundaries must divide keys between every storage"
+        assert boundaries is None or pd.Series(boundaries).is_monotonic_increasing, "boundaries must be sorted"
+
+        self.storages = storages
+        self.key_columns = key_columns
+        self.boundaries = boundaries
+
+        #identifies the storage, e.g. in dataset cache keys
+        self.url = "|".join(str(getattr(storage, "url", None) or getattr(storage, "path", None)) for storage in storages)
+
+        self.schemas = {}
+        self.processor_keys = {}
+
+        #(name, shard): hash of the metadata last written to the shard, so that unchanged metadata is not rewritten
+        self.metadata_hashes = {}
+
+    #calls function(storage, shard) for each shard concurrently, returning the results in shard order.
+    #Threads are started for each call rather than pooled, so that the storage can be used after a fork.
+    def fan_out(self, function: Callable[[DataStorage, int], Any], shards: List[int] = None) -> List[Any]:
+        shards = list(range(len(self.storages))) if shards is None else shards
+
+        if len(shards) == 1:
+            return [function(self.storages[shards[0]], shards[0])]
+
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            return list(executor.map(lambda shard: function(self.storages[shard], shard), shards))
+
+    #metadata tables are routed by the keys of their processor
+    def keys(self, name: str) -> List[str]:
+        if self.key_columns is not None:
+            return self.key_columns
+
+        if name not in self.processor_keys and name.endswith("_metadata"):
+            return self.processor_keys.get(name[:-len("_metadata")], [])
+
+        return self.processor_keys.get(name, [])
+
+    def shard_indices(self, name: str, data: pd.DataFrame) -> np.ndarray:
+        key_columns = self.keys(name)
+
+        if len(self.storages) == 1 or not key_columns:
+            return np.zeros(len(data), dtype=int)
+
+        if self.boundaries is not None:
+            return self.range_shards(data[key_columns[0]])
+
+        #keys are hashed as strings, so that e.g. a parameter stored as text and queried as a number is routed to the same shard.
+        #hash_pandas_object is deterministic across processes, unlike hash()
+        keys = data[key_columns].astype(str)
+        return (pd.util.hash_pandas_object(keys, index=False).to_numpy() % np.uint64(len(self.storages))).astype(int)
+
+    #values are compared in the type of the boundaries, so that numeric keys stored as text are not compared as strings
+    def range_shards(self, values) -> np.ndarray:
+        boundaries = pd.Series(self.boundaries)
+        values = pd.Series(values)
+
+        if pd.api.types.is_numeric_dtype(boundaries.dtype):
+            values = pd.to_numeric(values)
+        elif pd.api.types.is_datetime64_any_dtype(boundaries.dtype):
+            values = pd.to_datetime(values)
+        else:
+            boundaries, values = boundaries.astype(str), values.astype(str)
+
+        return np.searchsorted(boundaries.to_numpy(), values.to_numpy(), side="right")
+
+    #with range sharding, conditions on the first key column select the shards whose ranges they overlap.
+    #With hash sharding, queries that fix every key column are sent to one shard. Other queries, including unparsed query strings, are sent to every shard.
+    def query_shards(self, name: str, query: str | Predicate = None) -> List[int]:
+        key_columns = self.keys(name)
+        every_shard = list(range(len(self.storages)))
+
+        try:
+            predicate = as_predicate(query)
+        except ValueError:
+            return every_shard
+
+        if predicate is None or not key_columns or len(self.storages) == 1:
+            return every_shard
+
+        conditions = predicate.predicates if isinstance(predicate, And) else (predicate,)
+
+        if self.boundaries is not None:
+            shards = set(every_shard)
+
+            for condition in conditions:
+                if getattr(condition, "column", None) != key_columns[0]:
+                    continue
+
+                if isinstance(condition, Equals):
+                    shards &= set(self.range_shards([condition.value]).tolist())
+                elif isinstance(condition, In):
+                    shards &= set(self.range_shards(list(condition.values)).tolist())
+                elif isinstance(condition, Range):
+                    first = int(self.range_shards([condition.lower])[0]) if condition.lower is not None else 0
+                    last = int(self.range_shards([condition.upper])[0]) if condition.upper is not None else len(self.storages) - 1
+                    shards &= set(range(first, last + 1))
+
+            #contradictory conditions match no rows, which one shard is asked for, so that the result has the processor's columns
+            return sorted(shards) or every_shard[:1]
+
+        values = {condition.column: condition.value for condition in conditions if isinstance(condition, Equals)}
+
+        if not set(key_columns) <= set(values):
+            return every_shard
+
+        key = pd.DataFrame({column: [values[column]] for column in key_columns})
+        return [int(self.shard_indices(name, key)[0])]
+
+    def split(self, name: str, data: pd.DataFrame) -> Dict[int, pd.DataFrame]:
+        shards = self.shard_indices(name, data)
+        return {shard: data[shards == shard] for shard in range(len(self.storages))}
+
+    def initialize(self, name: str, tableschema: Type[TypedDataFrame], primary_keys: tuple[str] = None, **kwargs) -> None:
+        #processors are routed by their parameter columns, which are the primary keys of their metadata
+        self.processor_keys[name] = list(getattr(tableschema, "categorical_columns", None) or (primary_keys if name.endswith("_metadata") else None) or [])
+        self.schemas[name] = tableschema
+
+        self.fan_out(lambda storage, shard: storage.initialize(name, tableschema, primary_keys=primary_keys, **kwargs))
+
+    def has_processor(self, name: str) -> bool:
+        return any(self.fan_out(lambda storage, shard: storage.has_processor(name)))
+
+    def delete_processor(self, name: str, **kwargs) -> None:
+        self.fan_out(lambda storage, shard: storage.delete_processor(name, **kwargs))
+
+        for key in [key for key in self.metadata_hashes if key[0] == name]:
+            self.metadata_hashes.pop(key)
+
+    #each shard is given its rows of data, and its rows of metadata if they have changed since they were last written
+    def store_data(self, name: str, data: pd.DataFrame = None, metadata: pd.DataFrame = None, **kwargs) -> None:
+        data_parts = self.split(name, data) if data is not None else {}
+        metadata_parts = self.split(f"{name}_metadata", metadata) if metadata is not None else {}
+
+        writes = {}
+        metadata_hashes = {}
+        for shard in range(len(self.storages)):
+            shard_data = data_parts.get(shard)
+            shard_data = shard_data if shard_data is not None and not shard_data.empty else None
+
+            shard_metadata = metadata_parts.get(shard)
+            if shard_metadata is not None:
+                metadata_hashes[(name, shard)] = int(pd.util.hash_pandas_object(shard_metadata.astype(str), index=False).sum())
+
+                if self.metadata_hashes.get((name, shard)) == metadata_hashes[(name, shard)]:
+                    shard_metadata = None
+
+            if shard_data is not None or shard_metadata is not None:
+                writes[shard] = (shard_data, shard_metadata)
+
+        self.fan_out(lambda storage, shard: storage.store_data(name, *writes[shard], **kwargs), list(writes))
+        self.metadata_hashes.update(metadata_hashes)
+
+    def delete_data(self, name: str, query: str | Predicate = None, **kwargs) -> int:
+        counts = self.fan_out(lambda storage, shard: storage.delete_data(name, query=query, **kwargs), self.query_shards(name, query))
+        return sum(count or 0 for count in counts)
+
+    def retrieve_processor(self, name: str, query: str | Predicate = None, **kwargs) -> pd.DataFrame:
+        frames = self.fan_out(lambda storage, shard: storage.retrieve_processor(name, query=query, **kwargs), self.query_shards(name, query))
+        return concat_frames(frames)
+
+    #shards are read one after another, so that only one batch is held at a time
+    def stream_processor(self, name: str, query: str | Predicate = None, batch_size: int = 10000, **kwargs) -> Iterator[pd.DataFrame]:
+        for shard in self.query_shards(name, query):
+            yield from self.storages[shard].stream_processor(name, query=query, batch_size=batch_size, **kwargs)
+
+    #batches are numbered by each shard, so the watermark is a tuple of the watermarks of every shard
+    def retrieve_since(self, name: str, watermark: tuple = None, query: str | Predicate = None, **kwargs) -> tuple[pd.DataFrame, pd.DataFrame, tuple]:
+        watermarks = watermark if watermark is not None else (None,) * len(self.storages)
+        assert len(watermarks) == len(self.storages), "watermark must have one entry per shard"
+
+        results = self.fan_out(lambda storage, shard: storage.retrieve_since(name, watermark=watermarks[shard], query=query, **kwargs))
+
+        added = concat_frames([result[0] for result in results])
+        deleted = concat_frames([result[1] for result in results])
+
+        return added, deleted, tuple(result[2] for result in results)
+
+    def prune_deletions(self, name: str, watermark: tuple, **kwargs) -> int:
+        assert len(watermark) == len(self.storages), "watermark must have one entry per shard"
+
+        return sum(self.fan_out(lambda storage, shard: storage.prune_deletions(name, watermark[shard], **kwargs)))
+
+    #each shard summarizes its own rows, and the summaries are combined
+    def summarize(self, name: str, key_columns: List[str] = None, time_column: str = None, bucket: str = None, query: str | Predicate = None, reconcile: bool = True, batch_size: int = 100000) -> pd.DataFrame:
+        key_columns = self.summary_keys(name) if key_columns is None else key_columns
+        groups = key_columns + (["bucket"] if bucket else [])
+
+        summaries = self.fan_out(lambda storage, shard: storage.summarize(name, key_columns=key_columns, time_column=time_column, bucket=bucket, query=query, reconcile=False, batch_size=batch_size), self.query_shards(name, query))
+        summary = self.aggregate_summary(pd.concat(summaries, ignore_index=True), groups, time_column)
+
+        return self.finish_summary(name, summary, key_columns, time_column, bucket, reconcile, query)
+
+    #duplicates are found within each shard, so natural keys should include the key columns
+    def delete_duplicates(self, name: str, key_columns: List[str], query: str | Predicate = None, **kwargs) -> int:
+        return sum(self.fan_out(lambda storage, shard: storage.delete_duplicates(name, key_columns, query=query, **kwargs), self.query_shards(name, query)))
+
+    def optimize(self, name: str = None, vacuum: bool = False, **kwargs) -> None:
+        self.fan_out(lambda storage, shard: storage.optimize(name, vacuum=vacuum, **kwargs))
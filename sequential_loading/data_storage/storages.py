@@ -1,14 +1,25 @@
-from sequential_loading.data_storage import DataStorage
-from sequential_loading.data_processor import DataProcessor
-
-from sqlalchemy import create_engine, delete, MetaData, Table, text, inspect
+from sequential_loading.data_storage.data_storage import DataStorage, SUMMARY_BUCKETS, BATCH_COLUMN, DELETION_COLUMN
+from sequential_loading.data_storage.bulk_load import BULK_LOAD_STRATEGIES, default_strategy
+from sequential_loading.data_storage.result_cache import ResultCache
+from sequential_loading.data_typing import apply_schema_dtypes, concat_frames
+from sequential_loading.predicates import Predicate, And, as_predicate
+
+from sqlalchemy import create_engine, delete, select, and_, or_, true, false, func, cast, event, literal, literal_column, tuple_, MetaData, Table, Column, BigInteger, Integer, String, DateTime, Index, Select, text, inspect
+from sqlalchemy.sql.elements import ColumnElement
 from sqlalchemy.engine.url import make_url
 
 from sqlalchemy_utils import database_exists, create_database
 
 import functools
+import hashlib
+import itertools
+import os
+import re
+import threading
+
+from types import SimpleNamespace
 
-from typing import Type, List, Union
+from typing import Callable, Hashable, Iterator, Type, List, Union
 import pandas as pd
 import numpy as np
 from typedframe import TypedDataFrame, DATE_TIME_DTYPE
@@ -29,8 +40,61 @@ def dbsafe(func):
     return wrapper
 
 
+#invalidates cached results for the tables written by a method, once its transaction has been committed
+def invalidates(written_tables: Callable[..., List[str]]):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                if self.cache is not None:
+                    self.cache.invalidate(*written_tables(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+def stored_tables(name: str, data: pd.DataFrame = None, metadata: pd.DataFrame = None, **kwargs) -> List[str]:
+    return ([name] if data is not None else []) + ([f"{name}_metadata"] if metadata is not None else [])
+
+
+#batch ids are shared by every processor in a database, and increase with each store_data and delete_data
+batch_table = Table(
+    "ingestion_batches",
+    MetaData(),
+    Column("batch_id", Integer, primary_key=True),
+    Column("processor", String(255)),
+    Column("operation", String(16)),
+    Column("created_at", DateTime),
+)
+
+
+#columns identifying each physical row, by dialect, used to tell apart rows with equal values
+ROW_ID_COLUMNS = {
+    "sqlite": "rowid",
+    "postgresql": "ctid",
+}
+
+#separates the columns of a key before it is hashed, so that e.g. ("a", "bc") and ("ab", "c") hash differently
+KEY_SEPARATOR = "\x1f"
+
+
+#deterministic hash of a key, so that readers can divide keys between them in the database
+def shard_hash(*values) -> int:
+    key = KEY_SEPARATOR.join(str(value) for value in values)
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=4).digest(), "little")
+
+
+#SQLite has no built-in hash function, so shard_hash is registered on each new connection
+def register_sqlite_functions(dbapi_connection, connection_record) -> None:
+    dbapi_connection.create_function("shard_hash", -1, shard_hash, deterministic=True)
+
+
 class SQLStorage(DataStorage):
     _connections = {}
+    _connections_lock = threading.Lock()
 
     type_mapping = {
         int: 'INTEGER',
@@ -43,12 +107,17 @@ class SQLStorage(DataStorage):
     }
 
 
-    def __init__(self, url: str, create_storage: bool = False):
+    #bulk_load selects a strategy from bulk_load.BULK_LOAD_STRATEGIES. By default, the fastest strategy for the dialect is used.
+    #cache_bytes enables a result cache for retrieve_processor and retrieve_data of at most cache_bytes bytes, or disables it if 0.
+    #pool_options are passed to sqlalchemy.create_engine, e.g. {"pool_size": 16, "max_overflow": 16, "pool_pre_ping": True}.
+    #normalize_parameters stores the categorical (parameter) columns of new processors once per distinct combination in a {name}_keys table.
+    #Rows are stored in {name}_rows with a key_id, and {name} is created as a view joining the two, so reads are unchanged.
+    #The storage is shared per url, so these options change the shared storage only when they are passed. Otherwise, the options it was first created with are kept.
+    def __init__(self, url: str, create_storage: bool = False, bulk_load: str = None, cache_bytes: int = None, pool_options: dict = None, normalize_parameters: bool = None):
         super().__init__()
 
         self.database_url = make_url(url)
         self.name = self.database_url.database
-        self.metadata = MetaData()
 
         if not database_exists(url):
             if create_storage:
@@ -56,29 +125,151 @@ class SQLStorage(DataStorage):
             else:
                 raise Exception(f"A database named {self.name} does not exist. To create one, set create_storage=True.")
 
-        self.inspector = inspect(self.engine)
-        self.metadata.reflect(bind=self.engine)
+        with self.lock:
+            if pool_options is not None and pool_options != self.pool_options:
+                self.pool_options = pool_options
+                self.connect_engine()
 
-        self.tables = self.inspector.get_table_names()
+        if bulk_load is not None and bulk_load not in BULK_LOAD_STRATEGIES:
+            raise ValueError(f"Unknown bulk load strategy {bulk_load}. Options are {list(BULK_LOAD_STRATEGIES.keys())}.")
 
-        self.processors = {}
+        with self.lock:
+            if bulk_load is not None:
+                self.bulk_load = bulk_load
+            elif self.bulk_load is None:
+                self.bulk_load = default_strategy(self.engine.dialect.name, self.engine.dialect.driver)
+
+            if cache_bytes is not None and cache_bytes != getattr(self.cache, "max_bytes", 0):
+                self.cache = ResultCache(cache_bytes) if cache_bytes else None
+
+            if normalize_parameters is not None:
+                self.normalize_parameters = normalize_parameters
 
         self.logger = logging.getLogger(__name__)
 
-    def __new__(cls, url: str, **kwargs) -> DataStorage:
-        if url not in cls._connections:
-            cls._connections[url] = super().__new__(cls)
-            cls._connections[url].engine = create_engine(url)
+    #one storage is shared per url. Its engine pools connections, and each operation checks out its own connection, so the storage can be used from several threads.
+    def __new__(cls, url: str, pool_options: dict = None, **kwargs) -> DataStorage:
+        with cls._connections_lock:
+            if url not in cls._connections:
+                storage = super().__new__(cls)
+
+                storage.url = url
+                storage.pool_options = pool_options or {}
+
+                #guards the shared metadata and engine
+                storage.lock = threading.RLock()
+                storage.metadata = MetaData()
+                storage.processors = {}
+                storage.schemas = {}
+                storage.cache = None
+                storage.bulk_load = None
+                storage.normalize_parameters = False
+
+                #name: key columns, for processors stored in normalized form
+                storage.normalized = {}
 
-        return cls._connections[url]
+                storage.engine = None
+                storage.connect_engine()
+
+                cls._connections[url] = storage
+
+            return cls._connections[url]
+
+    #creates a new engine, disposing of the old one. Connections inherited from a parent process are dropped without being closed, since the parent still owns them.
+    def connect_engine(self, inherited: bool = False) -> None:
+        if self.engine is not None:
+            self.engine.dispose(close=not inherited)
+
+        self.engine = create_engine(self.url, **self.pool_options)
+
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", register_sqlite_functions)
+
+    #after a fork, e.g. in DataLoader workers or process pools, each storage gets a fresh engine and fresh locks in the child process
+    @classmethod
+    def after_fork(cls) -> None:
+        cls._connections_lock = threading.Lock()
+
+        for storage in cls._connections.values():
+            storage.lock = threading.RLock()
+
+            if storage.cache is not None:
+                storage.cache.lock = threading.Lock()
+
+            storage.connect_engine(inherited=True)
     
-    def process_query(self, query: str, default_val: str = "TRUE") -> str:
-        conditions = " AND ".join(query.split("&")) if query else default_val
-        conditions = conditions.replace("===", "=").replace("==", "=")
-        conditions = conditions.replace('"', "'")
-        conditions = text(conditions)
+    #compiles a predicate or query string into a bound expression over table. Query strings that cannot be parsed are passed to the database as text.
+    def process_query(self, table: Table, query: str | Predicate = None, default: bool = True) -> ColumnElement:
+        if not query:
+            return true() if default else false()
+
+        try:
+            predicate = as_predicate(query)
+        except ValueError:
+            self.logger.warning(f"Passing unparsed query '{query}' to the database as text.")
+
+            conditions = " AND ".join(query.split("&"))
+            conditions = conditions.replace("===", "=").replace("==", "=")
+            conditions = conditions.replace('"', "'")
+
+            #grouped, so that e.g. conditions joined by OR stay together when combined with other conditions
+            return text(f"({conditions})")
+
+        return predicate.compile(table)
+
+    #tables are reflected the first time they are used, so that startup time does not depend on the size of the database
+    def table(self, name: str, connection=None) -> Table:
+        with self.lock:
+            if name not in self.metadata.tables:
+                Table(name, self.metadata, autoload_with=connection if connection is not None else self.engine)
+
+            return self.metadata.tables[name]
+
+    #forgets the reflected table, so that it is reflected again the next time it is used
+    def forget_table(self, name: str) -> None:
+        with self.lock:
+            if name in self.metadata.tables:
+                self.metadata.remove(self.metadata.tables[name])
+
+    #processors of normalized storages are views
+    def has_processor(self, name: str) -> bool:
+        with self.engine.connect() as connection:
+            inspector = inspect(connection)
+            return inspector.has_table(name) or name in inspector.get_view_names()
+
+    #columns returned by reads, excluding the ingestion batch stamp
+    def data_columns(self, table: Table) -> list:
+        return [column for column in table.columns if column.name != BATCH_COLUMN]
+
+    #records a new ingestion batch and returns its id
+    def create_batch(self, name: str, operation: str, connection) -> int:
+        batch_table.create(connection, checkfirst=True)
+
+        result = connection.execute(batch_table.insert().values(processor=name, operation=operation, created_at=datetime.datetime.now()))
+        return result.inserted_primary_key[0]
+
+    #tables created before ingestion batches were tracked are given the batch column when they are next written to. Their existing rows have no batch.
+    def add_batch_column(self, name: str, connection) -> None:
+        if BATCH_COLUMN in self.table(name, connection).c:
+            return
+
+        connection.execute(text(f"ALTER TABLE {name} ADD COLUMN {BATCH_COLUMN} INTEGER"))
 
-        return conditions
+        self.forget_table(name)
+        self.table(name, connection)
+
+    #copies the rows matching conditions to {name}_deletions, creating it with the columns of the processor if necessary
+    def record_deletions(self, name: str, conditions: ColumnElement, batch: int, connection) -> None:
+        columns = self.data_columns(self.table(name))
+
+        if not inspect(connection).has_table(f"{name}_deletions"):
+            deletions = Table(f"{name}_deletions", MetaData(), *[Column(column.name, column.type) for column in columns], Column(DELETION_COLUMN, Integer, index=True))
+            deletions.create(connection)
+
+        deletions = self.table(f"{name}_deletions", connection)
+
+        deleted_rows = select(*columns, literal(batch)).where(conditions)
+        connection.execute(deletions.insert().from_select([column.name for column in columns] + [DELETION_COLUMN], deleted_rows))
     
     @dbsafe
     def create_table(self, name: str, tableschema: Type[TypedDataFrame], primary_keys: tuple[str] = None, connection=None):
@@ -87,61 +278,538 @@ class SQLStorage(DataStorage):
 
         query = text(f'CREATE TABLE {name} ({columns} {primary_keys_string})')
         connection.execute(query)
+
+    @dbsafe
+    def create_normalized_table(self, name: str, tableschema: Type[TypedDataFrame], key_columns: List[str], primary_keys: tuple[str] = None, connection=None):
+        value_columns = [column for column in tableschema.schema if column not in key_columns]
+
+        #key ids are assigned by the database, so that concurrent writers do not assign the same id
+        key_id = "SERIAL" if self.engine.dialect.name == "postgresql" else "INTEGER"
+
+        keys = ', '.join(f'{column} {self.type_mapping[tableschema.schema[column]]}' for column in key_columns)
+        connection.execute(text(f'CREATE TABLE {name}_keys (key_id {key_id} PRIMARY KEY, {keys}, UNIQUE ({", ".join(key_columns)}))'))
+
+        #primary keys on key columns are replaced by the key id
+        primary_keys = list(dict.fromkeys("key_id" if column in key_columns else column for column in primary_keys or []))
+
+        columns = ', '.join(['key_id INTEGER'] + [f'{column} {self.type_mapping[tableschema.schema[column]]}' for column in value_columns] + [f'{BATCH_COLUMN} INTEGER'])
+        primary_keys_string = ', PRIMARY KEY (' + ', '.join(primary_keys) + ')' if primary_keys else ''
+        connection.execute(text(f'CREATE TABLE {name}_rows ({columns} {primary_keys_string})'))
+
+        view_columns = ', '.join([f'{"k" if column in key_columns else "r"}.{column}' for column in tableschema.schema] + [f'r.{BATCH_COLUMN}'])
+        connection.execute(text(f'CREATE VIEW {name} AS SELECT {view_columns} FROM {name}_rows r JOIN {name}_keys k ON r.key_id = k.key_id'))
     
+    #indexes is a list of column lists, each of which is indexed if it is not already. Indexes are also added to existing tables.
     @dbsafe
-    def initialize(self, name: str, tableschema: Type[TypedDataFrame], primary_keys: tuple[str] = None, create_processor: bool=False, connection=None):
-        if not self.inspector.has_table(name):
-            if create_processor:
-                self.logger.info(f"Creating Table {name}...")
+    def initialize(self, name: str, tableschema: Type[TypedDataFrame], primary_keys: tuple[str] = None, indexes: List[List[str]] = None, create_processor: bool=False, connection=None):
+        with self.lock:
+            key_columns = getattr(tableschema, "categorical_columns", None)
 
-                self.create_table(name, tableschema, primary_keys=primary_keys)
+            if not inspect(connection).has_table(name):
+                if create_processor:
+                    self.logger.info(f"Creating Table {name}...")
 
-                self.logger.info(f"Created Table {name}")
-            else:
-                raise Exception(f"Table {name} does not exist. To create one, set create_processor=True.")
+                    if self.normalize_parameters and key_columns:
+                        self.create_normalized_table(name, tableschema, key_columns, primary_keys=primary_keys)
+                    else:
+                        self.create_table(name, tableschema, primary_keys=primary_keys)
 
-        self.processors[name] = Table(name, self.metadata, autoload_with=self.engine)
+                    self.logger.info(f"Created Table {name}")
+                else:
+                    raise Exception(f"Table {name} does not exist. To create one, set create_processor=True.")
 
-        
+            self.processors[name] = self.table(name)
+            self.schemas[name] = tableschema
+
+            #processors created with normalize_parameters keep their key columns in a separate table
+            if inspect(connection).has_table(f"{name}_keys"):
+                self.normalized[name] = [column.name for column in self.table(f"{name}_keys").columns if column.name != "key_id"]
+
+        for columns in indexes or []:
+            self.create_index(name, columns, connection=connection)
+
+    def create_index(self, name: str, columns: List[str], connection=None) -> None:
+        #indexes of normalized processors are created on their rows, with key columns replaced by the key id
+        if name in self.normalized:
+            columns = list(dict.fromkeys("key_id" if column in self.normalized[name] else column for column in columns))
+            name = f"{name}_rows"
+
+        table = self.table(name)
+
+        index_name = f"ix_{name}_{'_'.join(columns)}"
+        if len(index_name) > 63:
+            index_name = f"ix_{name[:40]}_{hashlib.md5(index_name.encode()).hexdigest()[:8]}"
+
+        if not columns or any(index.name == index_name for index in table.indexes):
+            return
+
+        self.logger.info(f"Creating index {index_name} on {name} ({', '.join(columns)})")
+        Index(index_name, *[table.c[column] for column in columns]).create(connection, checkfirst=True)
+
+    @invalidates(stored_tables)
     @dbsafe  
-    def store_data(self, name:str, data: pd.DataFrame = None, metadata: pd.DataFrame = None, connection=None) -> None:
+    def store_data(self, name:str, data: pd.DataFrame = None, metadata: pd.DataFrame = None, bulk_load: str = None, connection=None) -> None:
         if data is not None:
-            data.to_sql(name, con=self.engine, if_exists="append", index=False)
+            table_name = name
+
+            if name in self.normalized:
+                table_name, data = f"{name}_rows", self.key_rows(name, data, connection)
+            else:
+                self.add_batch_column(name, connection)
+
+            data = data.assign(**{BATCH_COLUMN: self.create_batch(name, "store", connection)})
+
+            method, chunksize = BULK_LOAD_STRATEGIES[bulk_load or self.bulk_load]
+            chunksize = chunksize(self.engine.dialect.name, len(data.columns))
+
+            data.to_sql(table_name, con=connection, if_exists="append", index=False, method=method, chunksize=chunksize)
         
         if metadata is not None:
-            metadata.to_sql(f"{name}_metadata", con=self.engine, if_exists="replace", index=False)
+            metadata.to_sql(f"{name}_metadata", con=connection, if_exists="replace", index=False)
 
-    @dbsafe
-    def retrieve_processor(self, name: str, query: str = None, connection=None) -> pd.DataFrame:
-        table = self.metadata.tables.get(name)
-        
-        conditions = self.process_query(query)
+            #the metadata table is recreated, so its columns may have changed
+            self.forget_table(f"{name}_metadata")
+
+    #replaces the key columns of data with key ids, storing any keys that are new.
+    #New keys are inserted ignoring conflicts, and their ids read back, so that keys inserted concurrently by another writer are reused.
+    def key_rows(self, name: str, data: pd.DataFrame, connection) -> pd.DataFrame:
+        key_columns = self.normalized[name]
+        keys_table = self.table(f"{name}_keys")
+        key_select = select(keys_table.c.key_id, *[keys_table.c[column] for column in key_columns])
+
+        stored = pd.DataFrame.from_records(connection.execute(key_select).fetchall(), columns=["key_id", *key_columns])
+
+        keys = data[key_columns].drop_duplicates().merge(stored, on=key_columns, how="left")
+        new_keys = keys[keys["key_id"].isna()][key_columns]
+
+        if not new_keys.empty:
+            connection.execute(self.insert_ignoring_conflicts(keys_table, key_columns), new_keys.astype(object).to_dict("records"))
+
+            key_columns_expression = keys_table.c[key_columns[0]] if len(key_columns) == 1 else tuple_(*[keys_table.c[column] for column in key_columns])
+            key_values = new_keys[key_columns[0]].tolist() if len(key_columns) == 1 else list(new_keys.itertuples(index=False, name=None))
+
+            inserted = connection.execute(key_select.where(key_columns_expression.in_(key_values))).fetchall()
+            stored = pd.concat([stored, pd.DataFrame.from_records(inserted, columns=["key_id", *key_columns])], ignore_index=True)
+
+        keys = stored.astype({"key_id": int})
+        data = data.merge(keys, on=key_columns, how="left")
+
+        return data[["key_id", *[column for column in data.columns if column not in key_columns and column != "key_id"]]]
+
+    #an insert that skips rows conflicting with unique_columns, on dialects that support it
+    def insert_ignoring_conflicts(self, table: Table, unique_columns: List[str]):
+        dialect = self.engine.dialect.name
+
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            return table.insert()
+
+        return insert(table).on_conflict_do_nothing(index_elements=unique_columns)
+
+    #columns of a normalized processor, relative to its rows table. Key columns are looked up in the key table.
+    def row_columns(self, name: str) -> SimpleNamespace:
+        rows, keys = self.table(f"{name}_rows"), self.table(f"{name}_keys")
+
+        columns = {column.name: column for column in rows.columns}
+        for column in self.normalized[name]:
+            columns[column] = select(keys.c[column]).where(keys.c.key_id == rows.c.key_id).scalar_subquery()
+
+        return SimpleNamespace(c=columns)
+
+    #compiles a query over the rows table of a normalized processor. Conditions on key columns select key ids from the key table,
+    #so that the indexes of both tables are used, rather than looking up the key of each row.
+    #Conditions on both key and row columns (e.g. comparing a key column with a row column), and unparsed queries, are compiled over the joined rows and keys.
+    def row_conditions(self, name: str, query: str | Predicate = None, default: bool = True) -> ColumnElement:
+        if not query:
+            return true() if default else false()
 
-        select_statement = table.select().where(conditions)
+        try:
+            predicate = as_predicate(query)
+        except ValueError:
+            return self.joined_conditions(name, query, default=default)
 
-        data = connection.execute(select_statement).fetchall()
+        rows, keys = self.table(f"{name}_rows"), self.table(f"{name}_keys")
+        conditions = predicate.predicates if isinstance(predicate, And) else (predicate,)
+        key_columns = set(self.normalized[name])
 
-        if data is None:
+        key_conditions = [condition for condition in conditions if condition.columns() <= key_columns]
+        row_conditions = [condition for condition in conditions if not condition.columns() & key_columns]
+        mixed_conditions = [condition for condition in conditions if condition.columns() & key_columns and not condition.columns() <= key_columns]
+
+        clauses = [condition.compile(rows) for condition in row_conditions]
+        if key_conditions:
+            clauses.append(rows.c.key_id.in_(select(keys.c.key_id).where(And(*key_conditions).compile(keys))))
+        if mixed_conditions:
+            clauses.append(self.joined_conditions(name, And(*mixed_conditions), default=default))
+
+        return and_(true(), *clauses)
+
+    #selects the rows of a normalized processor whose joined rows and keys satisfy query, by row id.
+    #Dialects without row ids look up the key of each row instead.
+    def joined_conditions(self, name: str, query: str | Predicate, default: bool = True) -> ColumnElement:
+        dialect = self.engine.dialect.name
+        if dialect not in ROW_ID_COLUMNS:
+            return self.process_query(self.row_columns(name), query, default=default)
+
+        #aliased, so that the subquery is not correlated with the rows table it selects from
+        rows, keys = self.table(f"{name}_rows").alias("joined_rows"), self.table(f"{name}_keys").alias("joined_keys")
+
+        columns = {column.name: column for column in rows.columns}
+        columns.update({column: keys.c[column] for column in self.normalized[name]})
+
+        joined = select(literal_column(f"joined_rows.{ROW_ID_COLUMNS[dialect]}")) \
+            .select_from(rows.join(keys, rows.c.key_id == keys.c.key_id)) \
+            .where(self.process_query(SimpleNamespace(c=columns), query, default=default))
+
+        return literal_column(f"{name}_rows.{ROW_ID_COLUMNS[dialect]}").in_(joined)
+
+    def to_frame(self, rows: list, columns: list[str], tableschema: Type[TypedDataFrame] = None) -> pd.DataFrame:
+        data = pd.DataFrame.from_records(rows, columns=columns)
+
+        if tableschema is not None:
+            data = apply_schema_dtypes(data, tableschema)
+
+        return data
+
+    def retrieve_processor(self, name: str, query: str | Predicate = None, batch_size: int = 10000) -> pd.DataFrame:
+        load = lambda: self.concat_batches(self.stream_processor(name, query=query, batch_size=batch_size))
+
+        if self.cache is None:
+            return load()
+
+        return self.cache.get_or_load(("processor", name, self.cache_query(query)), [name], load)
+
+    #parsed predicates are used as cache keys, so that equivalent query strings share an entry
+    def cache_query(self, query: str | Predicate = None) -> Hashable:
+        try:
+            return as_predicate(query)
+        except ValueError:
+            return query
+
+    def concat_batches(self, batches: Iterator[pd.DataFrame]) -> pd.DataFrame:
+        return concat_frames(list(batches))
+
+    #yields typed dataframes (or pyarrow record batches if batch_format="arrow") of at most batch_size rows, using a server-side cursor where the driver supports one
+    def stream_processor(self, name: str, query: str | Predicate = None, batch_size: int = 10000, batch_format: str = "pandas") -> Iterator[pd.DataFrame]:
+        table = self.table(name)
+
+        conditions = self.process_query(table, query)
+
+        select_statement = select(*self.data_columns(table)).where(conditions)
+
+        return self.stream_select(select_statement, self.schemas.get(name), batch_size=batch_size, batch_format=batch_format)
+
+    #shard=(index, count) yields only every count-th batch, starting from batch index. Batches of other shards are skipped before they are converted.
+    #Every reader still reads the whole result, so stream_data divides rows in SQL with shard_condition where it can, and only falls back to this.
+    def stream_select(self, select_statement, tableschema: Type[TypedDataFrame] = None, batch_size: int = 10000, batch_format: str = "pandas", shard: tuple[int, int] = None) -> Iterator[pd.DataFrame]:
+        assert batch_format in ("pandas", "arrow"), "batch_format must be 'pandas' or 'arrow'"
+
+        if batch_format == "arrow":
+            import pyarrow as pa
+
+        with self.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(select_statement)
+            columns = list(result.keys())
+
+            #always yield at least one batch so that the columns of an empty result are known
+            batches = itertools.chain(result.partitions(), [[]])
+            for index, rows in enumerate(batches):
+                if index > 0 and not rows:
+                    break
+
+                if shard is not None and rows and index % shard[1] != shard[0]:
+                    continue
+
+                data = self.to_frame(rows, columns, tableschema)
+                yield pa.RecordBatch.from_pandas(data, preserve_index=False) if batch_format == "arrow" else data
+
+    #selects the rows of one of count readers of a processor, so that each reader only reads its own rows. Returns None if there is only one reader.
+    #Rows are divided by their parameter keys, so that each key is read by one reader: by key id for normalized processors,
+    #and otherwise by a hash of the key computed in the database. Without key columns, rows are divided by row id on SQLite. Returns None if none of these is possible.
+    def shard_condition(self, name: str, table: Table, shard: tuple[int, int]) -> ColumnElement:
+        index, count = shard
+        if count == 1:
             return None
 
-        return pd.DataFrame(data)
-    
+        dialect = self.engine.dialect.name
+        key_columns = [column for column in getattr(self.schemas.get(name), "categorical_columns", None) or [] if column in table.c]
+        columns = table.c[key_columns[0]] if len(key_columns) == 1 else tuple_(*[table.c[column] for column in key_columns])
+
+        if key_columns and name in self.normalized:
+            keys = self.table(f"{name}_keys")
+            return columns.in_(select(*[keys.c[column] for column in key_columns]).where(keys.c.key_id % count == index))
+
+        if key_columns and dialect == "sqlite":
+            return func.shard_hash(*[table.c[column] for column in key_columns]) % count == index
+
+        if key_columns and dialect == "postgresql":
+            #hashtext returns a signed 32-bit integer, which is offset to be non-negative
+            key = func.concat_ws(KEY_SEPARATOR, *[cast(table.c[column], String) for column in key_columns])
+            return (cast(func.hashtext(key), BigInteger) + 2**31) % count == index
+
+        if not key_columns and dialect == "sqlite" and name not in self.normalized:
+            return literal_column(f"{name}.rowid") % count == index
+
+        return None
+
+    #compiles the joins, filters and column selection of retrieve_data into a single select statement.
+    #With shard, only the rows of the first processor selected by shard_condition are joined.
+    def join_statement(self, processor_names: List[str], queries: List[str], join_columns: List[str], suffixes: List[str], selected_columns: List[str] = None, shard_condition: ColumnElement = None) -> tuple[Select, Type[TypedDataFrame]]:
+        tables = [self.table(name) for name in processor_names]
+        subqueries = [
+            select(*self.data_columns(table)).where(self.process_query(table, query), shard_condition if i == 0 and shard_condition is not None else true()).subquery(f"{name}_{i}")
+            for i, (name, table, query) in enumerate(zip(processor_names, tables, queries))
+        ]
+
+        labels = self.join_labels([[column.name for column in subquery.columns] for subquery in subqueries], join_columns, suffixes)
+
+        #joined columns are matched against the processor that the output column came from
+        sources = {label: subquery.c[column] for subquery, processor_labels in zip(subqueries, labels) for column, label in processor_labels.items()}
+
+        joined = subqueries[0]
+        for subquery, join_column in zip(subqueries[1:], join_columns):
+            join_column = [join_column] if isinstance(join_column, str) else join_column
+            joined = joined.join(subquery, and_(*[sources[c] == subquery.c[c] for c in join_column]))
+
+        #output columns and their dtypes
+        columns = {}
+        dtypes = {}
+        categorical_columns = []
+        for name, subquery, processor_labels in zip(processor_names, subqueries, self.select_labels(labels, selected_columns)):
+            schema = self.schemas[name].schema if name in self.schemas else {}
+            categorical = getattr(self.schemas.get(name), "categorical_columns", None) or []
+
+            for column, label in processor_labels.items():
+                columns[label] = subquery.c[column]
+
+                if column in schema:
+                    dtypes[label] = schema[column]
+
+                if column in categorical:
+                    categorical_columns.append(label)
+
+        select_statement = select(*[column.label(label) for label, column in columns.items()]).select_from(joined)
+        tableschema = type('JoinedSchema', (TypedDataFrame,), {"schema": dtypes, "categorical_columns": categorical_columns})
+
+        return select_statement, tableschema
+
+    #joins and filters are executed by the database, so only the joined, selected rows are read
+    def retrieve_data(self, processor_names: List[str], join_column: str = None, query: str = None, join_columns: List[str] = None, queries: List[str] = None, suffixes: List[str] = None, selected_columns: List[str] = None, batch_size: int = 10000) -> pd.DataFrame:
+        queries, join_columns, suffixes = self.retrieval_arguments(processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes)
+
+        def load():
+            return self.concat_batches(self.stream_data(processor_names, join_columns=join_columns, queries=queries, suffixes=suffixes, selected_columns=selected_columns, batch_size=batch_size))
+
+        if self.cache is None:
+            return load()
+
+        key = (
+            "join",
+            tuple(processor_names),
+            tuple(self.cache_query(query) for query in queries),
+            tuple(join_column if isinstance(join_column, str) or join_column is None else tuple(join_column) for join_column in join_columns),
+            tuple(suffixes),
+            tuple(selected_columns) if selected_columns is not None else None
+        )
+
+        return self.cache.get_or_load(key, processor_names, load)
+
+    #rows stored after watermark are returned as added, and rows deleted after watermark as deleted. Rows stored before batches were tracked are only returned when watermark is None.
+    #Rows are bounded by the latest batch when the call starts, also when watermark is None, so that rows committed during the call are returned by the next call rather than twice.
+    #With concurrent writers on a database that commits transactions out of order (e.g. PostgreSQL), a batch may become visible after a later one, so consumers should only advance past batches that have committed.
+    def retrieve_since(self, name: str, watermark: int = None, query: str | Predicate = None, batch_size: int = 10000) -> tuple[pd.DataFrame, pd.DataFrame, int]:
+        with self.engine.connect() as connection:
+            latest = connection.execute(select(func.max(batch_table.c.batch_id))).scalar() if inspect(connection).has_table(batch_table.name) else None
+            latest = latest or 0
+
+            table = self.table(name)
+            has_deletions = inspect(connection).has_table(f"{name}_deletions")
+
+        columns = self.data_columns(table)
+        tableschema = self.schemas.get(name)
+
+        added = select(*columns).where(self.process_query(table, query))
+        deleted = select(*columns).where(false())
+
+        if watermark is None:
+            if BATCH_COLUMN in table.c:
+                added = added.where(or_(table.c[BATCH_COLUMN].is_(None), table.c[BATCH_COLUMN] <= latest))
+
+        else:
+            if BATCH_COLUMN in table.c:
+                added = added.where(table.c[BATCH_COLUMN] > watermark, table.c[BATCH_COLUMN] <= latest)
+            else:
+                added = added.where(false())
+
+            if has_deletions:
+                deletions = self.table(f"{name}_deletions")
+                deleted = select(*[deletions.c[column.name] for column in columns]).where(
+                    self.process_query(deletions, query),
+                    deletions.c[DELETION_COLUMN] > watermark,
+                    deletions.c[DELETION_COLUMN] <= latest
+                )
+
+        added = self.concat_batches(self.stream_select(added, tableschema, batch_size=batch_size))
+        deleted = self.concat_batches(self.stream_select(deleted, tableschema, batch_size=batch_size))
+
+        return added, deleted, latest
+
     @dbsafe
-    def delete_data(self, name: str, query: str = None, connection=None) -> None:
-        table = self.metadata.tables.get(name)
-        
-        conditions = self.process_query(query, "FALSE")
+    def prune_deletions(self, name: str, watermark: int, connection=None) -> int:
+        if not inspect(connection).has_table(f"{name}_deletions"):
+            return 0
+
+        deletions = self.table(f"{name}_deletions", connection)
+        return connection.execute(delete(deletions).where(deletions.c[DELETION_COLUMN] <= watermark)).rowcount
+
+    #truncates a timestamp column to the start of its bucket, or returns None if the dialect is not supported
+    def bucket_expression(self, column: ColumnElement, bucket: str) -> ColumnElement:
+        dialect = self.engine.dialect.name
+
+        if dialect == "sqlite":
+            return func.strftime({"day": "%Y-%m-%d", "month": "%Y-%m-01", "year": "%Y-01-01"}[bucket], column)
+
+        if dialect == "postgresql":
+            return func.date_trunc(bucket, column)
+
+        return None
+
+    #counts, first and last times are aggregated by the database, so only one row per key (and bucket) is read
+    def summarize(self, name: str, key_columns: List[str] = None, time_column: str = None, bucket: str = None, query: str | Predicate = None, reconcile: bool = True, batch_size: int = 100000) -> pd.DataFrame:
+        assert bucket is None or time_column is not None, "A time_column must be specified to summarize by bucket"
+        assert bucket in (None, *SUMMARY_BUCKETS), f"bucket must be one of {list(SUMMARY_BUCKETS)}"
+
+        table = self.table(name)
+        key_columns = self.summary_keys(name) if key_columns is None else key_columns
+
+        groups = [table.c[column].label(column) for column in key_columns]
+        if bucket:
+            bucket_column = self.bucket_expression(table.c[time_column], bucket)
 
-        delete_statement = delete(table).where(conditions)
+            if bucket_column is None:
+                return super().summarize(name, key_columns=key_columns, time_column=time_column, bucket=bucket, query=query, reconcile=reconcile, batch_size=batch_size)
+
+            groups.append(bucket_column.label("bucket"))
+
+        aggregates = [func.count().label("rows")]
+        if time_column is not None:
+            aggregates += [func.min(table.c[time_column]).label("first"), func.max(table.c[time_column]).label("last")]
+
+        select_statement = select(*groups, *aggregates).where(self.process_query(table, query)).group_by(*groups).order_by(*groups)
+
+        with self.engine.connect() as connection:
+            result = connection.execute(select_statement)
+            summary = self.to_frame(result.fetchall(), list(result.keys()))
+
+        return self.finish_summary(name, summary, key_columns, time_column, bucket, reconcile, query)
+
+    def stream_data(self, processor_names: List[str], join_column: str = None, query: str = None, join_columns: List[str] = None, queries: List[str] = None, suffixes: List[str] = None, selected_columns: List[str] = None, batch_size: int = 10000, shard: tuple[int, int] = None, batch_format: str = "pandas") -> Iterator[pd.DataFrame]:
+        queries, join_columns, suffixes = self.retrieval_arguments(processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes)
+        #a single reader reads the whole result
+        if shard is not None and shard[1] == 1:
+            shard = None
+
+        condition = self.shard_condition(processor_names[0], self.table(processor_names[0]), shard) if shard is not None else None
+        select_statement, tableschema = self.join_statement(processor_names, queries, join_columns, suffixes, selected_columns=selected_columns, shard_condition=condition)
+
+        return self.stream_select(select_statement, tableschema, batch_size=batch_size, batch_format=batch_format, shard=shard if condition is None else None)
+
+    @invalidates(lambda name, *args, **kwargs: [name])
+    @dbsafe
+    def delete_data(self, name: str, query: str | Predicate = None, connection=None) -> None:
+        table = self.table(name)
+
+        batch = self.create_batch(name, "delete", connection)
+        self.record_deletions(name, self.process_query(table, query, default=False), batch, connection)
+        
+        #views cannot be deleted from, so normalized processors delete from their rows
+        if name in self.normalized:
+            conditions = self.row_conditions(name, query, default=False)
+            delete_statement = delete(self.table(f"{name}_rows")).where(conditions)
+        else:
+            conditions = self.process_query(table, query, default=False)
+            delete_statement = delete(table).where(conditions)
 
         result = connection.execute(delete_statement)
 
         return result.rowcount
 
+    #rows are compared by key_columns, and the first stored row of each group is kept. Deleted duplicates are recorded as deletions, except for normalized processors.
+    @invalidates(lambda name, *args, **kwargs: [name])
+    @dbsafe
+    def delete_duplicates(self, name: str, key_columns: List[str], query: str | Predicate = None, connection=None) -> int:
+        dialect = self.engine.dialect.name
+        if dialect not in ROW_ID_COLUMNS:
+            raise NotImplementedError(f"Deleting duplicate rows is not supported for {dialect}. Options are {list(ROW_ID_COLUMNS.keys())}.")
+
+        #normalized processors are deduplicated in their rows, with key columns replaced by the key id
+        if name in self.normalized:
+            table_name, conditions = f"{name}_rows", self.row_conditions(name, query)
+            key_columns = list(dict.fromkeys("key_id" if column in self.normalized[name] else column for column in key_columns))
+        else:
+            table_name, conditions = name, self.process_query(self.table(name), query)
+
+        rows = self.table(table_name)
+        row_id = literal_column(f"{table_name}.{ROW_ID_COLUMNS[dialect]}")
+
+        first_rows = select(func.min(row_id)).select_from(rows).where(conditions).group_by(*[rows.c[column] for column in key_columns])
+        duplicates = and_(conditions, row_id.not_in(first_rows))
+
+        if name not in self.normalized:
+            self.record_deletions(name, duplicates, self.create_batch(name, "deduplicate", connection), connection)
+
+        return connection.execute(delete(rows).where(duplicates)).rowcount
+
+    #rebuilds the indexes of a processor and refreshes its statistics, or those of every table if name is None.
+    #On SQLite, free pages are released with an incremental vacuum, which only applies to databases with auto_vacuum = INCREMENTAL.
+    #vacuum=True runs a full VACUUM instead, which rewrites the whole database file and blocks writers while it runs.
+    #VACUUM cannot run inside a transaction, so it is run on a connection in autocommit mode.
+    def optimize(self, name: str = None, vacuum: bool = False) -> None:
+        dialect = self.engine.dialect.name
+
+        if name is None:
+            tables = []
+        elif name in self.normalized:
+            tables = [f"{name}_rows", f"{name}_keys"]
+        else:
+            tables = [name]
+
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            if dialect == "sqlite":
+                for table_name in tables or [""]:
+                    connection.execute(text(f"REINDEX {table_name}"))
+                    connection.execute(text(f"ANALYZE {table_name}"))
+
+                connection.execute(text("VACUUM" if vacuum else "PRAGMA incremental_vacuum"))
+
+            elif dialect == "postgresql":
+                for table_name in tables:
+                    connection.execute(text(f"REINDEX TABLE {table_name}"))
+
+                #a plain VACUUM does not block reads or writes, unlike VACUUM FULL
+                connection.execute(text(f"VACUUM {'FULL ' if vacuum else ''}ANALYZE {', '.join(tables)}"))
+
+            else:
+                self.logger.info(f"Optimizing storage is not supported for {dialect}.")
+
+    @invalidates(lambda name, *args, **kwargs: [name, f"{name}_metadata"])
     @dbsafe
     def delete_processor(self, name: str, connection=None) -> None:
-        query = text(f"DROP TABLE IF EXISTS {name}")
-        connection.execute(query)
+        if name in inspect(connection).get_view_names():
+            connection.execute(text(f"DROP VIEW {name}"))
+
+            for table_name in (f"{name}_rows", f"{name}_keys"):
+                connection.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+                self.forget_table(table_name)
+        else:
+            query = text(f"DROP TABLE IF EXISTS {name}")
+            connection.execute(query)
+
+        connection.execute(text(f"DROP TABLE IF EXISTS {name}_deletions"))
+        self.forget_table(f"{name}_deletions")
 
         query = text(f"DROP TABLE IF EXISTS {name}_metadata")
         connection.execute(query)
@@ -149,5 +817,13 @@ class SQLStorage(DataStorage):
         connection.commit()
         connection.close()
 
-        if name in self.processors:
-            self.processors.pop(name)
\ No newline at end of file
+        for table_name in (name, f"{name}_metadata"):
+            self.processors.pop(table_name, None)
+            self.forget_table(table_name)
+
+        self.normalized.pop(name, None)
+
+
+#not available on windows, where child processes are spawned rather than forked
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=SQLStorage.after_fork)
@@ -1,6 +1,7 @@
-from typedframe import TypedDataFrame
-from typing import TypedDict
+from typedframe import TypedDataFrame, DATE_TIME_DTYPE
+from typing import TypedDict, Type, List
 import pandas as pd
+from pandas.api.types import union_categoricals
 
 class LoaderSchema(TypedDataFrame):
     unique_constraint = None
@@ -12,4 +13,50 @@ class LoaderSchema(TypedDataFrame):
     
 class CollectorResponse(TypedDict):
     data: pd.DataFrame
-    status: str
\ No newline at end of file
+    status: str
+
+
+"""
+Converts the columns of a dataframe read from storage to the dtypes declared in a schema.
+
+Columns listed in the schema's categorical_columns are converted to pandas categoricals.
+Columns that are not in the schema, or that cannot be converted (e.g. integer columns containing nulls), are left unchanged.
+"""
+def apply_schema_dtypes(df: pd.DataFrame, schema: Type[TypedDataFrame]) -> pd.DataFrame:
+    categorical_columns = getattr(schema, "categorical_columns", None) or []
+
+    for column, dtype in schema.schema.items():
+        if column not in df.columns:
+            continue
+
+        if column in categorical_columns:
+            df[column] = df[column].astype("category")
+            continue
+
+        if dtype in (str, object):
+            continue
+
+        try:
+            if dtype == DATE_TIME_DTYPE:
+                df[column] = pd.to_datetime(df[column])
+            else:
+                df[column] = df[column].astype(dtype)
+        except (TypeError, ValueError):
+            continue
+
+    return df
+
+
+"""
+Concatenates dataframes with the same columns. Categorical columns stay categorical, with the union of the categories of each dataframe.
+"""
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    if len(frames) == 1:
+        return frames[0]
+
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            categories = union_categoricals([frame[column] for frame in frames]).categories
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,433 @@
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+import datetime
+import functools
+import operator
+import re
+
+from typing import Any, Iterable, TYPE_CHECKING
+
+#sqlalchemy is imported when a predicate is compiled, so that predicates can be used without loading it
+if TYPE_CHECKING:
+    from sqlalchemy import Table
+    from sqlalchemy.sql.elements import ColumnElement
+
+
+"""
+Structured filters for processor data and metadata.
+
+A predicate can be compiled into a SQLAlchemy expression with bound parameters, or evaluated against a pandas dataframe.
+Because values are always bound, statements that differ only in their values share a cached query plan.
+
+Predicates can be combined with &:
+
+    Equals("ticker", "SPY") & Range("date", lower="2020-01-01") & In("collector", ["TIINGO", "YAHOO"])
+
+Members
+-------
+column: str
+    The column a condition applies to.
+
+Methods
+-------
+
+compile: (table: Table) -> ColumnElement
+    Compiles the predicate into a SQLAlchemy expression over the columns of table.
+
+compile_arrow: (schema: pyarrow.Schema) -> pyarrow.dataset.Expression
+    Compiles the predicate into a pyarrow dataset filter expression over the fields of schema.
+
+mask: (df: pd.DataFrame) -> pd.Series
+    Evaluates the predicate against each row of a dataframe.
+
+filter: (df: pd.DataFrame) -> pd.DataFrame
+    Returns the rows of a dataframe that satisfy the predicate.
+
+columns: () -> set[str]
+    Returns the columns the predicate constrains.
+
+"""
+class Predicate(ABC):
+
+    @abstractmethod
+    def compile(self, table: "Table") -> "ColumnElement":
+        pass
+
+    @abstractmethod
+    def compile_arrow(self, schema):
+        pass
+
+    @abstractmethod
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        pass
+
+    def filter(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df[self.mask(df)]
+
+    @abstractmethod
+    def columns(self) -> set[str]:
+        pass
+
+    def __and__(self, other: "Predicate") -> "Predicate":
+        return And(self, other)
+
+    def __eq__(self, other: Any) -> bool:
+        return type(self) is type(other) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}{self.key()}"
+
+    #hashable representation, used for equality and as a cache key
+    @abstractmethod
+    def key(self) -> tuple:
+        pass
+
+
+class Condition(Predicate):
+    def __init__(self, column: str) -> None:
+        self.column = column
+
+    def columns(self) -> set[str]:
+        return {self.column}
+
+    #converts a value to the python type of a sql column, so that e.g. date strings can be bound to timestamp columns
+    def coerce_sql(self, column, value: Any) -> Any:
+        if value is None:
+            return value
+
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            return value
+
+        if issubclass(python_type, datetime.datetime):
+            return pd.Timestamp(value).to_pydatetime()
+
+        if python_type in (int, float, str, bool) and not isinstance(value, python_type):
+            return python_type(value)
+
+        return value
+
+    #converts a value to the type of a pyarrow field
+    def coerce_arrow(self, schema, value: Any) -> Any:
+        import pyarrow as pa
+
+        if value is None:
+            return value
+
+        field_type = schema.field(self.column).type
+
+        if pa.types.is_timestamp(field_type) or pa.types.is_date(field_type):
+            return pd.Timestamp(value).to_pydatetime()
+
+        if pa.types.is_integer(field_type):
+            return int(value)
+
+        if pa.types.is_floating(field_type):
+            return float(value)
+
+        if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+            return str(value)
+
+        return value
+
+    def field(self):
+        import pyarrow.dataset as ds
+
+        return ds.field(self.column)
+
+    #converts a value to the dtype of a dataframe column
+    def coerce_frame(self, series: pd.Series, value: Any) -> Any:
+        if value is not None and pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return pd.Timestamp(value)
+
+        return value
+
+
+class Equals(Condition):
+    def __init__(self, column: str, value: Any) -> None:
+        super().__init__(column)
+        self.value = value
+
+    def compile(self, table: "Table") -> "ColumnElement":
+        column = table.c[self.column]
+        return column == self.coerce_sql(column, self.value)
+
+    def compile_arrow(self, schema):
+        return self.field() == self.coerce_arrow(schema, self.value)
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        series = df[self.column]
+        return series == self.coerce_frame(series, self.value)
+
+    def key(self) -> tuple:
+        return (self.column, self.value)
+
+
+class Range(Condition):
+    def __init__(self, column: str, lower: Any = None, upper: Any = None, lower_inclusive: bool = True, upper_inclusive: bool = True) -> None:
+        super().__init__(column)
+        self.lower = lower
+        self.upper = upper
+        self.lower_inclusive = lower_inclusive
+        self.upper_inclusive = upper_inclusive
+
+    def compile(self, table: "Table") -> "ColumnElement":
+        from sqlalchemy import and_, true
+
+        column = table.c[self.column]
+        conditions = []
+
+        if self.lower is not None:
+            lower = self.coerce_sql(column, self.lower)
+            conditions.append(column >= lower if self.lower_inclusive else column > lower)
+
+        if self.upper is not None:
+            upper = self.coerce_sql(column, self.upper)
+            conditions.append(column <= upper if self.upper_inclusive else column < upper)
+
+        return and_(true(), *conditions)
+
+    def compile_arrow(self, schema):
+        import pyarrow.dataset as ds
+
+        field = self.field()
+        expression = ds.scalar(True)
+
+        if self.lower is not None:
+            lower = self.coerce_arrow(schema, self.lower)
+            expression = expression & (field >= lower if self.lower_inclusive else field > lower)
+
+        if self.upper is not None:
+            upper = self.coerce_arrow(schema, self.upper)
+            expression = expression & (field <= upper if self.upper_inclusive else field < upper)
+
+        return expression
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        series = df[self.column]
+        mask = pd.Series(True, index=df.index)
+
+        if self.lower is not None:
+            lower = self.coerce_frame(series, self.lower)
+            mask &= series >= lower if self.lower_inclusive else series > lower
+
+        if self.upper is not None:
+            upper = self.coerce_frame(series, self.upper)
+            mask &= series <= upper if self.upper_inclusive else series < upper
+
+        return mask
+
+    def key(self) -> tuple:
+        return (self.column, self.lower, self.upper, self.lower_inclusive, self.upper_inclusive)
+
+
+class In(Condition):
+    def __init__(self, column: str, values: Iterable[Any]) -> None:
+        super().__init__(column)
+        self.values = tuple(values)
+
+    #IN lists are bound as a single expanding parameter, so the statement shape does not depend on the number of values
+    def compile(self, table: "Table") -> "ColumnElement":
+        column = table.c[self.column]
+        return column.in_([self.coerce_sql(column, value) for value in self.values])
+
+    def compile_arrow(self, schema):
+        return self.field().isin([self.coerce_arrow(schema, value) for value in self.values])
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        series = df[self.column]
+        return series.isin([self.coerce_frame(series, value) for value in self.values])
+
+    def key(self) -> tuple:
+        return (self.column, self.values)
+
+
+#comparison operators, which apply equally to SQLAlchemy columns, pyarrow fields and pandas series
+OPERATORS = {
+    "==": operator.eq,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+#compares two columns of the same row, e.g. "low <= close"
+class Compare(Condition):
+    def __init__(self, column: str, operator: str, other: str) -> None:
+        super().__init__(column)
+        self.operator = operator
+        self.other = other
+
+    def columns(self) -> set[str]:
+        return {self.column, self.other}
+
+    def compile(self, table: "Table") -> "ColumnElement":
+        return OPERATORS[self.operator](table.c[self.column], table.c[self.other])
+
+    def compile_arrow(self, schema):
+        import pyarrow.dataset as ds
+
+        return OPERATORS[self.operator](self.field(), ds.field(self.other))
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        return OPERATORS[self.operator](df[self.column], df[self.other])
+
+    def key(self) -> tuple:
+        return (self.column, self.operator, self.other)
+
+
+class And(Predicate):
+    def __init__(self, *predicates: Predicate) -> None:
+        #flatten nested conjunctions
+        self.predicates = tuple(p for predicate in predicates for p in (predicate.predicates if isinstance(predicate, And) else (predicate,)))
+
+    def columns(self) -> set[str]:
+        return set().union(*[predicate.columns() for predicate in self.predicates])
+
+    def compile(self, table: "Table") -> "ColumnElement":
+        from sqlalchemy import and_, true
+
+        return and_(true(), *[predicate.compile(table) for predicate in self.predicates])
+
+    def compile_arrow(self, schema):
+        import pyarrow.dataset as ds
+
+        expression = ds.scalar(True)
+
+        for predicate in self.predicates:
+            expression = expression & predicate.compile_arrow(schema)
+
+        return expression
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        mask = pd.Series(True, index=df.index)
+
+        for predicate in self.predicates:
+            mask &= predicate.mask(df)
+
+        return mask
+
+    def key(self) -> tuple:
+        return self.predicates
+
+
+CONDITION_PATTERN = re.compile(r"^\s*(\w+)\s*(===|==|>=|<=|>|<|=)\s*(.+?)\s*$")
+
+#unquoted values that are not numbers or booleans are column names, as in pandas and SQL
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_]\w*$")
+
+#quoted strings, removed before a condition is checked for other boolean operators
+QUOTED_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"")
+
+#only conjunctions joined by & are parsed. Conditions using any other boolean operator are passed to the database as text
+UNSUPPORTED_PATTERN = re.compile(r"\b(and|or|not)\b|\|", re.IGNORECASE)
+
+LITERALS = {"True": True, "False": False}
+
+
+#splits a query on the & between conditions, ignoring any & inside quoted values
+def split_conditions(query: str) -> list[str]:
+    conditions = [""]
+    quote = None
+
+    for character in query:
+        if quote is None and character == "&":
+            conditions.append("")
+            continue
+
+        if quote is None and character in ("'", '"'):
+            quote = character
+        elif character == quote:
+            quote = None
+
+        conditions[-1] += character
+
+    return conditions
+
+
+#raises ValueError for values that are not a single quoted string, number or literal, e.g. escaped quotes or further conditions
+def parse_value(value: str) -> Any:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+        if value[0] in value[1:-1]:
+            raise ValueError(f"Unable to parse value {value}, which contains its own quote character.")
+
+        return value[1:-1]
+
+    if value in LITERALS:
+        return LITERALS[value]
+
+    for parse in (int, float):
+        try:
+            return parse(value)
+        except ValueError:
+            continue
+
+    raise ValueError(f"Unable to parse value {value}.")
+
+
+"""
+Parses a pandas-style query string of the form "ticker == 'SPY' & date >= '2020-01-01'" into a predicate.
+
+Parameters
+----------
+
+query: str
+    Conditions of the form column operator value, joined by &. Supported operators are ==, >=, <=, > and <.
+    Unquoted names on the right-hand side refer to columns, so "low <= close" compares two columns.
+
+Returns
+-------
+
+predicate: Predicate
+    The conjunction of the parsed conditions
+
+Raises
+------
+
+ValueError
+    If a condition cannot be parsed, or uses a boolean operator other than &
+
+"""
+@functools.lru_cache(maxsize=1024)
+def parse_query(query: str) -> Predicate:
+    conditions = []
+
+    for condition_string in split_conditions(query):
+        match = CONDITION_PATTERN.match(condition_string)
+
+        if match is None or UNSUPPORTED_PATTERN.search(QUOTED_PATTERN.sub("", condition_string)):
+            raise ValueError(f"Unable to parse condition '{condition_string.strip()}' in query '{query}'.")
+
+        column, operator, value = match.groups()
+
+        if operator in ("===", "="):
+            operator = "=="
+
+        if IDENTIFIER_PATTERN.match(value) and value not in LITERALS:
+            conditions.append(Compare(column, operator, value))
+            continue
+
+        value = parse_value(value)
+
+        if operator == "==":
+            conditions.append(Equals(column, value))
+        elif operator in (">=", ">"):
+            conditions.append(Range(column, lower=value, lower_inclusive=operator == ">="))
+        else:
+            conditions.append(Range(column, upper=value, upper_inclusive=operator == "<="))
+
+    return conditions[0] if len(conditions) == 1 else And(*conditions)
+
+
+def as_predicate(query: "str | Predicate | None") -> "Predicate | None":
+    if query is None or isinstance(query, Predicate):
+        return query
+
+    return parse_query(query)
@@ -94,16 +94,38 @@ class SparsityMappingString():
         return True
 
 
-    def add_domain(self, sparsity_mapping_1: str, sparsity_mapping_2: str) -> S:
-        sparsity_mapping_1 = sparsity_mapping_1[1:]
+    """
+    Merges intervals that overlap or are adjacent to within one unit, in a single pass over the ordered intervals
+
+    Returns
+    -------
+
+    compacted: SparsityMappingString
+        A sparsity mapping string covering the same domain with the fewest intervals
+
+    """
+    def compact(self) -> S:
+        merged = []
+
+        for start, stop in self.get_intervals():
+            if merged and increment(merged[-1][1], unit=self.unit) >= start:
+                merged[-1][1] = max(merged[-1][1], stop)
+                continue
+
+            merged.append([start, stop])
 
+        string = "".join([f'/{self.date_to_str(interval[0])}|{self.date_to_str(interval[1])}' for interval in merged]) or "/"
+        return SparsityMappingString(unit=self.unit, string=string, date_to_str=self.date_to_str, str_to_date=self.str_to_date, datetime_format=self.datetime_format)
+
+
+    def add_domain(self, sparsity_mapping_1: str, sparsity_mapping_2: str) -> S:
         sparsity_mapping_2 = sparsity_mapping_2[1:].split("/")
         sparsity_mapping_2 = [i for i in sparsity_mapping_2 if i != ""]
 
         for subtract_interval in sparsity_mapping_2:
             date_interval = subtract_interval.split("|")
             date_interval = [self.str_to_date(date_interval[0]), self.str_to_date(date_interval[1])]
-            sparsity_mapping_1 = self.add_continuos_interval_to_domain(f"/{sparsity_mapping_1}", date_interval)
+            sparsity_mapping_1 = self.add_continuos_interval_to_domain(sparsity_mapping_1, date_interval)
 
         return SparsityMappingString(unit=self.unit, string=sparsity_mapping_1)
 
@@ -321,7 +343,7 @@ class SparsityMappingString():
             return f"{interval1[0]}|{interval2[0]}/{interval2[1]}|{interval1[1]}"
         
         #1 starts in front of 2
-        if interval1[0] > interval2[0]:
+        if interval1[0] >= interval2[0]:
             interval1[0] = self.date_to_str(interval1[0])
             interval1[1] = self.date_to_str(interval1[1])
             interval2[1] = self.date_to_str(increment(interval2[1], self.unit))
@@ -1,2 +1,24 @@
-from sequential_loading.storage_dataset.storage_dataset import StorageDataset
-from sequential_loading.storage_dataset.storage_datasets import CachedDataset, SparseIndexDataset
\ No newline at end of file
+import importlib
+
+#datasets are imported on first use, so that importing the package does not load torch
+LAZY_IMPORTS = {
+    "StorageDataset": "sequential_loading.storage_dataset.storage_dataset",
+    "CachedDataset": "sequential_loading.storage_dataset.storage_datasets",
+    "SparseIndexDataset": "sequential_loading.storage_dataset.storage_datasets",
+    "StreamingDataset": "sequential_loading.storage_dataset.storage_datasets",
+}
+
+__all__ = list(LAZY_IMPORTS)
+
+
+def __getattr__(name: str):
+    if name in LAZY_IMPORTS:
+        value = getattr(importlib.import_module(LAZY_IMPORTS[name]), name)
+        globals()[name] = value
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_IMPORTS))
@@ -0,0 +1,80 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from typing import List
+
+
+"""
+On-disk cache for loaded datasets.
+
+Dataframes are stored as uncompressed Arrow IPC files and arrays as .npy files, both of which are read through memory maps.
+Processes reading the same file share its pages through the operating system's page cache, without copying it into each process.
+
+Methods
+-------
+
+write_frame: (df: pd.DataFrame, path: str) -> None
+    Writes a dataframe to an Arrow IPC file.
+
+read_frame: (path: str) -> pd.DataFrame
+    Reads a dataframe from a memory-mapped Arrow IPC file.
+
+write_array: (array: np.ndarray, columns: List[str], path: str) -> None
+    Writes an array to a .npy file, and its column names to a .json file beside it.
+
+read_array: (path: str) -> (List[str], np.ndarray)
+    Memory-maps an array written by write_array, along with its column names.
+
+"""
+
+#files are written to a temporary path first, so that readers never see a partially written file
+def temporary_path(path: str) -> str:
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+def columns_path(path: str) -> str:
+    return f"{os.path.splitext(path)[0]}.columns.json"
+
+
+def write_frame(df: pd.DataFrame, path: str) -> None:
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    temporary = temporary_path(path)
+
+    with pa.OSFile(temporary, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    os.replace(temporary, path)
+
+
+def read_frame(path: str) -> pd.DataFrame:
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def write_array(array: np.ndarray, columns: List[str], path: str) -> None:
+    temporary = temporary_path(columns_path(path))
+    with open(temporary, "w") as file:
+        json.dump(columns, file)
+    os.replace(temporary, columns_path(path))
+
+    #np.save appends .npy to paths without it
+    temporary = f"{temporary_path(path)}.npy"
+    np.save(temporary, array)
+    os.replace(temporary, path)
+
+
+#arrays are mapped copy-on-write, so that they can be wrapped by torch.from_numpy without being copied or modifying the file
+def read_array(path: str) -> tuple[List[str], np.ndarray]:
+    with open(columns_path(path)) as file:
+        columns = json.load(file)
+
+    return columns, np.load(path, mmap_mode="c")
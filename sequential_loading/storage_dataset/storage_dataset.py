@@ -1,4 +1,5 @@
-from sequential_loading.data_storage import DataStorage
+from sequential_loading.data_storage.data_storage import DataStorage
+from sequential_loading.storage_dataset.dataset_cache import read_frame, write_frame
 
 from abc import ABC, abstractmethod
 
@@ -9,6 +10,16 @@ import torch
 
 from typing import List
 
+import glob
+import hashlib
+import os
+import time
+
+import numpy as np
+
+#age after which a temporary file left by an unfinished build is assumed to be abandoned
+STALE_BUILD_SECONDS = 3600
+
 """
 Dataloader is an interface for retrieving data from a storage object and packaging it into a pytorch dataset.
 Needs to be able to 
@@ -22,6 +33,7 @@ class StorageDataset(ABC, Dataset):
                  queries: List[str] | List[List[str]] = None, \
                  selected_columns: List[str] = None, \
                  suffixes: List[str] = None, \
+                 cache_dir: str = None, \
                  **parameters):
         
         assert not query or not queries, "Only query or queries can be specified"
@@ -29,7 +41,7 @@ class StorageDataset(ABC, Dataset):
         assert join_column is not None or join_columns is not None or len(processor_names) <= 1, "At least one join column must be specified for multiple processors"
 
         if suffixes is None:
-            self.suffixes = [str(i) for i in range(len(processor_names) - 1)]
+            suffixes = [str(i) for i in range(len(processor_names) - 1)]
         self.suffixes = suffixes
 
         if query:
@@ -41,12 +53,89 @@ class StorageDataset(ABC, Dataset):
         self.processor_names = processor_names
         self.queries = queries
         self.join_columns = join_columns
+        self.selected_columns = selected_columns
 
+        #column selection is applied by the storage, so that unselected columns are never loaded
         self.storage = storage
-        self.dataframe = self.load(**parameters)
+        self.parameters = parameters
+
+        #loaded data is cached in cache_dir, keyed by a fingerprint of the dataset definition and the version of its processors' data
+        self.cache_dir = cache_dir
+        self.cache_key = None
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.cache_key = f"{self.fingerprint()}-{self.data_version()}"
+
+        #loaded when first used
+        self._dataframe = None
+
+    @property
+    def dataframe(self) -> pd.DataFrame:
+        if self._dataframe is None:
+            self._dataframe = self.load_dataframe()
+
+        return self._dataframe
+
+    @dataframe.setter
+    def dataframe(self, dataframe: pd.DataFrame) -> None:
+        self._dataframe = dataframe
+
+    #identifies the dataset definition: its storage, processors, queries, joins and columns
+    def fingerprint(self) -> str:
+        #storages are identified by their url or directory
+        location = getattr(self.storage, "url", None) or getattr(self.storage, "path", None)
+        definition = (str(location), self.processor_names, self.queries, self.join_columns, self.suffixes, self.selected_columns, sorted(self.parameters.items()))
+
+        return hashlib.sha256(repr(definition).encode()).hexdigest()[:32]
+
+    #hash of the metadata of each processor, which changes whenever data is collected or deleted, so that cached builds of older data are not reused
+    def data_version(self) -> str:
+        digest = hashlib.sha256()
+
+        for name in self.processor_names:
+            #processors without metadata are not versioned
+            if not self.storage.has_processor(f"{name}_metadata"):
+                continue
+
+            metadata = self.storage.retrieve_processor(f"{name}_metadata")
+
+            #rows are hashed independently of their order
+            rows = pd.util.hash_pandas_object(metadata[sorted(metadata.columns)].astype(str), index=False)
+            digest.update(name.encode())
+            digest.update(np.sort(rows.to_numpy()).tobytes())
+
+        return digest.hexdigest()[:16]
+
+    def cache_path(self, extension: str) -> str:
+        return os.path.join(self.cache_dir, f"{self.cache_key}.{extension}")
+
+    #removes cached builds of this dataset definition for other data versions.
+    #Temporary files may belong to a build in progress in another process, so they are only removed once they are older than STALE_BUILD_SECONDS.
+    def remove_stale_builds(self) -> None:
+        definition = self.cache_key.split("-")[0]
+
+        for path in glob.glob(os.path.join(self.cache_dir, f"{definition}-*")):
+            if os.path.basename(path).startswith(self.cache_key):
+                continue
+
+            try:
+                if not path.endswith(".tmp") or time.time() - os.path.getmtime(path) > STALE_BUILD_SECONDS:
+                    os.remove(path)
+            except FileNotFoundError:
+                #removed by another process
+                continue
+
+    def load_dataframe(self) -> pd.DataFrame:
+        if self.cache_dir is None:
+            return self.load(**self.parameters)
+
+        path = self.cache_path("arrow")
+        if not os.path.exists(path):
+            self.remove_stale_builds()
+            write_frame(self.load(**self.parameters), path)
 
-        if selected_columns is not None:
-            self.dataframe = self.dataframe.filter(regex=f"({'|'.join(selected_columns)})")
+        return read_frame(path)
 
     @abstractmethod
     def __len__(self):
@@ -1,10 +1,18 @@
-from sequential_loading.storage_dataset import StorageDataset
-from sequential_loading.data_storage import DataStorage
-from typing import List
+from sequential_loading.storage_dataset.storage_dataset import StorageDataset
+from sequential_loading.storage_dataset.dataset_cache import read_array, write_array
+from sequential_loading.data_storage.data_storage import DataStorage
+from typing import Iterator, List
 
+import os
+
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 
 import torch
+from torch.utils.data import IterableDataset, get_worker_info
 
 class CachedDataset(StorageDataset):
     #need to get these parameters figured out
@@ -17,18 +25,64 @@ class CachedDataset(StorageDataset):
                  queries: List[str] | List[List[str]] = None, \
                  suffixes: List[str] = None, \
                  selected_columns=None, \
+                 cache_dir: str = None, \
                  **parameters):
-        super().__init__(storage, processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes, selected_columns=selected_columns, **parameters)
+        super().__init__(storage, processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes, selected_columns=selected_columns, cache_dir=cache_dir, **parameters)
+
+        #numeric columns are copied once into a contiguous float32 array, and samples are views into it
+        self.columns, self.array = self.load_array()
+        self.tensor = torch.from_numpy(self.array)
+
+    def build_array(self) -> tuple[List[str], np.ndarray]:
+        #the dataframe is not cached on disk when the array is
+        if self._dataframe is None:
+            self._dataframe = self.load(**self.parameters)
+
+        columns = list(self.dataframe.select_dtypes(include=["number", "bool"]).columns)
+        return columns, np.ascontiguousarray(self.dataframe[columns].to_numpy(dtype=np.float32))
+
+    #with a cache_dir, the array is memory-mapped from disk, so that DataLoader workers and later runs share it without copying or querying the storage
+    def load_array(self) -> tuple[List[str], np.ndarray]:
+        if self.cache_dir is None:
+            return self.build_array()
+
+        path = self.cache_path("npy")
+        if not os.path.exists(path):
+            self.remove_stale_builds()
+            write_array(*reversed(self.build_array()), path)
+
+        return read_array(path)
+
+    #when cached on disk, the array is mapped again after unpickling (e.g. in spawned DataLoader workers) rather than copied into the pickle
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+
+        if self.cache_dir is not None:
+            for attribute in ("storage", "_dataframe", "array", "tensor"):
+                state[attribute] = None
+
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+
+        if self.cache_dir is not None:
+            self.columns, self.array = read_array(self.cache_path("npy"))
+            self.tensor = torch.from_numpy(self.array)
 
     def load(self, **parameters) -> pd.DataFrame:
-        return self.storage.retrieve_data(self.processor_names, join_columns=self.join_columns, queries=self.queries, suffixes=self.suffixes, **parameters)
+        return self.storage.retrieve_data(self.processor_names, join_columns=self.join_columns, queries=self.queries, suffixes=self.suffixes, selected_columns=self.selected_columns, **parameters)
     
     def __len__(self):
-        return len(self.dataframe)
+        return len(self.tensor)
 
+    #index can be an integer, a slice or a sequence of integers
     def __getitem__(self, index):
-        x = self.dataframe.iloc[index].values
-        return torch.tensor(x, dtype=torch.float32)
+        return self.tensor[index]
+
+    #used by DataLoader to fetch a batch with one gather, rather than one lookup per sample
+    def __getitems__(self, indices: List[int]) -> List[torch.Tensor]:
+        return list(self.tensor[indices].unbind(0))
     
 
 class SparseIndexDataset(StorageDataset):
@@ -44,36 +98,168 @@ class SparseIndexDataset(StorageDataset):
                  queries: List[str] | List[List[str]] = None, \
                  suffixes: List[str] = None, \
                  selected_columns = None, \
+                 cache_dir: str = None, \
+                 cache_size: int = 1024, \
+                 group_columns: List[str] = None, \
                  **parameters):
-        super().__init__(storage, processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes, selected_columns=[*selected_columns, index_column], **parameters)
+        super().__init__(storage, processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes, selected_columns=[*selected_columns, index_column, *(group_columns or [])], cache_dir=cache_dir, **parameters)
+
+        #with group_columns (e.g. the parameter columns), windows are taken within each group in order of the index column, and never span two groups
+        self.group_columns = group_columns
+        if group_columns:
+            self.dataframe = self.dataframe.sort_values([*group_columns, index_column], kind="stable", ignore_index=True)
+
+            codes = self.dataframe.groupby(group_columns, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+            self.groups = self.dataframe[group_columns].drop_duplicates(ignore_index=True)
+            self.dataframe = self.dataframe.drop(columns=group_columns)
+
         self.index_column = self.dataframe[index_column]
         self.dataframe = self.dataframe.drop(columns=[index_column])
         self.window_size = window_size
 
-        self.cached_indices = {}
+        #least recently used samples, at most cache_size of them
+        self.cache_size = cache_size
+        self.cached_indices = OrderedDict()
+
+        assert len(self.dataframe) >= window_size, f"Window size {window_size} exceeds length of dataframe ({len(self.dataframe)} rows)."
+        assert window_size <= 62, f"Window size {window_size} is too large for its masks to be represented as 64-bit integers."
+
+        #start row of the window of each phase
+        if group_columns:
+            #a window is valid if its first and last rows are in the same group, since groups are contiguous
+            self.starts = np.flatnonzero(codes[:len(codes) - window_size + 1] == codes[window_size - 1:])
+            self.window_groups = codes[self.starts]
+        else:
+            self.starts = np.arange(len(self.dataframe) - window_size + 1)
 
-        assert len(self.dataframe) > window_size, f"Window size {window_size} exceeds length of dataframe ({len(self.dataframe)} rows)."
-        self.phases = len(self.dataframe) - window_size
+        assert len(self.starts) > 0, f"No group has at least {window_size} rows."
+        self.phases = len(self.starts)
+
+        #windows are strided views into one contiguous array, so no window is copied until it is sampled
+        self.array = np.ascontiguousarray(self.dataframe.to_numpy(dtype=np.float32))
+        self.windows = torch.from_numpy(self.array).unfold(0, window_size, 1).transpose(1, 2)
+        self.index_windows = sliding_window_view(self.index_column.to_numpy(), window_size)
 
     def load(self, **parameters) -> pd.DataFrame:
-        return self.storage.retrieve_data(self.processor_names, join_columns=self.join_columns, queries=self.queries, suffixes=self.suffixes, **parameters)
+        return self.storage.retrieve_data(self.processor_names, join_columns=self.join_columns, queries=self.queries, suffixes=self.suffixes, selected_columns=self.selected_columns, **parameters)
     
     def __len__(self):
         return (2**self.window_size)*self.phases
     
+    #the bits of each index within its phase, most significant first, as a (len(indices), window_size) boolean array
+    def masks(self, indices: np.ndarray) -> np.ndarray:
+        #don't want to return empty data, but may create bias towards previous datapoint as currently implemented
+        masks = np.maximum(indices % 2**self.window_size, 1)
+        return ((masks[:, None] >> np.arange(self.window_size - 1, -1, -1)) & 1).astype(bool)
+
+    #returns the windows (len(indices), window_size, columns), index values (len(indices), window_size) and masks (len(indices), window_size) of several samples at once
+    def batch(self, indices: List[int]) -> tuple[torch.Tensor, np.ndarray, torch.Tensor]:
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.starts[indices // 2**self.window_size]
+
+        return self.windows[torch.from_numpy(starts)], self.index_windows[starts], torch.from_numpy(self.masks(indices))
+
+    def samples(self, indices: List[int]) -> list:
+        data, index_values, masks = self.batch(indices)
+        return [
+            ([d if m else None for d, m in zip(window, mask)], [i if m else None for i, m in zip(values, mask)])
+            for window, values, mask in zip(data, index_values, masks.tolist())
+        ]
+
     def __getitem__(self, index):
         if index in self.cached_indices:
+            self.cached_indices.move_to_end(index)
             return self.cached_indices[index]
 
-        phase = index // 2**self.window_size
+        sample = self.samples([index])[0]
 
-        #don't want to return empty data, but may create bias towards previous datapoint as currently implemented
-        mask = max(index % 2**self.window_size, 1)
-        mask = [int(x) for x in bin(mask)[2:].zfill(self.window_size)]
+        self.cached_indices[index] = sample
+        if len(self.cached_indices) > self.cache_size:
+            self.cached_indices.popitem(last=False)
+
+        return sample
+
+    def __getitems__(self, indices: List[int]) -> list:
+        return self.samples(indices)
+        
+
+
+"""
+Dataset that streams joined data from storage in chunks, rather than loading it into memory.
+
+Rows are yielded as float32 tensors of the numeric columns, and memory use is bounded by chunk_size and shuffle_buffer.
+When used with several DataLoader workers, each worker reads a different share of the chunks.
+
+Members
+-------
+chunk_size: int
+    The number of rows read from storage at a time.
+
+shuffle_buffer: int
+    The number of rows kept in a buffer that new rows are shuffled with. 0 disables shuffling.
+
+columns: List[str]
+    The numeric columns that rows are built from, known once the first chunk has been read.
+
+"""
+class StreamingDataset(StorageDataset, IterableDataset):
+    def __init__(self, \
+                 storage: DataStorage, \
+                 processor_names: List[str], \
+                 join_column: str | List[str] = None, \
+                 query: str | List[str] = None, \
+                 join_columns: List[str] | List[List[str]] = None, \
+                 queries: List[str] | List[List[str]] = None, \
+                 suffixes: List[str] = None, \
+                 selected_columns=None, \
+                 chunk_size: int = 10000, \
+                 shuffle_buffer: int = 0, \
+                 **parameters):
+        super().__init__(storage, processor_names, join_column=join_column, query=query, join_columns=join_columns, queries=queries, suffixes=suffixes, selected_columns=selected_columns, **parameters)
+
+        self.chunk_size = chunk_size
+        self.shuffle_buffer = shuffle_buffer
+        self.columns = None
+
+    def load(self, **parameters) -> pd.DataFrame:
+        return self.storage.retrieve_data(self.processor_names, join_columns=self.join_columns, queries=self.queries, suffixes=self.suffixes, selected_columns=self.selected_columns, **parameters)
+
+    def __len__(self):
+        raise TypeError("StreamingDataset does not know its length until it has been read.")
+
+    def __getitem__(self, index):
+        raise TypeError("StreamingDataset can only be iterated.")
+
+    #(worker index, number of workers) of the current DataLoader worker, or None outside workers, where the whole result is read
+    def shard(self) -> tuple[int, int] | None:
+        worker_info = get_worker_info()
+        return None if worker_info is None or worker_info.num_workers == 1 else (worker_info.id, worker_info.num_workers)
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        for data in self.storage.stream_data(self.processor_names, join_columns=self.join_columns, queries=self.queries, suffixes=self.suffixes, selected_columns=self.selected_columns, batch_size=self.chunk_size, shard=self.shard(), **self.parameters):
+            if self.columns is None:
+                self.columns = list(data.select_dtypes(include=["number", "bool"]).columns)
+
+            yield np.ascontiguousarray(data[self.columns].to_numpy(dtype=np.float32))
+
+    def __iter__(self) -> Iterator[torch.Tensor]:
+        #the seed differs between workers and epochs of a DataLoader
+        rng = np.random.default_rng(torch.initial_seed() % 2**32)
+        buffer = None
+
+        for chunk in self.chunks():
+            if not self.shuffle_buffer:
+                yield from torch.from_numpy(chunk)
+                continue
+
+            #rows beyond the buffer size are yielded in random order, and the remaining rows are kept to be mixed with the next chunk
+            buffer = chunk if buffer is None else np.concatenate([buffer, chunk])
+
+            if len(buffer) > self.shuffle_buffer:
+                buffer = buffer[rng.permutation(len(buffer))]
 
-        data = torch.tensor(self.dataframe.iloc[phase:phase+self.window_size].values)
-        indices = self.index_column.iloc[phase:phase+self.window_size].values
-        self.cached_indices[index] = (data, indices)
+                yield from torch.from_numpy(buffer[self.shuffle_buffer:])
+                buffer = buffer[:self.shuffle_buffer].copy()
 
-        return [d if m else None for d, m in zip(data, mask)], [i if m else None for i, m in zip(indices, mask)]
-        
\ No newline at end of file
+        if buffer is not None:
+            yield from torch.from_numpy(buffer[rng.permutation(len(buffer))])
@@ -1,4 +1,4 @@
-from sequential_loading.data_collector import DataCollector
+from sequential_loading.data_collector import DataCollector, FileCollector
 from sequential_loading.sparsity_mapping import SparsityMappingString
 
 from test_application.schemas import EODSchema, WeatherSchema
@@ -61,46 +61,31 @@ class tiingoCollector(DataCollector):
 
 # Weather Collectors
     
-def reformat_datestr(datestr):
-    datestr = datestr.split("/")
+class newYorkWeatherCollector(FileCollector):
+    def __init__(self, path="test_application/nyc_temperature.csv"):
+        super().__init__(name="NEWYORKCOLLECTOR", schema=WeatherSchema, path=path, date_column="date")
 
-    #day, month, year to year, month, day
-    datestr = datestr[::-1]
-    return "-".join(datestr)
-    
-class newYorkWeatherCollector(DataCollector):
-    def __init__(self):
-        super().__init__(name="NEWYORKCOLLECTOR", schema=WeatherSchema)
+    #dates are stored as day/month/year
+    def prepare(self, df):
+        df["date"] = pd.to_datetime(df["date"], format="%d/%m/%y")
+
+        df = df[['date', 'tmax', 'tmin', 'tavg', 'CDD', 'precipitation', 'new_snow']].rename(columns={'CDD': 'cdd'})
+
+        #any precipitation or snow, including non-numeric entries, is recorded as 1
+        df['new_snow'] = (pd.to_numeric(df['new_snow'], errors="coerce") != 0).astype(float)
+        df['precipitation'] = (pd.to_numeric(df['precipitation'], errors="coerce") != 0).astype(float)
+        df['cdd'] = df['cdd'].astype(float)
 
-        self.data = pd.read_csv("test_application/nyc_temperature.csv")
+        return df
 
     def retrieve_data(self, interval: Tuple[str, str], location="New York", **kwargs):
 
         if location != "New York":
             return f"Location {location} not supported."
 
-        startdate = interval[0].strftime("%y-%m-%d")
-        enddate = interval[1].strftime("%y-%m-%d")
-
-        self.data["date"] = self.data["date"].apply(reformat_datestr)
-        result = self.data[(self.data['date'] >= startdate) & (self.data['date'] <= enddate)]
-        result['date'] = pd.to_datetime(result['date'], format="%y-%m-%d")
-
-        result = result[['date', 'tmax', 'tmin', 'tavg', 'CDD', 'precipitation', 'new_snow']]
+        return super().retrieve_data(interval, **kwargs)
 
-        #chained assignment warning, need to fix
-        result['new_snow'][result['new_snow'] != "0"] = 1
-        result['precipitation'][result['precipitation'] != "0"] = 1  
-
-        result['precipitation'] = result['precipitation'].astype(float)
-        result['new_snow'] = result['new_snow'].astype(float)
-        result['CDD'] = result['CDD'].astype(float)
-
-        result = result.rename(columns={'CDD': 'cdd'})
-
-        # print("this ran 10")
-        # print(result)
+    def postprocess(self, df, **parameters):
+        df['id'] = [uuid.uuid4() for _ in range(len(df))]
 
-        result['id'] = [uuid.uuid4() for _ in range(len(result))]
-        
-        return result
\ No newline at end of file
+        return df
@@ -0,0 +1,39 @@
+import pytest
+
+from sequential_loading.data_storage import ParquetStorage, SQLStorage
+from sequential_loading.data_processor import IntervalProcessor
+
+from benchmarks.synthetic import SyntheticCollector, SyntheticParamSchema, SyntheticSchema
+
+"""
+Shared fixtures. Storages are created in a temporary directory, and processors collect offline from SyntheticCollector.
+"""
+
+@pytest.fixture
+def sql_storage(tmp_path):
+    return SQLStorage(f"sqlite:///{tmp_path / 'storage.db'}", create_storage=True)
+
+
+#the backends that store processors: plain and normalized SQLite tables, and Parquet directories
+STORAGE_KINDS = ["sql", "normalized", "parquet"]
+
+
+def make_storage(kind: str, path):
+    if kind == "parquet":
+        return ParquetStorage(str(path / "parquet"), create_storage=True)
+
+    return SQLStorage(f"sqlite:///{path / f'{kind}.db'}", create_storage=True, normalize_parameters=kind == "normalized")
+
+
+@pytest.fixture(params=STORAGE_KINDS)
+def storage(request, tmp_path):
+    return make_storage(request.param, tmp_path)
+
+
+@pytest.fixture
+def collector():
+    return SyntheticCollector(rows_per_day=2)
+
+
+def make_processor(storage, name: str = "prices") -> IntervalProcessor:
+    return IntervalProcessor(name, SyntheticParamSchema, SyntheticSchema, storage, unit="days", create_processor=True)
@@ -0,0 +1,80 @@
+import datetime
+import json
+
+from sequential_loading.data_collector import NoData
+from sequential_loading.data_processor import IntervalProcessor
+
+from benchmarks.synthetic import SyntheticCollector, SyntheticParamSchema, SyntheticSchema
+
+
+#returns NoData until available is set, and records the intervals it was queried for
+class ListingCollector(SyntheticCollector):
+    def __init__(self):
+        super().__init__()
+        self.available = False
+        self.queried = []
+
+    def retrieve_data(self, interval, **parameters):
+        self.queried.append(interval)
+        return super().retrieve_data(interval, **parameters) if self.available else NoData("not listed")
+
+
+def metadata(processor):
+    return processor.cached_metadata.iloc[0]
+
+
+def age_attempts(processor, domain: str, days: int):
+    attempts = json.loads(metadata(processor)["attempted_at"])
+    aged = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat()
+    attempts = {(aged if value == domain else key): value for key, value in attempts.items()}
+    processor.cached_metadata.loc[processor.cached_metadata.index[0], "attempted_at"] = json.dumps(attempts)
+
+
+#each interval expires on its own, rather than whenever the key was last attempted
+def test_attempts_expire_per_interval(sql_storage):
+    processor = IntervalProcessor("prices", SyntheticParamSchema, SyntheticSchema, sql_storage, unit="days", create_processor=True, attempt_expiry=datetime.timedelta(days=1))
+    collector = ListingCollector()
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-05")
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-06|2020-01-10")
+    assert metadata(processor)["attempted_domain"] == "/2020-01-01|2020-01-10"
+
+    age_attempts(processor, "/2020-01-01|2020-01-05", days=2)
+    collector.queried.clear()
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-10")
+    assert collector.queried == [(datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 5))]
+
+    #the repeated attempt restarts the expiry of its interval only
+    attempts = json.loads(metadata(processor)["attempted_at"])
+    assert sorted(attempts.values()) == ["/2020-01-01|2020-01-05", "/2020-01-06|2020-01-10"]
+    assert len(attempts) == 2
+
+
+#intervals that return data once their attempt has expired are no longer attempted
+def test_collected_intervals_leave_attempted_domain(sql_storage):
+    processor = IntervalProcessor("prices", SyntheticParamSchema, SyntheticSchema, sql_storage, unit="days", create_processor=True, attempt_expiry=datetime.timedelta(days=1))
+    collector = ListingCollector()
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-10")
+    age_attempts(processor, "/2020-01-01|2020-01-10", days=2)
+
+    collector.available = True
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-05")
+
+    row = metadata(processor)
+    assert row["domain"] == "/2020-01-01|2020-01-05"
+    assert row["attempted_domain"] == "/2020-01-06|2020-01-10"
+    assert list(json.loads(row["attempted_at"]).values()) == ["/2020-01-06|2020-01-10"]
+
+
+def test_deleted_intervals_leave_attempts(sql_storage):
+    processor = IntervalProcessor("prices", SyntheticParamSchema, SyntheticSchema, sql_storage, unit="days", create_processor=True)
+    collector = ListingCollector()
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-10")
+    processor.delete("/2020-01-01|2020-01-03", collector=collector, ticker="A")
+
+    row = metadata(processor)
+    assert row["attempted_domain"] == "/2020-01-04|2020-01-10"
+    assert list(json.loads(row["attempted_at"]).values()) == ["/2020-01-04|2020-01-10"]
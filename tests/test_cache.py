@@ -0,0 +1,78 @@
+import pandas as pd
+
+from sequential_loading.data_storage import SQLStorage
+from sequential_loading.data_storage.result_cache import ResultCache
+
+from conftest import make_processor
+
+
+def cached_storage(tmp_path):
+    return SQLStorage(f"sqlite:///{tmp_path / 'cached.db'}", create_storage=True, cache_bytes=2**24)
+
+
+def test_reads_are_cached(tmp_path, collector):
+    storage = cached_storage(tmp_path)
+    make_processor(storage).collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-05")
+
+    first = storage.retrieve_processor("prices", query="ticker == 'A'")
+    first.loc[:, "close"] = -1.0
+
+    #equivalent query strings share an entry, and callers receive copies
+    second = storage.retrieve_processor("prices", query="ticker = 'A'")
+    assert storage.cache.hits == 1
+    assert (second["close"] >= 0).all()
+
+
+def test_writes_invalidate(tmp_path, collector):
+    storage = cached_storage(tmp_path)
+    processor = make_processor(storage)
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-05")
+    assert len(storage.retrieve_processor("prices")) == 10
+
+    processor.collect(collector=collector, ticker="B", domain="/2020-01-01|2020-01-05")
+    assert len(storage.retrieve_processor("prices")) == 20
+
+    joined = storage.retrieve_data(["prices"], query="ticker == 'B'")
+    assert len(joined) == 10
+
+    storage.delete_data("prices", query="ticker == 'B'")
+    assert len(storage.retrieve_processor("prices")) == 10
+    assert storage.retrieve_data(["prices"], query="ticker == 'B'").empty
+
+
+#a storage opened again for the same url shares its cache, unless cache_bytes is passed
+def test_shared_cache(tmp_path):
+    storage = cached_storage(tmp_path)
+    url = f"sqlite:///{tmp_path / 'cached.db'}"
+
+    assert SQLStorage(url).cache is storage.cache
+    assert SQLStorage(url, cache_bytes=0).cache is None
+
+
+def test_results_loaded_before_a_write_are_not_cached():
+    cache = ResultCache(max_bytes=2**20)
+    result = pd.DataFrame({"value": [1.0, 2.0]})
+
+    def load():
+        #a write to the table while the result is loading
+        cache.invalidate("prices")
+        return result
+
+    cache.get_or_load("key", ["prices"], load)
+    assert "key" not in cache.entries
+
+
+def test_least_recently_used_results_are_evicted():
+    result = pd.DataFrame({"value": range(100)})
+    size = int(result.memory_usage(deep=True).sum())
+    cache = ResultCache(max_bytes=2 * size)
+
+    for key in ["a", "b"]:
+        cache.get_or_load(key, ["prices"], lambda: result)
+
+    cache.get_or_load("a", ["prices"], lambda: result)
+    cache.get_or_load("c", ["prices"], lambda: result)
+
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.size <= cache.max_bytes
@@ -0,0 +1,36 @@
+import pytest
+
+from sequential_loading.storage_dataset import SparseIndexDataset
+
+from conftest import make_processor
+
+
+@pytest.fixture
+def prices(sql_storage, collector):
+    processor = make_processor(sql_storage)
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-05")
+    processor.collect(collector=collector, ticker="B", domain="/2020-01-01|2020-01-03")
+
+    return sql_storage
+
+
+#every window of window_size consecutive rows is a phase, including the last one
+@pytest.mark.parametrize("window_size", [1, 3, 10])
+def test_sparse_index_length(prices, window_size):
+    ungrouped = SparseIndexDataset(prices, ["prices"], window_size, index_column="date", query="ticker == 'A'", selected_columns=["close"])
+    grouped = SparseIndexDataset(prices, ["prices"], window_size, index_column="date", query="ticker == 'A'", selected_columns=["close"], group_columns=["ticker"])
+
+    assert ungrouped.phases == grouped.phases == 10 - window_size + 1
+    assert len(ungrouped) == len(grouped) == 2**window_size * (10 - window_size + 1)
+
+    #the last sample ends on the last row
+    _, index_values, _ = ungrouped.batch([len(ungrouped) - 1])
+    assert index_values[0][-1] == ungrouped.index_column.iloc[-1]
+
+
+#windows never span two groups
+def test_sparse_index_groups(prices):
+    dataset = SparseIndexDataset(prices, ["prices"], 4, index_column="date", selected_columns=["close"], group_columns=["ticker"])
+
+    assert dataset.phases == (10 - 4 + 1) + (6 - 4 + 1)
@@ -0,0 +1,58 @@
+import datetime
+
+import pytest
+
+from sequential_loading.data_storage import SQLStorage, ShardedStorage
+from sequential_loading.predicates import Equals, Range
+
+from conftest import STORAGE_KINDS, make_processor, make_storage
+
+
+@pytest.fixture(params=[*STORAGE_KINDS, "sharded"])
+def storage(request, tmp_path):
+    if request.param == "sharded":
+        return ShardedStorage([SQLStorage(f"sqlite:///{tmp_path / f'shard_{i}.db'}", create_storage=True) for i in range(2)])
+
+    return make_storage(request.param, tmp_path)
+
+
+#each watermark returns the rows stored and deleted since the previous one, exactly once
+def test_retrieve_since(storage, collector):
+    processor = make_processor(storage)
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-10")
+
+    added, deleted, first = storage.retrieve_since("prices")
+    assert len(added) == 20 and deleted.empty
+
+    processor.collect(collector=collector, ticker="B", domain="/2020-01-01|2020-01-05")
+    storage.delete_data("prices", query=Equals("ticker", "A") & Range("date", lower=datetime.datetime(2020, 1, 9)))
+
+    added, deleted, second = storage.retrieve_since("prices", watermark=first)
+    assert len(added) == 10 and set(added["ticker"].astype(str)) == {"B"}
+    assert len(deleted) == 4 and set(deleted["ticker"].astype(str)) == {"A"}
+
+    added, deleted, third = storage.retrieve_since("prices", watermark=second)
+    assert added.empty and deleted.empty and third == second
+
+    #queries apply to added and deleted rows
+    added, deleted, _ = storage.retrieve_since("prices", watermark=first, query=Equals("ticker", "A"))
+    assert added.empty and len(deleted) == 4
+
+    #a snapshot without a watermark returns every stored row
+    assert len(storage.retrieve_since("prices")[0]) == 26
+
+
+def test_prune_deletions(storage, collector):
+    processor = make_processor(storage)
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-05")
+    _, _, first = storage.retrieve_since("prices")
+
+    storage.delete_data("prices", query=Equals("ticker", "A") & Range("date", lower=datetime.datetime(2020, 1, 4)))
+    _, deleted, second = storage.retrieve_since("prices", watermark=first)
+    assert len(deleted) == 4
+
+    assert storage.prune_deletions("prices", second) == 4
+    assert storage.retrieve_since("prices", watermark=first)[1].empty
+    assert len(storage.retrieve_processor("prices")) == 6
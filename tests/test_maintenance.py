@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from sequential_loading.data_storage import ParquetStorage
+
+from conftest import make_processor
+
+
+def stored_keys(storage):
+    data = storage.retrieve_processor("prices")
+    return len(data), len(data.drop_duplicates(["ticker", "collector", "date"]))
+
+
+#rows stored twice with new ids are removed by the default natural key, and collected_items is recounted from the rows left
+def test_maintain_deduplicates_and_recounts(storage, collector):
+    processor = make_processor(storage)
+
+    for ticker in ["A", "B"]:
+        processor.collect(collector=collector, ticker=ticker, domain="/2020-01-01|2020-01-05")
+        processor.collect(collector=collector, ticker=ticker, domain="/2020-01-06|2020-01-10")
+
+    duplicates = storage.retrieve_processor("prices", query="ticker == 'B'").head(7)
+    duplicates["id"] = duplicates["id"].astype(str) + "-copy"
+    storage.store_data("prices", duplicates.astype({"ticker": str, "collector": str}), None)
+
+    index = processor.cached_metadata.index[processor.cached_metadata["ticker"] == "A"][0]
+    processor.cached_metadata.loc[index, "collected_items"] = 999
+    storage.store_data("prices", None, processor.cached_metadata)
+
+    assert stored_keys(storage) == (47, 40)
+
+    report = processor.maintain().set_index("ticker")
+
+    assert report.loc["B", "duplicates"] == 7
+    assert report.loc["A", "duplicates"] == 0
+    assert report.loc["A", "previous_items"] == 999
+    assert report["collected_items"].to_dict() == {"A": 20, "B": 20}
+    assert report["compacted_intervals"].to_dict() == {"A": 1, "B": 1}
+
+    assert stored_keys(storage) == (40, 40)
+    assert processor.cached_metadata.set_index("ticker")["domain"].to_dict() == {"A": "/2020-01-01|2020-01-10", "B": "/2020-01-01|2020-01-10"}
+
+    #the first stored copy of each row is kept
+    assert not storage.retrieve_processor("prices")["id"].astype(str).str.endswith("-copy").any()
+
+
+def test_maintain_slices(sql_storage, collector):
+    processor = make_processor(sql_storage)
+
+    for ticker in ["A", "B", "C"]:
+        processor.collect(collector=collector, ticker=ticker, domain="/2020-01-01|2020-01-03")
+
+    first = processor.maintain(keys=2, batch_size=1)
+    rest = processor.maintain(start=2)
+
+    assert len(first) == 2 and len(rest) == 1
+
+
+def parquet_files(path):
+    return sorted(file_name for _, _, file_names in os.walk(path) for file_name in file_names if file_name.endswith(".parquet"))
+
+
+#a merge interrupted after the merged file was renamed into place is completed when the storage is next opened
+def test_parquet_merge_recovery(tmp_path, collector, monkeypatch):
+    storage = ParquetStorage(str(tmp_path / "parquet"), create_storage=True)
+    processor = make_processor(storage)
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-05")
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-06|2020-01-10")
+
+    expected = storage.retrieve_processor("prices").sort_values("date", ignore_index=True)
+    assert len(parquet_files(storage.processor_path("prices"))) == 2
+
+    def interrupt(self, directory):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(ParquetStorage, "remove_superseded", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        storage.optimize("prices")
+    monkeypatch.undo()
+
+    #both the merged file and the files it supersedes are listed until the merge is recovered
+    assert len(storage.retrieve_processor("prices")) == 2 * len(expected)
+
+    reopened = ParquetStorage(str(tmp_path / "parquet"))
+    make_processor(reopened)
+
+    recovered = reopened.retrieve_processor("prices").sort_values("date", ignore_index=True)
+    assert recovered.equals(expected)
+    assert len(parquet_files(reopened.processor_path("prices"))) == 1
+
+    reopened.optimize("prices")
+    assert reopened.retrieve_processor("prices").sort_values("date", ignore_index=True).equals(expected)
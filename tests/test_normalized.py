@@ -0,0 +1,44 @@
+import pytest
+
+from sequential_loading.predicates import Compare, Equals, Range
+
+from conftest import make_processor, make_storage
+
+
+@pytest.fixture(params=["sql", "normalized"])
+def prices(request, tmp_path, collector):
+    storage = make_storage(request.param, tmp_path)
+    processor = make_processor(storage)
+
+    for ticker in ["A", "B", "Z"]:
+        processor.collect(collector=collector, ticker=ticker, domain="/2020-01-01|2020-01-05")
+
+    return storage
+
+
+def remaining_tickers(storage):
+    return storage.retrieve_processor("prices")["ticker"].astype(str).value_counts().to_dict()
+
+
+#ids start with the ticker, so only the ids of A and B sort before the collector name "SYNTHETIC"
+@pytest.mark.parametrize("query", [
+    Compare("id", "<", "collector"),
+    Compare("id", "<", "collector") & Range("close", lower=0.0),
+    "ticker == 'A' or ticker == 'B'",
+])
+def test_delete_mixed_conditions(prices, query):
+    assert prices.delete_data("prices", query=query) == 20
+    assert remaining_tickers(prices) == {"Z": 10}
+
+
+def test_delete_key_and_row_conditions(prices):
+    data = prices.retrieve_processor("prices", query="ticker == 'B'")
+    expected = int((data["close"] >= 0.5).sum())
+
+    assert prices.delete_data("prices", query=Equals("ticker", "B") & Range("close", lower=0.5)) == expected
+    assert remaining_tickers(prices)["B"] == 10 - expected
+
+
+def test_retrieve_mixed_conditions(prices):
+    data = prices.retrieve_processor("prices", query=Compare("id", "<", "collector"))
+    assert set(data["ticker"].astype(str)) == {"A", "B"}
@@ -0,0 +1,93 @@
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import SyntheticCollector
+
+from conftest import make_processor, make_storage
+
+
+#the same collections in SQLite and Parquet storages, which hold the same rows since the collectors are seeded alike
+@pytest.fixture
+def storages(tmp_path):
+    storages = {}
+
+    for kind in ["sql", "parquet"]:
+        storage = make_storage(kind, tmp_path)
+        prices = make_processor(storage, "prices")
+        market = make_processor(storage, "market")
+        collector = SyntheticCollector(rows_per_day=2)
+
+        for ticker in ["A", "Q/Q"]:
+            prices.collect(collector=collector, ticker=ticker, domain="/2020-01-01|2020-02-03")
+        market.collect(collector=collector, ticker="M", domain="/2020-01-15|2020-02-03")
+
+        storages[kind] = storage
+
+    return storages
+
+
+def sort(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(list(df.columns), ignore_index=True)
+
+
+#rows are partitioned by parameters and time bucket, with values escaped in directory names
+def test_partitions(storages):
+    directory = storages["parquet"].processor_path("prices")
+
+    assert os.path.isdir(os.path.join(directory, "ticker=A", "collector=SYNTHETIC", "time_bucket=2020"))
+    assert os.path.isdir(os.path.join(directory, "ticker=Q%2FQ", "collector=SYNTHETIC", "time_bucket=2020"))
+
+
+@pytest.mark.parametrize("query", [
+    None,
+    "ticker == 'A' & date >= '2020-01-10' & date <= '2020-01-20'",
+    "ticker == 'Q/Q' & close > 0.5",
+])
+def test_retrieve_matches_sql(storages, query):
+    sql, parquet = (storages[kind].retrieve_processor("prices", query=query) for kind in ["sql", "parquet"])
+
+    assert parquet.dtypes.to_dict() == sql.dtypes.to_dict()
+    pd.testing.assert_frame_equal(sort(parquet), sort(sql))
+
+
+def test_retrieve_data_matches_sql(storages):
+    arguments = dict(processor_names=["prices", "market"], queries=["ticker == 'A'", None], join_column="date", suffixes=["_m"], selected_columns=["date", "close", "close_m"])
+    sql, parquet = (storages[kind].retrieve_data(**arguments) for kind in ["sql", "parquet"])
+
+    assert len(parquet) == 2 * 20
+    pd.testing.assert_frame_equal(sort(parquet), sort(sql))
+
+
+def test_stream_processor(storages):
+    batches = list(storages["parquet"].stream_processor("prices", query="ticker == 'A'", batch_size=16))
+
+    assert all(len(batch) <= 16 for batch in batches)
+    assert sum(len(batch) for batch in batches) == 68
+
+    #an empty result still has the processor's columns
+    empty, = storages["parquet"].stream_processor("prices", query="ticker == 'B'")
+    assert empty.empty and list(empty.columns) == list(batches[0].columns)
+
+
+def test_delete(storages, collector):
+    deleted = len(storages["parquet"].retrieve_processor("prices", query="ticker == 'A' & date >= '2020-01-10' & date <= '2020-01-19'"))
+
+    for storage in storages.values():
+        make_processor(storage).delete("/2020-01-10|2020-01-19", collector=collector, ticker="A")
+
+    sql, parquet = (storages[kind].retrieve_processor("prices") for kind in ["sql", "parquet"])
+
+    assert deleted > 0 and len(parquet) == 2 * 68 - deleted
+    pd.testing.assert_frame_equal(sort(parquet), sort(sql))
+
+    #metadata columns may be stored in a different order
+    sql_metadata, parquet_metadata = (storages[kind].retrieve_processor("prices_metadata") for kind in ["sql", "parquet"])
+    pd.testing.assert_frame_equal(sort(parquet_metadata[sorted(parquet_metadata.columns)]), sort(sql_metadata[sorted(sql_metadata.columns)]))
+
+
+#Parquet filters have no text fallback
+def test_unparsed_queries_raise(storages):
+    with pytest.raises(ValueError):
+        storages["parquet"].retrieve_processor("prices", query="ticker == 'A' or ticker == 'B'")
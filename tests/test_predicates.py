@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from sequential_loading.predicates import And, Compare, Equals, In, Range, parse_query
+
+from conftest import make_processor
+
+
+@pytest.mark.parametrize("query, predicate", [
+    ("ticker == 'SPY'", Equals("ticker", "SPY")),
+    ("ticker = \"SPY\"", Equals("ticker", "SPY")),
+    ("volume > 100", Range("volume", lower=100, lower_inclusive=False)),
+    ("close <= 2.5", Range("close", upper=2.5)),
+    ("flag == True", Equals("flag", True)),
+    ("low <= close", Compare("low", "<=", "close")),
+    ("ticker == 'A&B' & date >= '2020-01-01'", And(Equals("ticker", "A&B"), Range("date", lower="2020-01-01"))),
+    ("name == 'a or b'", Equals("name", "a or b")),
+])
+def test_parse_query(query, predicate):
+    assert parse_query(query) == predicate
+
+
+#queries the parser does not support are rejected, so that storages pass them to the database as text
+@pytest.mark.parametrize("query", [
+    "ticker == 'A' or ticker == 'B'",
+    "volume > 100 and close < 5",
+    "x == 1 | y == 2",
+    "not x == 1",
+    "name == 'O''Neil'",
+    "date >= 2020-01-01",
+    "ticker in ['A', 'B']",
+])
+def test_parse_query_rejects(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+
+def test_predicates_filter_frames():
+    df = pd.DataFrame({"ticker": ["A", "B", "C"], "low": [1.0, 5.0, 2.0], "close": [2.0, 4.0, 3.0]})
+
+    predicate = In("ticker", ["A", "B"]) & Compare("low", "<=", "close")
+
+    assert predicate.filter(df)["ticker"].tolist() == ["A"]
+    assert predicate.columns() == {"ticker", "low", "close"}
+
+
+def test_text_fallback(sql_storage, collector):
+    processor = make_processor(sql_storage)
+
+    for ticker in ["A", "B", "O'Neil"]:
+        processor.collect(collector=collector, ticker=ticker, domain="/2020-01-01|2020-01-03")
+
+    data = sql_storage.retrieve_processor("prices")
+
+    both = sql_storage.retrieve_processor("prices", query="ticker == 'A' or ticker == 'B'")
+    assert len(both) == (data["ticker"] != "O'Neil").sum()
+
+    mixed = sql_storage.retrieve_processor("prices", query="volume > 0.5 and close < 0.5")
+    assert len(mixed) == ((data["volume"] > 0.5) & (data["close"] < 0.5)).sum()
+
+    escaped = sql_storage.retrieve_processor("prices", query="ticker == 'O''Neil'")
+    assert len(escaped) == 6 and set(escaped["ticker"]) == {"O'Neil"}
+
+    compared = sql_storage.retrieve_processor("prices", query="low <= close")
+    assert len(compared) == (data["low"] <= data["close"]).sum()
+
+
+#text conditions keep their grouping when the storage combines them with its own conditions
+def test_text_fallback_is_grouped(sql_storage, collector):
+    processor = make_processor(sql_storage)
+
+    processor.collect(collector=collector, ticker="A", domain="/2020-01-01|2020-01-03")
+    _, _, watermark = sql_storage.retrieve_since("prices")
+
+    processor.collect(collector=collector, ticker="B", domain="/2020-01-01|2020-01-03")
+    processor.collect(collector=collector, ticker="C", domain="/2020-01-01|2020-01-03")
+
+    added, _, _ = sql_storage.retrieve_since("prices", watermark=watermark, query="ticker == 'A' or ticker == 'B'")
+    assert set(added["ticker"].astype(str)) == {"B"} and len(added) == 6
@@ -0,0 +1,136 @@
+import datetime
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from sequential_loading.data_processor import IntervalProcessor, process_pool
+from sequential_loading.data_processor.process_pool import collect_interval, collector_payload, schema_attributes, unpack
+
+from benchmarks.synthetic import SyntheticCollector, SyntheticParamSchema, SyntheticSchema
+
+from conftest import make_storage
+
+"""
+Collection in worker processes. Workers are forked, so that the pool starts quickly.
+"""
+
+#a fragmented first pass, so that the second pass collects several intervals
+FIRST_DOMAIN = "".join(f"/2020-{month:02d}-05|2020-{month:02d}-10" for month in range(1, 7))
+SECOND_DOMAIN = "/2020-01-01|2020-06-30"
+
+INTERVAL = (datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 2))
+
+
+#records whether each interval was submitted with the collector, or with its token only
+class RecordingExecutor(ProcessPoolExecutor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.payloads = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.payloads.append(args[1] is not None)
+        return super().submit(fn, *args, **kwargs)
+
+
+@pytest.fixture
+def executor():
+    with RecordingExecutor(2, mp_context=multiprocessing.get_context("fork")) as executor:
+        yield executor
+
+
+@pytest.fixture
+def worker_collectors(monkeypatch):
+    collectors = OrderedDict()
+    monkeypatch.setattr(process_pool, "worker_collectors", collectors)
+    return collectors
+
+
+def collect(storage, executor=None):
+    processor = IntervalProcessor("prices", SyntheticParamSchema, SyntheticSchema, storage, unit="days", create_processor=True, executor=executor)
+    collector = SyntheticCollector(rows_per_day=2)
+
+    processor.collect(collector=collector, ticker="A", domain=FIRST_DOMAIN)
+    processor.collect(collector=collector, ticker="A", domain=SECOND_DOMAIN)
+
+    return storage.retrieve_processor("prices"), processor.retrieve_metadata(ticker="A", collector=collector)[0]
+
+
+#prices are random, and drawn from a different generator in each worker, so rows are compared by their ids and dates
+@pytest.mark.parametrize("kind", ["sql", "parquet"])
+def test_pool_matches_sequential(tmp_path, executor, kind):
+    for directory in ["sequential", "pool"]:
+        (tmp_path / directory).mkdir()
+
+    sequential_data, sequential_metadata = collect(make_storage(kind, tmp_path / "sequential"))
+    pool_data, pool_metadata = collect(make_storage(kind, tmp_path / "pool"), executor=executor)
+
+    assert len(pool_data) == len(sequential_data) == 2 * 182
+    assert sorted(pool_data["id"]) == sorted(sequential_data["id"])
+    assert sorted(pool_data["date"]) == sorted(sequential_data["date"])
+    assert list(pool_data.columns) == list(sequential_data.columns)
+
+    for column in ["domain", "attempted_domain", "collected_items"]:
+        assert pool_metadata[column] == sequential_metadata[column]
+
+
+#the collector is sent at most once per interval of the first pass, and not at all once every worker has it
+def test_collector_sent_once(tmp_path, executor):
+    storage = make_storage("sql", tmp_path)
+    processor = IntervalProcessor("prices", SyntheticParamSchema, SyntheticSchema, storage, unit="days", create_processor=True, executor=executor)
+    collector = SyntheticCollector(rows_per_day=2)
+
+    processor.collect(collector=collector, ticker="A", domain=FIRST_DOMAIN)
+    first = executor.payloads
+
+    #each interval is submitted with its token, and sent again with the collector at most once
+    assert first.count(False) == 6
+    assert 1 <= first.count(True) <= 6
+
+    executor.payloads = []
+    processor.collect(collector=collector, ticker="A", domain="/2020-07-01|2020-07-03")
+    processor.collect(collector=collector, ticker="A", domain="/2020-08-01|2020-08-03")
+
+    #by now both workers have been sent the collector, unless one worker collected every interval of the first pass
+    assert executor.payloads.count(False) == 2
+    assert executor.payloads.count(True) <= 1
+
+
+@pytest.fixture
+def schema(tmp_path):
+    processor = IntervalProcessor("prices", SyntheticParamSchema, SyntheticSchema, make_storage("sql", tmp_path), unit="days", create_processor=True)
+    return schema_attributes(processor.schema)
+
+
+def test_collect_interval(worker_collectors, schema):
+    token, payload = collector_payload(SyntheticCollector(rows_per_day=2))
+    arguments = (INTERVAL, {"collector": None, "ticker": "A"}, "days", schema)
+
+    #a worker without the collector asks for it
+    assert collect_interval(token, None, *arguments) == ("missing", None)
+
+    data = unpack(collect_interval(token, payload, *arguments))
+    assert len(data) == 4 and set(data["ticker"]) == {"A"}
+    assert list(worker_collectors) == [token]
+
+    #once sent, the token is enough
+    assert len(unpack(collect_interval(token, None, *arguments))) == 4
+
+
+#workers keep the WORKER_COLLECTORS most recently used collectors
+def test_worker_collectors_evicted(worker_collectors, schema, monkeypatch):
+    monkeypatch.setattr(process_pool, "WORKER_COLLECTORS", 2)
+    tokens = []
+
+    for seed in range(3):
+        token, payload = collector_payload(SyntheticCollector(rows_per_day=2, seed=seed))
+        tokens.append(token)
+
+        collect_interval(token, payload, INTERVAL, {"collector": None, "ticker": "A"}, "days", schema)
+        #the first collector is used again, so the second is evicted instead
+        if seed == 1:
+            collect_interval(tokens[0], None, INTERVAL, {"collector": None, "ticker": "A"}, "days", schema)
+
+    assert list(worker_collectors) == [tokens[0], tokens[2]]
+    assert collect_interval(tokens[1], None, INTERVAL, {"collector": None, "ticker": "A"}, "days", schema) == ("missing", None)
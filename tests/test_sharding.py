@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from sequential_loading.data_storage import SQLStorage, ShardedStorage
+from sequential_loading.predicates import Equals, In, Range
+
+from conftest import make_processor
+
+
+TICKERS = ["A", "F", "K", "P", "U", "Z"]
+
+
+def sharded_storage(tmp_path, shards: int = 3, **kwargs) -> ShardedStorage:
+    return ShardedStorage([SQLStorage(f"sqlite:///{tmp_path / f'shard_{i}.db'}", create_storage=True) for i in range(shards)], **kwargs)
+
+
+def collect(storage, collector):
+    processor = make_processor(storage)
+
+    for ticker in TICKERS:
+        processor.collect(collector=collector, ticker=ticker, domain="/2020-01-01|2020-01-03")
+
+    return processor
+
+
+def shard_tickers(storage, name: str = "prices") -> list[set]:
+    return [set(shard.retrieve_processor(name)["ticker"].astype(str)) for shard in storage.storages]
+
+
+#every row of a key, and its metadata, are stored on the shard its key is routed to
+def test_hash_routing(tmp_path, collector):
+    storage = sharded_storage(tmp_path)
+    collect(storage, collector)
+
+    tickers = shard_tickers(storage)
+    assert sorted(ticker for shard in tickers for ticker in shard) == TICKERS
+    assert tickers == shard_tickers(storage, "prices_metadata")
+
+    for ticker in TICKERS:
+        key = pd.DataFrame({"ticker": [ticker], "collector": ["SYNTHETIC"]})
+        shard = int(storage.shard_indices("prices", key)[0])
+
+        assert ticker in tickers[shard]
+        assert storage.query_shards("prices", Equals("ticker", ticker) & Equals("collector", "SYNTHETIC")) == [shard]
+
+    #queries that do not fix every key column go to every shard
+    assert storage.query_shards("prices", Equals("ticker", "A")) == [0, 1, 2]
+    assert len(storage.retrieve_processor("prices")) == 6 * len(TICKERS)
+    assert len(storage.retrieve_processor("prices", query="ticker == 'A' & collector == 'SYNTHETIC'")) == 6
+
+
+def test_range_routing(tmp_path, collector):
+    storage = sharded_storage(tmp_path, boundaries=["G", "Q"])
+    collect(storage, collector)
+
+    assert shard_tickers(storage) == [{"A", "F"}, {"K", "P"}, {"U", "Z"}]
+
+    assert storage.query_shards("prices", Equals("ticker", "K")) == [1]
+    assert storage.query_shards("prices", In("ticker", ["A", "Z"])) == [0, 2]
+    assert storage.query_shards("prices", Range("ticker", lower="H")) == [1, 2]
+    assert storage.query_shards("prices", Range("ticker", upper="C")) == [0]
+    #contradictory conditions still read one shard, so that the result has the processor's columns
+    assert storage.query_shards("prices", Equals("ticker", "A") & Equals("ticker", "Z")) == [0]
+
+    data = storage.retrieve_processor("prices", query=Range("ticker", lower="H"))
+    assert set(data["ticker"].astype(str)) == {"K", "P", "U", "Z"}
+
+
+#keys are compared in the type of the boundaries, so numeric keys stored as text are routed by value
+@pytest.mark.parametrize("boundaries, values, shards", [
+    ([5, 50], ["3", "10", "100"], [0, 1, 2]),
+    ([pd.Timestamp("2020-01-01")], ["2019-06-01", "2021-01-01"], [0, 1]),
+    (["m"], ["a", "z"], [0, 1]),
+])
+def test_range_shards_types(tmp_path, boundaries, values, shards):
+    storage = sharded_storage(tmp_path, shards=len(boundaries) + 1, boundaries=boundaries)
+    assert storage.range_shards(values).tolist() == shards
+
+
+def test_unsorted_boundaries(tmp_path):
+    with pytest.raises(AssertionError):
+        sharded_storage(tmp_path, boundaries=["Q", "G"])
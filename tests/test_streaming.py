@@ -0,0 +1,43 @@
+import pytest
+
+from conftest import make_processor, make_storage
+
+
+@pytest.fixture(params=["sql", "normalized"])
+def sql_storages(request, tmp_path, collector):
+    storage = make_storage(request.param, tmp_path)
+    processor = make_processor(storage)
+
+    for ticker in ["A", "B", "C", "D", "E", "F"]:
+        processor.collect(collector=collector, ticker=ticker, domain="/2020-01-01|2020-01-10")
+
+    return storage
+
+
+def test_single_reader_is_not_sharded(sql_storages):
+    assert sql_storages.shard_condition("prices", sql_storages.table("prices"), (0, 1)) is None
+
+
+#each key is read by exactly one of the readers, which together read every row
+def test_shards_divide_keys(sql_storages):
+    total = sql_storages.retrieve_processor("prices")
+    readers = 3
+
+    shards = [
+        sql_storages.concat_batches(sql_storages.stream_data(["prices"], batch_size=7, shard=(index, readers)))
+        for index in range(readers)
+    ]
+
+    assert sum(len(shard) for shard in shards) == len(total)
+
+    tickers = [set(shard["ticker"].astype(str)) for shard in shards]
+    assert set().union(*tickers) == set(total["ticker"].astype(str))
+    assert sum(len(shard_tickers) for shard_tickers in tickers) == len(set(total["ticker"].astype(str)))
+
+
+#keys are divided in the database, rather than bound as a list of every key
+def test_shard_condition_binds_no_keys(sql_storages):
+    condition = sql_storages.shard_condition("prices", sql_storages.table("prices"), (1, 4))
+    parameters = condition.compile(sql_storages.engine).params
+
+    assert sorted(parameters.values()) == [1, 4]